@@ -0,0 +1,142 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline.pipeline import Compilador
+from cache.cache import CacheCompilacion, entrada_de_resultado, escribir_si_cambio
+
+# Extension de los archivos fuente que se buscan dentro de un directorio
+EXTENSION_FUENTE = ".py"
+
+# Directorios que no se recorren al buscar archivos fuente
+DIRECTORIOS_IGNORADOS = {"__pycache__", ".git"}
+
+# Tareas que recibe cada proceso por envio; repartir los archivos en
+# varios envios por proceso equilibra la carga sin pagar un viaje por archivo
+ENVIOS_POR_PROCESO = 4
+
+# Cache abierta en este proceso para cada directorio; se reutiliza entre
+# archivos para medir el tamaño de la cache una sola vez por proceso
+_caches = {}
+
+# Compilador de este proceso para cada nivel de optimizacion y limite de
+# errores
+_compiladores = {}
+
+
+# Resultado de compilar un archivo: lo que el proceso trabajador devuelve
+# al proceso principal para el resumen
+class ResultadoArchivo:
+    __slots__ = ('archivo', 'salida', 'fase', 'errores', 'tokens', 'nodos', 'variables', 'desde_cache')
+
+    def __init__(self, archivo, salida):
+        self.archivo = archivo
+        self.salida = salida
+        self.fase = None        # Atributo de la fase que fallo, o None
+        self.errores = []       # Errores de esa fase
+        self.tokens = 0
+        self.nodos = 0
+        self.variables = 0
+        self.desde_cache = None # True/False si se consulto la cache
+
+    @property
+    def exito(self):
+        return self.fase is None
+
+
+# Lista ordenada de los archivos fuente de las rutas indicadas; los
+# directorios se recorren completos
+def buscar_archivos(rutas):
+    archivos = set()
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for directorio, subdirectorios, nombres in os.walk(ruta):
+                subdirectorios[:] = [d for d in subdirectorios if d not in DIRECTORIOS_IGNORADOS]
+                for nombre in nombres:
+                    if nombre.endswith(EXTENSION_FUENTE):
+                        archivos.add(os.path.join(directorio, nombre))
+        else:
+            archivos.add(ruta)
+    return sorted(archivos)
+
+
+# Compila varios archivos repartiendolos entre "trabajos" procesos. Los
+# procesos se crean una vez y compilan muchos archivos cada uno, asi que
+# los modulos del compilador se importan solo una vez por proceso. Los
+# resultados vuelven en el mismo orden que los archivos
+def compilar_lote(archivos, trabajos, nivel_optimizacion=1, usar_cache=True, directorio_cache=None,
+                  max_errores=None):
+    if trabajos <= 1 or len(archivos) <= 1:
+        return [
+            compilar_archivo(archivo, nivel_optimizacion, usar_cache, directorio_cache, max_errores)
+            for archivo in archivos
+        ]
+
+    envio = max(1, len(archivos) // (trabajos * ENVIOS_POR_PROCESO))
+    repetir = lambda valor: [valor] * len(archivos)
+    with ProcessPoolExecutor(max_workers=trabajos) as ejecutor:
+        return list(ejecutor.map(
+            compilar_archivo, archivos, repetir(nivel_optimizacion), repetir(usar_cache),
+            repetir(directorio_cache), repetir(max_errores), chunksize=envio
+        ))
+
+
+# Compila un archivo con las mismas fases que compilar_python_a_cpp, sin
+# imprimir nada, y escribe su .cpp si no hubo errores y cambio. Si el
+# archivo ya se compilo con el mismo compilador, el resultado sale de la
+# cache
+def compilar_archivo(archivo_entrada, nivel_optimizacion=1, usar_cache=True, directorio_cache=None,
+                     max_errores=None):
+    resultado = ResultadoArchivo(archivo_entrada, os.path.splitext(archivo_entrada)[0] + ".cpp")
+    try:
+        entrada, resultado.desde_cache = buscar_o_compilar(
+            archivo_entrada, nivel_optimizacion, usar_cache, directorio_cache, max_errores
+        )
+    except (OSError, UnicodeDecodeError) as e:
+        resultado.fase = 'errores_lectura'
+        resultado.errores = [f"Error al leer el archivo: {e}"]
+        return resultado
+
+    resultado.fase = entrada['fase']
+    resultado.errores = entrada['errores']
+    resultado.tokens = entrada['tokens']
+    resultado.nodos = entrada['nodos']
+    resultado.variables = entrada['variables']
+    if entrada['cpp'] is not None:
+        try:
+            escribir_si_cambio(resultado.salida, entrada['cpp'])
+        except OSError as e:
+            resultado.fase = 'errores_escritura'
+            resultado.errores = [f"Error al escribir el archivo: {e}"]
+    return resultado
+
+
+# Entrada de la cache del archivo, compilandolo si no estaba, y si salio de
+# la cache (None si no se uso). Los errores de lectura se propagan
+def buscar_o_compilar(archivo_entrada, nivel_optimizacion=1, usar_cache=True, directorio_cache=None,
+                      max_errores=None):
+    cache = None
+    if usar_cache:
+        cache = _caches.get(directorio_cache)
+        if cache is None:
+            cache = _caches[directorio_cache] = CacheCompilacion(directorio_cache)
+        clave = cache.clave(archivo_entrada, nivel_optimizacion, max_errores)
+        entrada = cache.buscar(clave)
+        if entrada is not None:
+            return entrada, True
+
+    with open(archivo_entrada, 'r', encoding='utf-8') as f:
+        codigo_fuente = f.read()
+    entrada = compilar_fuente(codigo_fuente, nivel_optimizacion, max_errores=max_errores)
+    if cache is not None:
+        cache.guardar(clave, entrada)
+    return entrada, (False if usar_cache else None)
+
+
+# Fases del compilador sobre el codigo fuente. Devuelve una entrada de la
+# cache: el C++ generado o los errores de la primera fase que fallo. Con un
+# Perfilador se mide cada fase por separado
+def compilar_fuente(codigo_fuente, nivel_optimizacion=1, perfil=None, max_errores=None):
+    compilador = _compiladores.get((nivel_optimizacion, max_errores))
+    if compilador is None:
+        compilador = _compiladores[nivel_optimizacion, max_errores] = Compilador(nivel_optimizacion, max_errores)
+    return entrada_de_resultado(compilador.compilar(codigo_fuente, perfil))
@@ -0,0 +1,819 @@
+import gc
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from batch.batch import compilar_fuente
+from pipeline.pipeline import Compilador
+from interpreter.interpreter import (Interprete, ErrorEjecucion, OPERACIONES_COMPARACION, RANGO_NUMERICO, LONG_MIN,
+                                     LONG_MAX, PLANTILLA_DIVISION, PLANTILLA_MODULO, N_ASSIGN, N_PRINT, N_BINARY_OP,
+                                     N_IDENTIFIER, N_LITERAL, division_ieee, fmod_cpp, pow_cpp, potencia_entera,
+                                     formato_double, valor_literal, valor_constante, conversion_asignacion)
+from native.native import CompiladorNativo, CompiladorNoEncontrado, OPCIONES_POR_DEFECTO
+from optimizer.optimizer import INT_MIN, INT_MAX
+from parser.parser import SIN_NODO
+from profiling.profiling import Perfilador, formatear_tiempo
+from server.server import ClienteCompilacion
+
+# Banco de pruebas de rendimiento del compilador. Genera programas
+# sinteticos deterministas del subconjunto soportado, mide cada fase sobre
+# tamaños crecientes y calcula como crece el tiempo con el tamaño de la
+# entrada. Se ejecuta desde la raiz del repositorio:
+#   python -m benchmarks.benchmarks [Opciones]
+
+# Version del formato de los resultados JSON
+FORMATO_RESULTADOS = 1
+
+# Fases medidas, en el orden del compilador
+FASES = ('lexico', 'sintactico', 'semantico', 'optimizacion', 'generacion')
+
+# Tamaños por defecto, en tokens: de 1K a 10M
+TAMANOS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Cantidad de tokens procesados por repeticion: los tamaños chicos se
+# repiten mas veces (y se toma la mejor) para que el ruido no domine
+TOKENS_POR_REPETICION = 1_000_000
+MAXIMO_REPETICIONES = 5
+
+# Los tamaños menores no entran en el ajuste de la curva: su tiempo es del
+# orden del costo fijo de cada fase
+TOKENS_MINIMOS_AJUSTE = 10_000
+
+# Exponente a partir del cual una fase se considera superlineal
+# (tiempo ~ tokens ** exponente)
+EXPONENTE_MAXIMO = 1.2
+
+# Al comparar con una corrida anterior, aumento relativo del tiempo por
+# token que cuenta como regresion, y tiempo minimo de la fase para que la
+# comparacion no sea solo ruido
+TOLERANCIA = 0.15
+SEGUNDOS_MINIMOS_COMPARACION = 0.005
+
+# Segundos maximos de espera a que el servidor abra su socket
+ESPERA_SERVIDOR = 30
+
+# Tamaños por defecto de --ejecucion, en tokens: el compilador de C++
+# tarda segundos en los mas grandes
+TAMANOS_EJECUCION = (1_000, 10_000, 100_000)
+
+# Operadores de las expresiones de cada tipo
+OPERADORES_INT = ('+', '-', '*', '/', '%', '**')
+OPERADORES_FLOAT = ('+', '-', '*', '/', '**')
+# Sin ==, que el lexer todavia separa en dos operadores de asignacion
+OPERADORES_COMPARACION = ('!=', '<', '>', '<=', '>=')
+
+# Palabras de los literales de cadena, comentarios y docstrings
+PALABRAS = ('hola', 'mundo', 'suma', 'total', 'valor', 'dato', 'lista', 'texto', 'numero', 'resultado')
+
+
+# Generador determinista de programas del subconjunto soportado:
+# asignaciones, print, aritmetica anidada, literales enteros, flotantes y
+# de cadena, comentarios y docstrings. Los programas respetan las reglas
+# del checker (cada variable conserva el tipo de su primera asignacion),
+# asi que recorren todas las fases. Parametros:
+#   profundidad    niveles maximos de parentesis de una expresion
+#   anchura        operandos maximos de cada nivel (a + b * c ... )
+#   variables      identificadores distintos como maximo
+#   reutilizacion  probabilidad de que un operando sea una variable en vez
+#                  de un literal, y de que una asignacion reutilice una
+#                  variable existente en vez de declarar otra
+#   cadenas        fraccion de variables nuevas de tipo cadena
+#   prints         fraccion de sentencias que son print
+#   comentarios    fraccion de lineas con un comentario
+#   docstrings     fraccion de lineas que son un docstring
+#   ejecutable     el divisor de cada / y % es un literal distinto de cero
+#                  sin un ** despues, para que el programa se pueda ejecutar
+#                  hasta el final
+class GeneradorProgramas:
+    def __init__(self, semilla=0, profundidad=3, anchura=3, variables=64, reutilizacion=0.7,
+                 cadenas=0.1, prints=0.2, comentarios=0.05, docstrings=0.01, ejecutable=False):
+        self.semilla = semilla
+        self.profundidad = profundidad
+        self.anchura = max(2, anchura)
+        self.variables = max(1, variables)
+        self.reutilizacion = reutilizacion
+        self.cadenas = cadenas
+        self.prints = prints
+        self.comentarios = comentarios
+        self.docstrings = docstrings
+        self.ejecutable = ejecutable
+
+    # Parametros del generador, para guardarlos con los resultados
+    def configuracion(self):
+        return {
+            'semilla': self.semilla,
+            'profundidad': self.profundidad,
+            'anchura': self.anchura,
+            'variables': self.variables,
+            'reutilizacion': self.reutilizacion,
+            'cadenas': self.cadenas,
+            'prints': self.prints,
+            'comentarios': self.comentarios,
+            'docstrings': self.docstrings,
+            'ejecutable': self.ejecutable,
+        }
+
+    # Programa con al menos "tokens" tokens (o "sentencias" sentencias, lo
+    # que se alcance primero). Con la misma configuracion el programa es
+    # siempre el mismo, y el de un tamaño es el comienzo del de uno mayor
+    def generar(self, tokens=None, sentencias=None):
+        self.azar = random.Random(self.semilla)
+        self.tipos = {}             # Variable: 'int', 'float' o 'string'
+        self.hay_float = False      # Si la ultima expresion tiene un operando float
+        self.por_tipo = {'int': [], 'float': [], 'string': []}
+        lineas = []
+        cantidad_tokens = cantidad_sentencias = 0
+        azar = self.azar
+
+        while (tokens is None or cantidad_tokens < tokens) and (sentencias is None or cantidad_sentencias < sentencias):
+            sorteo = azar.random()
+            if sorteo < self.docstrings:
+                lineas.append(f'"""{self._texto(4)}"""')
+                continue
+            if sorteo < self.docstrings + self.comentarios:
+                lineas.append(f"# {self._texto(5)}")
+                continue
+
+            if self.tipos and azar.random() < self.prints:
+                lexemas = self._print()
+            else:
+                lexemas = self._asignacion()
+            lineas.append(unir_lexemas(lexemas))
+            cantidad_tokens += len(lexemas)
+            cantidad_sentencias += 1
+
+        lineas.append("")
+        return "\n".join(lineas)
+
+    # print(expresion) de cualquier tipo, o de una comparacion
+    def _print(self):
+        azar = self.azar
+        if azar.random() < 0.2:
+            tipo = azar.choice(('int', 'float', 'string'))
+            if not self.por_tipo[tipo]:
+                tipo = 'float'
+            izquierda = self._expresion(tipo, self.profundidad - 1)
+            derecha = self._expresion(tipo, self.profundidad - 1)
+            expresion = izquierda + [azar.choice(OPERADORES_COMPARACION)] + derecha
+        else:
+            expresion = self._expresion(azar.choice(('int', 'float', 'float', 'string')), self.profundidad)
+        return ['print', '('] + expresion + [')']
+
+    # variable = expresion del tipo de la variable
+    def _asignacion(self):
+        azar = self.azar
+        if self.tipos and (len(self.tipos) >= self.variables or azar.random() < self.reutilizacion):
+            tipo = azar.choice([tipo for tipo, nombres in self.por_tipo.items() if nombres])
+            return [azar.choice(self.por_tipo[tipo]), '='] + self._expresion(tipo, self.profundidad)
+
+        # La expresion se genera antes de declarar la variable, que todavia
+        # no se puede leer. Una expresion "float" puede haber salido solo con
+        # operandos int; entonces el checker le da tipo int a la variable
+        variable = f"v{len(self.tipos)}"
+        tipo = 'string' if azar.random() < self.cadenas else azar.choice(('int', 'float'))
+        self.hay_float = False
+        expresion = self._expresion(tipo, self.profundidad)
+        if tipo == 'float' and not self.hay_float:
+            tipo = 'int'
+        self.tipos[variable] = tipo
+        self.por_tipo[tipo].append(variable)
+        return [variable, '='] + expresion
+
+    # Lexemas de una expresion del tipo pedido con hasta "profundidad"
+    # niveles de parentesis
+    def _expresion(self, tipo, profundidad):
+        azar = self.azar
+        if tipo == 'string':
+            return [self._operando('string')]
+        if profundidad <= 0 or azar.random() < 0.3:
+            return [self._operando(tipo)]
+
+        operadores = OPERADORES_INT if tipo == 'int' else OPERADORES_FLOAT
+        lexemas = []
+        for i in range(azar.randint(2, self.anchura)):
+            if i:
+                # Un ** despues de un divisor literal lo haria parte de una
+                # potencia, que puede dar 0
+                if self.ejecutable and lexemas[-2:-1] in (['/'], ['%']):
+                    lexemas.append(azar.choice([operador for operador in operadores if operador != '**']))
+                else:
+                    lexemas.append(azar.choice(operadores))
+            # Un float admite operandos int; un int solo int
+            tipo_operando = tipo if tipo == 'int' or azar.random() < 0.7 else 'int'
+            if self.ejecutable and lexemas and lexemas[-1] in ('/', '%'):
+                operando = [str(azar.randint(1, 999))]
+            else:
+                operando = self._expresion(tipo_operando, profundidad - 1)
+            if len(operando) > 1:
+                operando = ['('] + operando + [')']
+            lexemas.extend(operando)
+        return lexemas
+
+    # Variable o literal del tipo pedido
+    def _operando(self, tipo):
+        azar = self.azar
+        if tipo == 'float':
+            self.hay_float = True
+        variables = self.por_tipo[tipo]
+        if variables and azar.random() < self.reutilizacion:
+            return azar.choice(variables)
+        if tipo == 'int':
+            return str(azar.randint(1, 999))
+        if tipo == 'float':
+            return f"{azar.randint(0, 999)}.{azar.randint(1, 99)}"
+        return f'"{self._texto(2)}"'
+
+    def _texto(self, palabras):
+        return " ".join(self.azar.choice(PALABRAS) for _ in range(palabras))
+
+
+# Une los lexemas de una sentencia con espacios, salvo junto a los parentesis
+def unir_lexemas(lexemas):
+    partes = []
+    anterior = '('
+    for lexema in lexemas:
+        if lexema != ')' and anterior != '(' and not (lexema == '(' and anterior == 'print'):
+            partes.append(' ')
+        partes.append(lexema)
+        anterior = lexema
+    return "".join(partes)
+
+
+# Mide cada fase sobre el programa, tomando el mejor tiempo de varias
+# repeticiones. Se usa el tiempo de CPU del proceso, que no cuenta el
+# tiempo en que otros procesos ocupan la maquina. Devuelve los segundos
+# por fase y la entrada de la cache con los contadores del resultado
+def medir_programa(codigo_fuente, repeticiones):
+    mejores = {}
+    entrada = None
+    for _ in range(repeticiones):
+        gc.collect()
+        perfil = Perfilador(medir_memoria=False)
+        perfil.iniciar()
+        entrada = compilar_fuente(codigo_fuente, 1, perfil)
+        perfil.terminar()
+        if entrada['fase'] is not None:
+            raise ValueError(f"El programa generado no compila ({entrada['fase']}): {entrada['errores'][:3]}")
+        for medicion in perfil.fases:
+            mejores[medicion.nombre] = min(mejores.get(medicion.nombre, math.inf), medicion.segundos_cpu)
+    return mejores, entrada
+
+
+# Corre el banco de pruebas sobre todos los tamaños y devuelve los
+# resultados: tiempos por fase y tamaño y el exponente de cada fase
+def correr(generador, tamanos, mostrar=True):
+    resultados = {
+        'formato': FORMATO_RESULTADOS,
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'configuracion': generador.configuracion(),
+        'tamanos': [],
+        'exponentes': {},
+    }
+
+    if mostrar:
+        print(f"{'Tokens':>10}{'Nodos':>10}" + "".join(f"{fase:>14}" for fase in FASES) + f"{'Total':>12}")
+    for tamano in tamanos:
+        codigo_fuente = generador.generar(tokens=tamano)
+        repeticiones = max(1, min(MAXIMO_REPETICIONES, TOKENS_POR_REPETICION // tamano))
+        huella = hashlib.sha256(codigo_fuente.encode('utf-8')).hexdigest()[:16]
+        segundos, entrada = medir_programa(codigo_fuente, repeticiones)
+        del codigo_fuente
+        fila = {
+            'tamano': tamano,
+            'tokens': entrada['tokens'],
+            'nodos': entrada['nodos'],
+            'huella': huella,
+            'repeticiones': repeticiones,
+            'segundos': segundos,
+            'ns_por_token': {fase: 1e9 * segundos[fase] / entrada['tokens'] for fase in segundos},
+        }
+        resultados['tamanos'].append(fila)
+        if mostrar:
+            print(f"{entrada['tokens']:>10}{entrada['nodos']:>10}"
+                  + "".join(f"{formatear_tiempo(segundos.get(fase, 0.0)):>14}" for fase in FASES)
+                  + f"{formatear_tiempo(sum(segundos.values())):>12}")
+
+    resultados['exponentes'] = calcular_exponentes(resultados['tamanos'])
+    if mostrar:
+        mostrar_curvas(resultados)
+    return resultados
+
+
+# Exponente de crecimiento de cada fase: pendiente de la recta que mejor
+# ajusta log(tiempo) contra log(tokens) en los tamaños grandes. Un
+# exponente cercano a 1 es lineal; mayor que EXPONENTE_MAXIMO, superlineal
+def calcular_exponentes(filas):
+    filas = [fila for fila in filas if fila['tokens'] >= TOKENS_MINIMOS_AJUSTE]
+    exponentes = {}
+    if len(filas) < 2:
+        return exponentes
+    for fase in FASES:
+        puntos = [
+            (math.log(fila['tokens']), math.log(fila['segundos'][fase]))
+            for fila in filas if fila['segundos'].get(fase, 0) > 0
+        ]
+        if len(puntos) < 2:
+            continue
+        media_x = sum(x for x, _ in puntos) / len(puntos)
+        media_y = sum(y for _, y in puntos) / len(puntos)
+        varianza = sum((x - media_x) ** 2 for x, _ in puntos)
+        exponentes[fase] = sum((x - media_x) * (y - media_y) for x, y in puntos) / varianza
+    return exponentes
+
+
+# Muestra el tiempo por token de cada fase y tamaño y el exponente de cada
+# fase, marcando las superlineales
+def mostrar_curvas(resultados):
+    print("\nTiempo de CPU por token (ns):")
+    print(f"{'Tokens':>10}" + "".join(f"{fase:>14}" for fase in FASES))
+    for fila in resultados['tamanos']:
+        print(f"{fila['tokens']:>10}"
+              + "".join(f"{fila['ns_por_token'].get(fase, 0.0):>14.0f}" for fase in FASES))
+
+    if not resultados['exponentes']:
+        return
+    print(f"\nCrecimiento (tiempo ~ tokens ** exponente, desde {TOKENS_MINIMOS_AJUSTE} tokens):")
+    for fase in FASES:
+        exponente = resultados['exponentes'].get(fase)
+        if exponente is not None:
+            marca = "  SUPERLINEAL" if exponente > EXPONENTE_MAXIMO else ""
+            print(f"    -   {fase:<14}{exponente:.2f}{marca}")
+
+
+# Fases cuyo crecimiento supera EXPONENTE_MAXIMO
+def fases_superlineales(resultados):
+    return [fase for fase, exponente in resultados['exponentes'].items() if exponente > EXPONENTE_MAXIMO]
+
+
+# Compara con los resultados de una corrida anterior: por cada tamaño y
+# fase medidos en las dos, una regresion es un tiempo por token mayor que
+# el anterior en mas de la tolerancia. Solo se comparan corridas con la
+# misma configuracion del generador y los mismos programas (la huella es
+# el hash del codigo generado)
+def comparar(resultados, anteriores, tolerancia=TOLERANCIA):
+    if anteriores.get('configuracion') != resultados['configuracion']:
+        raise ValueError("Los resultados anteriores se generaron con otra configuracion de programas")
+
+    por_tamano = {fila['tamano']: fila for fila in anteriores['tamanos']}
+    regresiones = []
+    for fila in resultados['tamanos']:
+        anterior = por_tamano.get(fila['tamano'])
+        if anterior is None:
+            continue
+        if anterior['huella'] != fila['huella']:
+            raise ValueError(f"El programa de {fila['tamano']} tokens cambio desde la corrida anterior")
+        for fase, segundos in fila['segundos'].items():
+            segundos_anterior = anterior['segundos'].get(fase)
+            if not segundos_anterior or max(segundos, segundos_anterior) < SEGUNDOS_MINIMOS_COMPARACION:
+                continue
+            razon = fila['ns_por_token'][fase] / anterior['ns_por_token'][fase]
+            if razon > 1 + tolerancia:
+                regresiones.append((fila['tamano'], fase, anterior['ns_por_token'][fase], fila['ns_por_token'][fase], razon))
+    return regresiones
+
+
+# Latencia de compilar el mismo archivo con una invocacion nueva de
+# main.py por pedido (arranque del interprete incluido) y con pedidos a un
+# servidor --serve ya iniciado. Ninguno usa la cache, para medir la
+# compilacion y no la lectura de la cache
+def medir_latencia(codigo_fuente, pedidos):
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    principal = os.path.join(raiz, "main.py")
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "programa.py")
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write(codigo_fuente)
+
+        tiempos = []
+        for _ in range(pedidos):
+            inicio = time.perf_counter()
+            subprocess.run([sys.executable, principal, archivo, "--no-cache"], stdout=subprocess.DEVNULL, check=True)
+            tiempos.append(time.perf_counter() - inicio)
+        resultados['cli'] = resumir_latencias(tiempos)
+
+        ruta_socket = os.path.join(directorio, "servidor.sock")
+        servidor = subprocess.Popen(
+            [sys.executable, principal, "--serve", "--socket", ruta_socket, "-j", "1", "--no-cache"],
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            inicio = time.perf_counter()
+            while not os.path.exists(ruta_socket):
+                if servidor.poll() is not None or time.perf_counter() - inicio > ESPERA_SERVIDOR:
+                    raise RuntimeError("El servidor de compilacion no se inicio")
+                time.sleep(0.01)
+            resultados['arranque_servidor'] = time.perf_counter() - inicio
+
+            tiempos = []
+            with ClienteCompilacion(ruta_socket) as cliente:
+                for _ in range(pedidos):
+                    inicio = time.perf_counter()
+                    respuesta = cliente.compilar(archivo)
+                    tiempos.append(time.perf_counter() - inicio)
+                    if not respuesta['exito']:
+                        raise RuntimeError(f"El servidor no compilo el programa: {respuesta['diagnosticos'][:3]}")
+                cliente.pedir({'comando': 'apagar'})
+            resultados['servidor'] = resumir_latencias(tiempos)
+        finally:
+            servidor.wait(ESPERA_SERVIDOR)
+    return resultados
+
+
+# Mediana, percentil 95 y media de una lista de segundos
+def resumir_latencias(tiempos):
+    ordenados = sorted(tiempos)
+    return {
+        'mediana': ordenados[len(ordenados) // 2],
+        'p95': ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))],
+        'media': sum(ordenados) / len(ordenados),
+    }
+
+
+def mostrar_latencia(resultados, tokens, pedidos):
+    print(f"Latencia por archivo ({tokens} tokens, {pedidos} pedidos, sin cache):")
+    print(f"{'':<26}{'Mediana':>12}{'p95':>12}{'Media':>12}")
+    for clave, nombre in (('cli', 'python main.py'), ('servidor', 'servidor (--serve)')):
+        fila = resultados[clave]
+        print(f"{nombre:<26}{formatear_tiempo(fila['mediana']):>12}{formatear_tiempo(fila['p95']):>12}"
+              f"{formatear_tiempo(fila['media']):>12}")
+    print(f"Arranque del servidor: {formatear_tiempo(resultados['arranque_servidor'])}; "
+          f"cada pedido es {resultados['cli']['mediana'] / resultados['servidor']['mediana']:.1f} veces mas rapido")
+
+
+# Evaluador de referencia de --ejecucion: recorre el arbol en cada
+# ejecucion, despachando por el tipo de cada nodo y eligiendo la operacion
+# de cada BinaryOp por el tipo de sus operandos ya calculados. Tiene la
+# misma semantica que el Interprete de --run (que compila cada sentencia
+# una sola vez a clausuras), para comparar los dos enfoques
+class EvaluadorArbol:
+    def __init__(self, tabla_simbolos):
+        self.tabla_simbolos = tabla_simbolos
+        self.valores = []
+
+    def ejecutar(self, ast, salida):
+        arbol = ast.arbol
+        self.valores = [None] * len(arbol.nombres)
+        partes = []
+        for indice in arbol.hijos(ast.indice):
+            raiz = arbol.primeros_hijos[indice]
+            if raiz == SIN_NODO:
+                continue
+            valor, tipo = self.evaluar(arbol, raiz)
+            codigo = arbol.tipos[indice]
+            if codigo == N_ASSIGN:
+                posicion = arbol.valores[indice]
+                convertir = conversion_asignacion(self.tabla_simbolos.get(arbol.nombres.nombres[posicion], tipo), tipo)
+                self.valores[posicion] = convertir(valor) if convertir else valor
+            elif codigo == N_PRINT:
+                if tipo == 'string':
+                    partes.append(valor)
+                elif tipo == 'float':
+                    partes.append(formato_double(valor))
+                elif tipo == 'bool':
+                    partes.append("1" if valor else "0")
+                else:
+                    partes.append("%d" % valor)
+                partes.append("\n")
+        salida.write("".join(partes))
+
+    # Valor y tipo de un nodo
+    def evaluar(self, arbol, indice):
+        if arbol.constantes and indice in arbol.constantes:
+            return valor_constante(arbol.constantes[indice])
+        codigo = arbol.tipos[indice]
+        if codigo == N_LITERAL:
+            return valor_literal(arbol, indice, arbol.tabla_valores[arbol.valores[indice]])
+        if codigo == N_IDENTIFIER:
+            posicion = arbol.valores[indice]
+            return self.valores[posicion], self.tabla_simbolos.get(arbol.nombres.nombres[posicion], 'int')
+        if codigo == N_BINARY_OP:
+            izquierda = arbol.primeros_hijos[indice]
+            izq, tipo_izq = self.evaluar(arbol, izquierda)
+            der, tipo_der = self.evaluar(arbol, arbol.siguientes[izquierda])
+            return operar(arbol.tabla_valores[arbol.valores[indice]], izq, tipo_izq, der, tipo_der, indice)
+        return 0, 'int'
+
+
+# Operacion binaria de C++ sobre dos valores ya calculados
+def operar(operador, izq, tipo_izq, der, tipo_der, indice):
+    if operador in OPERACIONES_COMPARACION:
+        if operador == '==':
+            return izq == der, 'bool'
+        if operador == '!=':
+            return izq != der, 'bool'
+        if operador == '<':
+            return izq < der, 'bool'
+        if operador == '>':
+            return izq > der, 'bool'
+        if operador == '<=':
+            return izq <= der, 'bool'
+        return izq >= der, 'bool'
+    rango = max(RANGO_NUMERICO.get(tipo_izq, 0), RANGO_NUMERICO.get(tipo_der, 0))
+    if rango == 2:
+        if operador == '**':
+            return pow_cpp(izq, der), 'float'
+        if operador == '+':
+            return izq + der, 'float'
+        if operador == '-':
+            return izq - der, 'float'
+        if operador == '*':
+            return izq * der, 'float'
+        if operador == '/':
+            return (izq / der if der else division_ieee(izq, der)), 'float'
+        return fmod_cpp(izq, der), 'float'
+
+    minimo, maximo, tipo = (INT_MIN, INT_MAX, 'int') if rango == 0 else (LONG_MIN, LONG_MAX, 'long')
+    if operador == '+':
+        resultado = izq + der
+    elif operador == '-':
+        resultado = izq - der
+    elif operador == '*':
+        resultado = izq * der
+    elif operador == '**':
+        resultado = potencia_entera(izq, der, minimo, maximo)
+    elif not der:
+        raise ErrorEjecucion(PLANTILLA_DIVISION if operador == '/' else PLANTILLA_MODULO, indice)
+    elif operador == '/':
+        resultado = izq // der
+        if resultado < 0 and resultado * der != izq:
+            resultado += 1
+    else:
+        resultado = izq % der
+        if resultado and (izq < 0) != (der < 0):
+            resultado -= der
+    if not minimo <= resultado <= maximo:
+        resultado = (resultado - minimo) % (maximo - minimo + 1) + minimo
+    return resultado, tipo
+
+
+# Mejor tiempo real de varias llamadas a "funcion" y lo que devolvio
+def mejor_tiempo(funcion, repeticiones):
+    mejor = math.inf
+    valor = None
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        valor = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, valor
+
+
+# Tiempo de ejecutar cada programa de --ejecucion con el Interprete de
+# --run (compilar a clausuras y ejecutar, y ejecutar de nuevo las
+# clausuras ya compiladas), con el EvaluadorArbol y con el
+# camino del C++ (compilar el .cpp sin cache de binarios y ejecutar el
+# binario, con -fwrapv para que un int que desborda de la vuelta como en
+# el interprete). Se usa el tiempo real, que es lo que espera quien ejecuta el
+# programa; cada tiempo es el mejor de "repeticiones". Las tres salidas
+# deben ser iguales salvo el signo de los NaN: el de una operacion entre
+# dos NaN depende del orden en que el codigo maquina toma los operandos,
+# que cambia entre CPython y el compilador de C++ (y sus opciones)
+def medir_ejecucion(generador, tamanos, repeticiones, mostrar=True):
+    try:
+        opciones = os.environ.get("CXXFLAGS", OPCIONES_POR_DEFECTO) + " -fwrapv"
+        nativo = CompiladorNativo(opciones=opciones, usar_cache=False)
+        nativo.version()
+    except CompiladorNoEncontrado as e:
+        if mostrar:
+            print(f"{e}: no se mide el C++")
+        nativo = None
+    compilador = Compilador(nivel_optimizacion=1)
+    filas = []
+
+    if mostrar:
+        print(f"{'Tokens':>10}{'Nodos':>10}{'Arbol':>12}{'--run':>12}{'Compiladas':>12}"
+              f"{'C++ compilar':>14}{'C++ ejecutar':>14}")
+    for tamano in tamanos:
+        resultado = compilador.compilar(generador.generar(tokens=tamano))
+        if not resultado.exito:
+            raise ValueError(f"El programa generado no compila ({resultado.fase}): {resultado.errores[:3]}")
+
+        def con_clausuras():
+            salida = io.StringIO()
+            errores = Interprete(resultado.tabla_simbolos).ejecutar(resultado.ast, salida)
+            if errores:
+                raise RuntimeError(f"El programa generado fallo al ejecutarlo: {errores[0].mensaje}")
+            return salida.getvalue()
+
+        def con_arbol():
+            salida = io.StringIO()
+            EvaluadorArbol(resultado.tabla_simbolos).ejecutar(resultado.ast, salida)
+            return salida.getvalue()
+
+        interprete = Interprete(resultado.tabla_simbolos)
+        sentencias = interprete.compilar(resultado.ast)
+
+        def compiladas():
+            interprete.correr(resultado.ast, sentencias, io.StringIO())
+
+        clausuras, esperada = mejor_tiempo(con_clausuras, repeticiones)
+        compiladas, _ = mejor_tiempo(compiladas, repeticiones)
+        arbol, salida = mejor_tiempo(con_arbol, repeticiones)
+        esperada = esperada.replace("-nan", "nan")
+        if salida.replace("-nan", "nan") != esperada:
+            raise RuntimeError(f"La salida del evaluador de arbol difiere de la del interprete ({tamano} tokens)")
+        fila = {
+            'tamano': tamano,
+            'tokens': resultado.cantidad_tokens,
+            'nodos': resultado.nodos,
+            'arbol': arbol,
+            'clausuras': clausuras,
+            'clausuras_compiladas': compiladas,
+        }
+
+        if nativo is not None:
+            with tempfile.TemporaryDirectory() as directorio:
+                ruta_cpp = os.path.join(directorio, "programa.cpp")
+                with open(ruta_cpp, 'w', encoding='utf-8') as f:
+                    f.write(resultado.cpp)
+                construido = nativo.construir(ruta_cpp)
+                if not construido.exito:
+                    raise RuntimeError(f"El C++ generado no compila: {construido.error[:500]}")
+                fila['cpp_compilacion'] = construido.segundos
+                fila['cpp_ejecucion'], proceso = mejor_tiempo(
+                    lambda: subprocess.run([construido.binario], capture_output=True, text=True, errors='replace'),
+                    repeticiones,
+                )
+            if proceso.returncode != 0 or proceso.stdout.replace("-nan", "nan") != esperada:
+                raise RuntimeError(f"La salida del ejecutable difiere de la del interprete ({tamano} tokens)")
+        filas.append(fila)
+
+        if mostrar:
+            print(f"{fila['tokens']:>10}{fila['nodos']:>10}{formatear_tiempo(arbol):>12}"
+                  f"{formatear_tiempo(clausuras):>12}{formatear_tiempo(compiladas):>12}"
+                  + (f"{formatear_tiempo(fila['cpp_compilacion']):>14}{formatear_tiempo(fila['cpp_ejecucion']):>14}"
+                     if nativo is not None else ""))
+    return {'formato': FORMATO_RESULTADOS, 'configuracion': generador.configuracion(),
+            'compilador_cpp': nativo.comando if nativo is not None else None, 'ejecucion': filas}
+
+
+# Cada tiempo como multiplo del de --run. Un programa sin ciclos ejecuta
+# cada sentencia una vez, asi que compilar las clausuras cuesta mas de lo
+# que ahorra frente al arbol; lo ahorrado es la columna "Compiladas"
+def mostrar_ejecucion(resultados):
+    print("\nTiempo relativo a --run (mayor que 1: --run es mas rapido):")
+    print(f"{'Tokens':>10}{'Arbol':>12}{'Compiladas':>12}{'C++':>12}")
+    for fila in resultados['ejecucion']:
+        cpp = f"{(fila['cpp_compilacion'] + fila['cpp_ejecucion']) / fila['clausuras']:>11.1f}x" \
+            if 'cpp_compilacion' in fila else f"{'-':>12}"
+        print(f"{fila['tokens']:>10}{fila['arbol'] / fila['clausuras']:>11.2f}x"
+              f"{fila['clausuras_compiladas'] / fila['clausuras']:>11.2f}x{cpp}")
+    print("Arbol: evaluador que despacha por el tipo de cada nodo en cada ejecucion. Compiladas: ejecutar de")
+    print("nuevo las clausuras sin compilarlas. C++: compilar el .cpp y ejecutar el binario.")
+
+
+def mostrar_uso():
+    print("Uso: python -m benchmarks.benchmarks [Opciones]")
+    print("\nOpciones:")
+    print(" --tamanos N,N,...     Tamaños en tokens (por defecto 1000 a 10000000)")
+    print(" --hasta N             Solo los tamaños por defecto de hasta N tokens")
+    print(" --semilla N           Semilla del generador (por defecto 0)")
+    print(" --profundidad N       Niveles maximos de parentesis (por defecto 3)")
+    print(" --anchura N           Operandos maximos por nivel (por defecto 3)")
+    print(" --variables N         Identificadores distintos como maximo (por defecto 64)")
+    print(" --reutilizacion F     Probabilidad de reutilizar una variable (por defecto 0.7)")
+    print(" --json ARCHIVO        Guardar los resultados en ARCHIVO")
+    print(" --comparar ARCHIVO    Comparar con resultados anteriores; termina con codigo 1")
+    print("                       si alguna fase es mas lenta que la tolerancia")
+    print(" --tolerancia F        Aumento relativo permitido (por defecto 0.15)")
+    print(" --generar ARCHIVO     Solo escribir en ARCHIVO un programa de --tokens N tokens")
+    print(" --tokens N            Tamaño del programa de --generar y --latencia")
+    print("                       (por defecto 10000)")
+    print(" --latencia N          Solo comparar N compilaciones con invocaciones nuevas de")
+    print("                       main.py contra N pedidos a un servidor --serve")
+    print(" --ejecucion N         Solo comparar la ejecucion de --run con un evaluador de")
+    print("                       arbol y con compilar y ejecutar el C++ (mejor de N veces;")
+    print("                       por defecto 1000 a 100000 tokens)")
+    print(" -h, --help            Mostrar esta ayuda")
+    print("\nTermina con codigo 1 si alguna fase crece de forma superlineal")
+    print(f"(exponente mayor que {EXPONENTE_MAXIMO}) o si hay regresiones con --comparar.")
+    print("\nEjemplos:")
+    print(" python -m benchmarks.benchmarks --hasta 1000000 --json base.json")
+    print(" python -m benchmarks.benchmarks --hasta 1000000 --comparar base.json")
+    print(" python -m benchmarks.benchmarks --generar programa.py --tokens 100000")
+    print(" python -m benchmarks.benchmarks --latencia 50 --tokens 1000")
+    print(" python -m benchmarks.benchmarks --ejecucion 3")
+
+
+def main(argumentos):
+    # Opciones con valor: nombre -> (conversion, valor por defecto)
+    opciones = {
+        '--tamanos': (lambda valor: [int(tamano) for tamano in valor.split(',')], list(TAMANOS)),
+        '--hasta': (int, None),
+        '--semilla': (int, 0),
+        '--profundidad': (int, 3),
+        '--anchura': (int, 3),
+        '--variables': (int, 64),
+        '--reutilizacion': (float, 0.7),
+        '--json': (str, None),
+        '--comparar': (str, None),
+        '--tolerancia': (float, TOLERANCIA),
+        '--generar': (str, None),
+        '--tokens': (int, 10_000),
+        '--latencia': (int, None),
+        '--ejecucion': (int, None),
+    }
+    valores = {nombre: defecto for nombre, (_, defecto) in opciones.items()}
+
+    i = 0
+    while i < len(argumentos):
+        arg = argumentos[i]
+        if arg in ['-h', '--help']:
+            mostrar_uso()
+            return 0
+        if arg not in opciones or i + 1 == len(argumentos):
+            print(f"Opcion desconocida o sin valor: {arg}")
+            mostrar_uso()
+            return 2
+        try:
+            valores[arg] = opciones[arg][0](argumentos[i + 1])
+        except ValueError:
+            print(f"Valor invalido para {arg}: {argumentos[i + 1]}")
+            return 2
+        i += 2
+
+    generador = GeneradorProgramas(
+        semilla=valores['--semilla'], profundidad=valores['--profundidad'], anchura=valores['--anchura'],
+        variables=valores['--variables'], reutilizacion=valores['--reutilizacion'],
+    )
+
+    if valores['--generar']:
+        with open(valores['--generar'], 'w', encoding='utf-8') as f:
+            f.write(generador.generar(tokens=valores['--tokens']))
+        print(f"Programa de {valores['--tokens']} tokens guardado en: {valores['--generar']}")
+        return 0
+
+    if valores['--latencia']:
+        resultados = medir_latencia(generador.generar(tokens=valores['--tokens']), valores['--latencia'])
+        mostrar_latencia(resultados, valores['--tokens'], valores['--latencia'])
+        if valores['--json']:
+            with open(valores['--json'], 'w', encoding='utf-8') as f:
+                json.dump({'formato': FORMATO_RESULTADOS, 'latencia': resultados}, f, indent=2)
+                f.write("\n")
+        return 0
+
+    tamanos = valores['--tamanos']
+    if valores['--ejecucion'] and '--tamanos' not in argumentos:
+        tamanos = list(TAMANOS_EJECUCION)
+    if valores['--hasta'] is not None:
+        tamanos = [tamano for tamano in tamanos if tamano <= valores['--hasta']]
+
+    if valores['--ejecucion']:
+        generador.ejecutable = True
+        resultados = medir_ejecucion(generador, tamanos, valores['--ejecucion'])
+        mostrar_ejecucion(resultados)
+        if valores['--json']:
+            with open(valores['--json'], 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, indent=2)
+                f.write("\n")
+        return 0
+
+    print("=== BANCO DE PRUEBAS DEL COMPILADOR ===")
+    print(f"Generador: {generador.configuracion()}")
+    print(f"Python {platform.python_version()}, {platform.platform()}")
+    print("=" * 50)
+    resultados = correr(generador, tamanos)
+
+    codigo = 0
+    superlineales = fases_superlineales(resultados)
+    if superlineales:
+        print(f"\nFases con crecimiento superlineal: {', '.join(superlineales)}")
+        codigo = 1
+
+    if valores['--comparar']:
+        with open(valores['--comparar'], encoding='utf-8') as f:
+            anteriores = json.load(f)
+        try:
+            regresiones = comparar(resultados, anteriores, valores['--tolerancia'])
+        except ValueError as e:
+            print(f"\nNo se puede comparar: {e}")
+            return 2
+        if regresiones:
+            print(f"\nRegresiones respecto de {valores['--comparar']}:")
+            for tamano, fase, antes, ahora, razon in regresiones:
+                print(f"    -   {tamano} tokens, {fase}: {antes:.0f} -> {ahora:.0f} ns/token (x{razon:.2f})")
+            codigo = 1
+        else:
+            print(f"\nSin regresiones respecto de {valores['--comparar']} (tolerancia {valores['--tolerancia']:.0%})")
+
+    if valores['--json']:
+        with open(valores['--json'], 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+            f.write("\n")
+        print(f"Resultados guardados en: {valores['--json']}")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
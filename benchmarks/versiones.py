@@ -0,0 +1,415 @@
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+# Compara el rendimiento de una fase del compilador entre dos revisiones
+# del repositorio, para volver a comprobar las mejoras medidas al
+# cambiarla. Cada revision se extrae con "git archive" a un directorio
+# temporal (sin la revision, se usa el arbol de trabajo) y se mide en un
+# proceso aparte que importa sus modulos, sobre el mismo programa generado.
+# Se ejecuta desde la raiz del repositorio:
+#   python -m benchmarks.versiones FASE --antes REV [--despues REV] [Opciones]
+#
+# Este modulo tambien es el proceso que mide: solo usa la biblioteca
+# estandar y la API que todas las revisiones comparten (Lexer(codigo).
+# analizar(), Parser(tokens).parsear(), Checker().verificar(ast),
+# CodeGenerator(ast, tabla_simbolos).generar_codigo(),
+# CompiladorIncremental().actualizar(texto), serialization.guardar y
+# cargar, los atributos tipo,
+# valor e hijos de los nodos y main.contar_nodos_ast), porque se ejecuta con los modulos
+# de la revision medida
+
+# Fases que se pueden comparar: nombre -> descripcion
+FASES = {
+    'lexico': "analisis lexico: tokens por segundo",
+    'tokens': "tokens: memoria retenida por token",
+    'arbol': "AST: memoria por nodo, parser y recorrido",
+    'semantico': "analisis semantico: nodos por segundo",
+    'generacion': "generacion de C++ (-O0): nodos por segundo",
+    'edicion': "--watch: recompilar tras editar una linea",
+    'carga': "AST serializado (--emit-ast): carga frente a reanalizar",
+}
+
+# Tamaño por defecto del programa generado, en tokens
+TOKENS_POR_DEFECTO = 1_000_000
+
+# Metricas de cada fase: clave -> (nombre, unidad, si mas es mejor)
+METRICAS = {
+    'segundos_lexico': ("Tiempo del lexico", 's', False),
+    'tokens_por_segundo': ("Tokens por segundo", 'tok/s', True),
+    'bytes_tokens': ("Memoria de los tokens", 'B', False),
+    'bytes_por_token': ("Memoria por token", 'B/tok', False),
+    'bytes_arbol': ("Memoria del AST", 'B', False),
+    'bytes_por_nodo': ("Memoria por nodo", 'B/nodo', False),
+    'segundos_parser': ("Tiempo del parser", 's', False),
+    'segundos_recorrido': ("Recorrido tipo/valor/hijos", 's', False),
+    'segundos_contar_nodos': ("contar_nodos_ast", 's', False),
+    'segundos_semantico': ("Tiempo del checker", 's', False),
+    'nodos_por_segundo': ("Nodos por segundo", 'nodos/s', True),
+    'segundos_generacion': ("Tiempo del generador", 's', False),
+    'bytes_cpp': ("C++ generado", 'B', False),
+    'segundos_compilacion_inicial': ("Compilacion inicial", 's', False),
+    'segundos_edicion': ("Edicion de una linea", 's', False),
+    'segundos_analisis': ("Lexico y parser", 's', False),
+    'segundos_carga': ("Carga del .ast", 's', False),
+    'bytes_archivo': ("Archivo .ast", 'B', False),
+    'segundos_semantico_cargado': ("Checker sobre el .ast", 's', False),
+}
+
+
+# --- Proceso que mide (con los modulos de la revision) ---
+
+# Mejor tiempo real de varias llamadas a "funcion" y lo que devolvio. El
+# recolector de ciclos se desactiva mientras se mide
+def mejor_tiempo(funcion, repeticiones):
+    mejor = float('inf')
+    valor = None
+    for _ in range(repeticiones):
+        valor = None
+        gc.collect()
+        gc.disable()
+        try:
+            inicio = time.perf_counter()
+            valor = funcion()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        finally:
+            gc.enable()
+    return mejor, valor
+
+
+# Bytes que siguen reservados mientras se conserva lo que devuelve
+# "funcion", medidos con tracemalloc, y lo que devolvio
+def memoria_retenida(funcion):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        valor = funcion()
+        gc.collect()
+        retenidos = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return retenidos, valor
+
+
+def medir_lexico(codigo, repeticiones):
+    from lexer.lexer import Lexer
+
+    segundos, tokens = mejor_tiempo(lambda: Lexer(codigo).analizar(), repeticiones)
+    return {'tokens': len(tokens), 'segundos_lexico': segundos, 'tokens_por_segundo': len(tokens) / segundos}
+
+
+# La memoria de los tokens no incluye la del codigo fuente, que ya estaba
+# leido. Un analisis previo deja compiladas las expresiones regulares
+def medir_tokens(codigo, repeticiones):
+    from lexer.lexer import Lexer
+
+    Lexer("x = 1\n").analizar()
+    retenidos, tokens = memoria_retenida(lambda: Lexer(codigo).analizar())
+    return {'tokens': len(tokens), 'bytes_tokens': retenidos, 'bytes_por_token': retenidos / len(tokens)}
+
+
+# Recorre el AST por la interfaz de los nodos (tipo, valor e hijos) con una
+# pila propia y devuelve la cantidad de nodos
+def recorrer(ast):
+    nodos = 0
+    pendientes = [ast]
+    while pendientes:
+        nodo = pendientes.pop()
+        nodo.tipo, nodo.valor
+        nodos += 1
+        pendientes.extend(nodo.hijos)
+    return nodos
+
+
+# El AST se construye sobre tokens ya analizados; su memoria no incluye la
+# de los tokens ni la del codigo fuente
+def medir_arbol(codigo, repeticiones):
+    from lexer.lexer import Lexer
+    from parser.parser import Parser
+    from main import contar_nodos_ast
+
+    tokens = Lexer(codigo).analizar()
+    Parser(Lexer("x = 1\n").analizar()).parsear()
+    retenidos, ast = memoria_retenida(lambda: Parser(tokens).parsear())
+    segundos_parser, _ = mejor_tiempo(lambda: Parser(tokens).parsear(), repeticiones)
+    segundos_recorrido, nodos = mejor_tiempo(lambda: recorrer(ast), repeticiones)
+    segundos_contar, _ = mejor_tiempo(lambda: contar_nodos_ast(ast), repeticiones)
+    return {'nodos': nodos, 'bytes_arbol': retenidos, 'bytes_por_nodo': retenidos / nodos,
+            'segundos_parser': segundos_parser, 'segundos_recorrido': segundos_recorrido,
+            'segundos_contar_nodos': segundos_contar}
+
+
+# Cada verificacion usa un Checker nuevo, con la tabla de simbolos vacia.
+# La cantidad de errores permite ver que las dos revisiones verificaron lo
+# mismo
+def medir_semantico(codigo, repeticiones):
+    from lexer.lexer import Lexer
+    from parser.parser import Parser
+    from checker.checker import Checker
+
+    ast = Parser(Lexer(codigo).analizar()).parsear()
+    nodos = recorrer(ast)
+    segundos, errores = mejor_tiempo(lambda: Checker().verificar(ast), repeticiones)
+    return {'nodos': nodos, 'errores': len(errores), 'segundos_semantico': segundos,
+            'nodos_por_segundo': nodos / segundos}
+
+
+# Generacion sin optimizar el AST, con la tabla de simbolos del checker.
+# Antes de la generacion por tipos, CodeGenerator solo recibia el AST
+def medir_generacion(codigo, repeticiones):
+    from lexer.lexer import Lexer
+    from parser.parser import Parser
+    from checker.checker import Checker
+    from codegen.generator import CodeGenerator
+
+    ast = Parser(Lexer(codigo).analizar()).parsear()
+    checker = Checker()
+    checker.verificar(ast)
+    nodos = recorrer(ast)
+    try:
+        CodeGenerator(ast, checker.tabla_simbolos)
+        generador = lambda: CodeGenerator(ast, checker.tabla_simbolos)
+    except TypeError:
+        generador = lambda: CodeGenerator(ast)
+    segundos, cpp = mejor_tiempo(lambda: generador().generar_codigo(), repeticiones)
+    return {'nodos': nodos, 'segundos_generacion': segundos, 'nodos_por_segundo': nodos / segundos,
+            'bytes_cpp': len(cpp.encode('utf-8'))}
+
+
+# El compilador incremental de --watch compila el programa y despues, en
+# cada repeticion, se agrega o se quita un print en la linea del medio
+def medir_edicion(codigo, repeticiones):
+    from itertools import cycle
+    from incremental.incremental import CompiladorIncremental
+
+    lineas = codigo.splitlines(True)
+    medio = len(lineas) // 2
+    editado = "".join(lineas[:medio] + ["print(1)\n"] + lineas[medio:])
+    compilador = CompiladorIncremental()
+    segundos_inicial, _ = mejor_tiempo(lambda: compilador.actualizar(codigo), 1)
+    textos = cycle([editado, codigo])
+    segundos, _ = mejor_tiempo(lambda: compilador.actualizar(next(textos)), max(2, repeticiones))
+    return {'segundos_compilacion_inicial': segundos_inicial, 'segundos_edicion': segundos}
+
+
+# Tiempo de obtener el AST volviendo a hacer el analisis lexico y el
+# sintactico frente a cargarlo del archivo de --emit-ast, y del checker
+# sobre el AST en memoria y sobre las columnas mapeadas del archivo. Las
+# revisiones sin el formato serializado solo miden el analisis
+def medir_carga(codigo, repeticiones):
+    from lexer.lexer import Lexer
+    from parser.parser import Parser
+    from checker.checker import Checker
+
+    segundos_analisis, ast = mejor_tiempo(lambda: Parser(Lexer(codigo).analizar()).parsear(), repeticiones)
+    metricas = {'nodos': recorrer(ast), 'segundos_analisis': segundos_analisis}
+    metricas['segundos_semantico'], errores = mejor_tiempo(lambda: Checker().verificar(ast), repeticiones)
+    metricas['errores'] = len(errores)
+    try:
+        from serialization.serialization import guardar, cargar
+    except ImportError:
+        return metricas
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "programa.ast")
+        tokens = Lexer(codigo).analizar()
+        guardar(ruta, tokens, Parser(tokens).parsear())
+        metricas['bytes_archivo'] = os.path.getsize(ruta)
+        metricas['segundos_carga'], archivo = mejor_tiempo(lambda: cargar(ruta), repeticiones)
+        metricas['segundos_semantico_cargado'], _ = mejor_tiempo(lambda: Checker().verificar(archivo.ast),
+                                                                 repeticiones)
+    return metricas
+
+
+MEDICIONES = {
+    'lexico': medir_lexico,
+    'tokens': medir_tokens,
+    'arbol': medir_arbol,
+    'semantico': medir_semantico,
+    'generacion': medir_generacion,
+    'edicion': medir_edicion,
+    'carga': medir_carga,
+}
+
+
+# Mide la fase sobre el programa del archivo y escribe las metricas en JSON
+# por la salida estandar. Lo que impriman los modulos medidos se descarta
+def medir(fase, archivo, repeticiones):
+    with open(archivo, encoding='utf-8') as f:
+        codigo = f.read()
+    salida = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        metricas = MEDICIONES[fase](codigo, repeticiones)
+    finally:
+        sys.stdout = salida
+    json.dump(metricas, salida)
+    salida.write("\n")
+
+
+# --- Proceso que compara ---
+
+# Raiz del repositorio en el que esta este modulo
+def raiz_repositorio():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Extrae la revision a un directorio nuevo dentro de "directorio"
+def extraer_revision(revision, directorio):
+    proceso = subprocess.run(["git", "archive", "--format=tar", revision], cwd=raiz_repositorio(),
+                             capture_output=True)
+    if proceso.returncode != 0:
+        raise ValueError(f"No se pudo extraer la revision {revision}: "
+                         f"{proceso.stderr.decode(errors='replace').strip()}")
+    destino = tempfile.mkdtemp(prefix="revision-", dir=directorio)
+    with tarfile.open(fileobj=io.BytesIO(proceso.stdout)) as archivo_tar:
+        archivo_tar.extractall(destino)
+    return destino
+
+
+# Metricas de la fase con los modulos del arbol "raiz"
+def medir_en(raiz, fase, archivo, repeticiones):
+    entorno = dict(os.environ, PYTHONPATH=raiz, PYTHONDONTWRITEBYTECODE="1")
+    proceso = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--medir", fase, archivo, str(repeticiones)],
+        cwd=raiz, env=entorno, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"La medicion fallo en {raiz}:\n{proceso.stderr.strip()}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+# Compara la fase entre las dos revisiones (None: el arbol de trabajo)
+def comparar(fase, antes, despues, tokens, repeticiones, semilla=0):
+    from benchmarks.benchmarks import GeneradorProgramas
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = os.path.join(directorio, "programa.py")
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write(GeneradorProgramas(semilla=semilla).generar(tokens=tokens))
+        resultados = {}
+        for nombre, revision in (('antes', antes), ('despues', despues)):
+            raiz = extraer_revision(revision, directorio) if revision else raiz_repositorio()
+            resultados[nombre] = medir_en(raiz, fase, archivo, repeticiones)
+    return resultados
+
+
+def formatear(valor, unidad):
+    if unidad == 's':
+        return f"{valor * 1000:.1f} ms" if valor < 1 else f"{valor:.2f} s"
+    if unidad == 'B':
+        return f"{valor / 1_000_000:,.1f} MB"
+    if abs(valor) >= 1000:
+        return f"{valor / 1000:,.1f}k {unidad}"
+    return f"{valor:,.1f} {unidad}"
+
+
+def mostrar(fase, resultados, antes, despues):
+    print(f"Fase: {fase} ({FASES[fase]})")
+    print(f"{'':<30}{antes:>18}{despues or 'arbol de trabajo':>18}{'Cambio':>10}")
+    for clave, (nombre, unidad, mas_es_mejor) in METRICAS.items():
+        if clave not in resultados['antes'] and clave not in resultados['despues']:
+            continue
+        # Una metrica que una de las revisiones no puede medir se muestra
+        # como "-"
+        valor_antes = resultados['antes'].get(clave)
+        valor_despues = resultados['despues'].get(clave)
+        cambio = ""
+        if valor_antes and valor_despues:
+            razon = valor_despues / valor_antes if mas_es_mejor else valor_antes / valor_despues
+            cambio = f"x{razon:.2f}"
+        texto_antes = "-" if valor_antes is None else formatear(valor_antes, unidad)
+        texto_despues = "-" if valor_despues is None else formatear(valor_despues, unidad)
+        print(f"{nombre:<30}{texto_antes:>18}{texto_despues:>18}{cambio:>10}")
+    print("(Cambio: mayor que 1 es una mejora)")
+    if resultados['antes'].get('errores') != resultados['despues'].get('errores'):
+        print(f"Aviso: las revisiones reportaron distinta cantidad de errores "
+              f"({resultados['antes'].get('errores')} y {resultados['despues'].get('errores')})")
+
+
+def mostrar_uso():
+    print("Uso: python -m benchmarks.versiones FASE --antes REV [Opciones]")
+    print("\nFases:")
+    for fase, descripcion in FASES.items():
+        print(f" {fase:<14}{descripcion}")
+    print("\nOpciones:")
+    print(" --antes REV           Revision de referencia (commit, rama o etiqueta de git)")
+    print(" --despues REV         Revision a comparar (por defecto, el arbol de trabajo)")
+    print(f" --tokens N            Tamaño del programa generado (por defecto {TOKENS_POR_DEFECTO})")
+    print(" --repeticiones N      Mediciones por revision; se toma la mejor (por defecto 3)")
+    print(" --semilla N           Semilla del generador (por defecto 0)")
+    print(" --json ARCHIVO        Guardar los resultados en ARCHIVO")
+    print(" -h, --help            Mostrar esta ayuda")
+    print("\nEjemplo:")
+    print(" python -m benchmarks.versiones lexico --antes HEAD~1 --tokens 500000")
+
+
+def main(argumentos):
+    if argumentos[:1] == ['--medir']:
+        medir(argumentos[1], argumentos[2], int(argumentos[3]))
+        return 0
+    if not argumentos or argumentos[0] in ['-h', '--help']:
+        mostrar_uso()
+        return 0
+    fase = argumentos[0]
+    if fase not in FASES:
+        print(f"Fase desconocida: {fase}")
+        mostrar_uso()
+        return 2
+
+    # Opciones con valor: nombre -> (conversion, valor por defecto)
+    opciones = {
+        '--antes': (str, None),
+        '--despues': (str, None),
+        '--tokens': (int, TOKENS_POR_DEFECTO),
+        '--repeticiones': (int, 3),
+        '--semilla': (int, 0),
+        '--json': (str, None),
+    }
+    valores = {nombre: defecto for nombre, (_, defecto) in opciones.items()}
+    i = 1
+    while i < len(argumentos):
+        arg = argumentos[i]
+        if arg in ['-h', '--help']:
+            mostrar_uso()
+            return 0
+        if arg not in opciones or i + 1 == len(argumentos):
+            print(f"Opcion desconocida o sin valor: {arg}")
+            mostrar_uso()
+            return 2
+        try:
+            valores[arg] = opciones[arg][0](argumentos[i + 1])
+        except ValueError:
+            print(f"Valor invalido para {arg}: {argumentos[i + 1]}")
+            return 2
+        i += 2
+    if valores['--antes'] is None:
+        print("Falta la revision de referencia (--antes REV)")
+        return 2
+
+    try:
+        resultados = comparar(fase, valores['--antes'], valores['--despues'], valores['--tokens'],
+                              valores['--repeticiones'], valores['--semilla'])
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        return 1
+    mostrar(fase, resultados, valores['--antes'], valores['--despues'])
+
+    if valores['--json']:
+        with open(valores['--json'], 'w', encoding='utf-8') as f:
+            json.dump({'fase': fase, 'antes': valores['--antes'], 'despues': valores['--despues'],
+                       'tokens': valores['--tokens'], 'resultados': resultados}, f, indent=2)
+            f.write("\n")
+        print(f"Resultados guardados en: {valores['--json']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
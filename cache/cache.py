@@ -0,0 +1,228 @@
+import filecmp
+import hashlib
+import json
+import os
+
+import symbols.symbols
+import lexer.lexer
+import parser.parser
+import checker.checker
+import optimizer.optimizer
+import codegen.generator
+import pipeline.pipeline
+import diagnostics.diagnostics
+
+# Version del formato de las entradas; cambiarla invalida toda la cache
+FORMATO_CACHE = 1
+
+# Modulos cuyo codigo decide el resultado de una compilacion
+MODULOS_COMPILADOR = (
+    symbols.symbols, lexer.lexer, parser.parser, checker.checker, optimizer.optimizer, codegen.generator,
+    pipeline.pipeline, diagnostics.diagnostics,
+)
+
+# Tamaño maximo de la cache en disco; al pasarlo se borran las entradas
+# usadas hace mas tiempo hasta quedar en la fraccion indicada
+TAMANO_MAXIMO_CACHE = 256 * 1024 * 1024
+FRACCION_TRAS_RECORTE = 0.9
+
+# Tamaño de los bloques con los que se calcula el hash del archivo fuente
+BLOQUE_HASH = 1024 * 1024
+
+# Huella del compilador, calculada una vez por proceso
+_huella = None
+
+
+# Directorio de la cache por defecto, dentro de la cache del usuario
+def directorio_por_defecto():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "compilador-python-cpp")
+
+
+# Hash del codigo de los modulos del compilador: si cambia alguno, las
+# entradas anteriores dejan de coincidir
+def huella_compilador():
+    global _huella
+    if _huella is None:
+        h = hashlib.sha256(f"formato {FORMATO_CACHE}".encode())
+        for modulo in MODULOS_COMPILADOR:
+            with open(modulo.__file__, 'rb') as f:
+                h.update(f.read())
+        _huella = h.hexdigest()
+    return _huella
+
+
+# Cache en disco de compilaciones, direccionada por contenido: la clave es
+# el hash de los bytes del archivo fuente, la huella del compilador, el
+# nivel de optimizacion y el limite de errores. Cada entrada guarda el C++ generado, o los errores
+# de la fase que fallo, junto con los contadores del resumen. La fecha de
+# modificacion de una entrada marca su ultimo uso y decide cuales se borran
+# primero cuando la cache supera su tamaño maximo
+class CacheCompilacion:
+    def __init__(self, directorio=None, tamano_maximo=TAMANO_MAXIMO_CACHE):
+        self.directorio = directorio or directorio_por_defecto()
+        self.tamano_maximo = tamano_maximo
+        self.tamano = None      # Bytes ocupados, se mide en la primera escritura
+        self.aciertos = 0
+        self.fallos = 0
+
+    # Clave de un archivo fuente; lo lee por bloques para no cargar
+    # archivos grandes completos en memoria
+    def clave(self, archivo_entrada, nivel_optimizacion, max_errores=None):
+        opciones = f"-O{nivel_optimizacion}"
+        if max_errores is not None:
+            opciones += f" --max-errors {max_errores}"
+        h = hashlib.sha256(f"{huella_compilador()} {opciones}\n".encode())
+        with open(archivo_entrada, 'rb') as f:
+            for bloque in iter(lambda: f.read(BLOQUE_HASH), b''):
+                h.update(bloque)
+        return h.hexdigest()
+
+    # Entrada guardada con la clave, o None. Un acierto renueva la fecha de
+    # la entrada para el orden LRU
+    def buscar(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                entrada = json.loads(f.read())
+            os.utime(ruta)
+        except (OSError, ValueError):
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return entrada
+
+    # Guarda la entrada; los errores de disco solo hacen que no se guarde
+    def guardar(self, clave, entrada):
+        datos = json.dumps(entrada).encode('utf-8')
+        ruta = self._ruta(clave)
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            escribir_atomico(ruta, datos)
+        except OSError:
+            return
+
+        if self.tamano is None:
+            self._recortar()
+        else:
+            self.tamano += len(datos)
+            if self.tamano > self.tamano_maximo:
+                self._recortar()
+
+    # Mide la cache y, si supera el maximo, borra las entradas usadas hace
+    # mas tiempo
+    def _recortar(self):
+        entradas = []
+        for directorio, subdirectorios, nombres in os.walk(self.directorio):
+            # Las entradas estan en subdirectorios de dos caracteres; otros,
+            # como el de los binarios de --build, tienen su propia cache
+            if directorio == self.directorio:
+                subdirectorios[:] = [nombre for nombre in subdirectorios if len(nombre) == 2]
+            for nombre in nombres:
+                ruta = os.path.join(directorio, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except OSError:
+                    continue
+                entradas.append((estado.st_mtime_ns, estado.st_size, ruta))
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        if total > self.tamano_maximo:
+            limite = self.tamano_maximo * FRACCION_TRAS_RECORTE
+            entradas.sort()
+            for _, tamano, ruta in entradas:
+                if total <= limite:
+                    break
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    continue
+                total -= tamano
+        self.tamano = total
+
+    # Las entradas se reparten en subdirectorios por los dos primeros
+    # caracteres de la clave
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave)
+
+
+# Contenido de una entrada: el C++ generado (None si fallo alguna fase),
+# la fase que fallo con sus errores y los contadores del resumen. Con -O2,
+# eliminacion tiene las estadisticas de la eliminacion de asignaciones
+def nueva_entrada(cpp, fase=None, errores=(), tokens=0, nodos=0, variables=0, eliminacion=None):
+    return {
+        'cpp': cpp,
+        'fase': fase,
+        'errores': list(errores),
+        'tokens': tokens,
+        'nodos': nodos,
+        'variables': variables,
+        'eliminacion': eliminacion,
+    }
+
+
+# Entrada con el resultado de un Compilador (ResultadoCompilacion); los
+# diagnosticos se guardan como texto
+def entrada_de_resultado(resultado):
+    eliminacion = None
+    if resultado.exito and resultado.eliminadas is not None:
+        eliminacion = {
+            'sentencias': resultado.sentencias,
+            'eliminadas': resultado.eliminadas,
+            'variables': resultado.variables_eliminadas,
+            'bytes': resultado.bytes_eliminados,
+        }
+    return nueva_entrada(
+        resultado.cpp, resultado.fase, [str(error) for error in resultado.errores], resultado.cantidad_tokens,
+        resultado.nodos, resultado.variables, eliminacion
+    )
+
+
+# Escribe el archivo de forma atomica: primero un temporal en el mismo
+# directorio y despues se renombra sobre el destino, asi nunca queda a
+# medio escribir
+def escribir_atomico(ruta, datos):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except OSError:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+
+# Escribe el codigo generado solo si es distinto del que ya tiene el
+# archivo, para no cambiar su fecha de modificacion. Devuelve si se escribio
+def escribir_si_cambio(ruta, texto):
+    datos = texto.encode('utf-8')
+    try:
+        if os.path.getsize(ruta) == len(datos):
+            with open(ruta, 'rb') as f:
+                if f.read() == datos:
+                    return False
+    except OSError:
+        pass
+    escribir_atomico(ruta, datos)
+    return True
+
+
+# Igual que escribir_si_cambio para un archivo temporal ya escrito: si el
+# destino tiene el mismo contenido (se compara por bloques, sin cargar
+# ninguno de los dos) se borra el temporal; si no, lo reemplaza
+def reemplazar_si_cambio(temporal, ruta):
+    try:
+        if os.path.exists(ruta) and filecmp.cmp(temporal, ruta, shallow=False):
+            os.remove(temporal)
+            return False
+        os.replace(temporal, ruta)
+    except OSError:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    return True
@@ -1,107 +1,226 @@
+from lexer.lexer import CODIGOS_TOKEN
+from parser.parser import SIN_NODO, TIPOS_NODO
+from diagnostics.diagnostics import Diagnostico
+
+# Tipo de cada literal segun el token que lo clasifico
+TIPOS_LITERAL = {
+    CODIGOS_TOKEN['LITERAL_INT']: 'int',
+    CODIGOS_TOKEN['LITERAL_FLOAT']: 'float',
+    CODIGOS_TOKEN['LITERAL_STRING']: 'string',
+}
+
+# Tipos que se pueden asignar a una variable ya declarada de otro tipo,
+# porque C++ los convierte sin perder el valor
+CONVERSIONES_ASIGNACION = {
+    'float': ('int', 'bool'),
+    'int': ('bool',),
+}
+
+
+# Se lanza al llegar al limite de errores para cortar el recorrido
+class LimiteErrores(Exception):
+    pass
+
+
+# La tabla de simbolos se guarda dos veces: tabla_simbolos (nombre: tipo)
+# es la que se lee y se asigna desde fuera, y tipos_nombres es una lista
+# indexada por el id del nombre en la tabla de nombres del arbol, que es la
+# que se consulta en cada identificador. La lista se reconstruye desde el
+# diccionario al cambiar de tabla de nombres o al asignar otro diccionario
 class Checker:
-    def __init__(self):
+    # Con max_errores la verificacion se detiene al llegar a esa cantidad
+    # de errores
+    def __init__(self, max_errores=None):
         self.tabla_simbolos = {}  # Nombre_variable: tipo
         self.errores = []
+        self.max_errores = max_errores
         self.funciones_std = {
             'print': ['any']  # Print acepte cualquier tipo
         }
 
+        # Manejador de cada tipo de nodo, indexado por su codigo en la arena
+        manejadores = {
+            "Program": self._verificar_programa,
+            "Assign": self._verificar_asignacion,
+            "Print": self._verificar_print,
+            "BinaryOp": self._verificar_binaria,
+            "Identifier": self._verificar_identificador,
+            "Literal": self._verificar_literal,
+            "ExprStmt": self._verificar_expresion,
+        }
+        self.manejadores = [manejadores[tipo] for tipo in TIPOS_NODO]
+        self.arbol = None
+
+    @property
+    def tabla_simbolos(self):
+        return self._tabla_simbolos
+
+    @tabla_simbolos.setter
+    def tabla_simbolos(self, tabla):
+        self._tabla_simbolos = tabla
+        self.nombres = None         # TablaNombres de tipos_nombres
+        self.tipos_nombres = []     # id del nombre -> tipo, o None
+        self.ids_std = frozenset()  # ids de funciones_std
+
+    # Enlaza la lista de tipos con la tabla de nombres del arbol y la
+    # extiende hasta los nombres internalizados despues del ultimo enlace
+    def _enlazar(self, nombres):
+        if nombres is not self.nombres:
+            self.nombres = nombres
+            self.tipos_nombres = tipos = [None] * len(nombres)
+            for nombre, tipo in self._tabla_simbolos.items():
+                simbolo = nombres.identificador(nombre)
+                if simbolo >= len(tipos):
+                    tipos.extend([None] * (simbolo + 1 - len(tipos)))
+                tipos[simbolo] = tipo
+            self.ids_std = frozenset(nombres.identificador(nombre) for nombre in self.funciones_std)
+        faltan = len(nombres) - len(self.tipos_nombres)
+        if faltan > 0:
+            self.tipos_nombres.extend([None] * faltan)
+
+    # Declara la variable con su tipo sin verificar una asignacion, por
+    # ejemplo al reutilizar una sentencia ya verificada. La tabla de
+    # simbolos no se debe modificar directamente: la lista no se enteraria
+    def declarar(self, nombre, tipo):
+        self._tabla_simbolos[nombre] = tipo
+        if self.nombres is not None:
+            simbolo = self.nombres.identificador(nombre)
+            self._enlazar(self.nombres)
+            self.tipos_nombres[simbolo] = tipo
+
     # Metodo verificar AST
     def verificar(self, ast):
         self.errores = []
-        self._verificar_nodo(ast)
+        try:
+            self._verificar_nodo(ast)
+        except LimiteErrores:
+            pass
         return self.errores
 
-    # Metodo verificar recursivo nodo AST
-    def _verificar_nodo(self, nodo, contexto=None):
-        if nodo is None:
+    # Metodo verificar una sentencia de nivel superior con la tabla actual
+    def verificar_sentencia(self, nodo):
+        self.errores = []
+        self._verificar_nodo(nodo)
+        return self.errores
+
+    # Metodo verificar nodo AST: recorrido iterativo en postorden sobre la
+    # arena del arbol, con una pila propia. Cada nodo se despacha por su
+    # codigo de tipo a un manejador que recibe el valor del nodo en la arena
+    # (el id del nombre o el indice en tabla_valores) y los tipos ya
+    # calculados de sus hijos; solo se crea un cursor cuando hay que
+    # reportar un error
+    def _verificar_nodo(self, raiz):
+        arbol = self.arbol = raiz.arbol
+        self._enlazar(arbol.nombres)
+        codigos = arbol.tipos
+        valores = arbol.valores
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        manejadores = self.manejadores
+
+        tipos = []      # tipos calculados, pendientes de su padre
+        # (indice del nodo, posicion en tipos de su primer hijo)
+        pila = [(raiz.indice, 0)]
+        hijo = primeros_hijos[raiz.indice]
+        while pila:
+            # Bajar por el primer hijo hasta una hoja
+            while hijo != SIN_NODO:
+                pila.append((hijo, len(tipos)))
+                hijo = primeros_hijos[hijo]
+
+            indice, base = pila.pop()
+            if len(tipos) > base:
+                tipos_hijos = tipos[base:]
+                del tipos[base:]
+            else:
+                tipos_hijos = ()
+
+            try:
+                tipo_resultado = manejadores[codigos[indice]](indice, valores[indice], tipos_hijos)
+            except LimiteErrores:
+                raise
+            except Exception as e:
+                self._agregar_error("Error durante verificacion semantica: {}", indice, e)
+                tipo_resultado = 'unknown'
+            tipos.append(tipo_resultado)
+
+            # Seguir con el hermano siguiente (la raiz no tiene hermanos
+            # dentro del recorrido)
+            if pila:
+                hijo = siguientes[indice]
+
+        return tipos[0]
+
+    # Programa: sus sentencias ya se verificaron en orden
+    def _verificar_programa(self, indice, valor, tipos_hijos):
+        return 'unknown'
+
+    # Asignacion: variable = expresion. En C++ la variable se declara una
+    # sola vez, asi que la primera asignacion fija su tipo y las siguientes
+    # solo aceptan valores de ese tipo o convertibles sin perdida
+    def _verificar_asignacion(self, indice, simbolo, tipos_hijos):
+        if len(tipos_hijos) != 1:
             return 'unknown'
 
-        tipo_resultado = 'unknown'
+        tipo = tipos_hijos[0]
+        declarado = self.tipos_nombres[simbolo]
+        if declarado is None or declarado == 'unknown':
+            # Guardar tipo variable tabla simbolos
+            self.tipos_nombres[simbolo] = tipo
+            self._tabla_simbolos[self.nombres.nombres[simbolo]] = tipo
+            return tipo
 
-        try:
-            if nodo.tipo == "Program":
-                for hijo in nodo.hijos:
-                    self._verificar_nodo(hijo)
-
-            # Asignacion: variable = expresion
-            elif nodo.tipo == "Assign":
-                
-                if len(nodo.hijos) == 1:
-                    tipo_expresion = self._verificar_nodo(nodo.hijos[0])
-
-                    # Guardar/actualizar tipo variable tabla simbolos
-                    self.tabla_simbolos[nodo.valor] = tipo_expresion
-                    tipo_resultado = tipo_expresion
-
-            # Verificar  expresion dentro de print valida
-            elif nodo.tipo == "Print":
-                if len(nodo.hijos) == 1:
-                    tipo_expresion = self._verificar_nodo(nodo.hijos[0])
-                    
-                    # print aceptar cualquier tipo
-                    tipo_resultado = 'void'
-
-            elif nodo.tipo == "BinaryOp":
-                # Operaciones binarias: +, -, *, /, %
-                if len(nodo.hijos) == 2:
-                    tipo_izq = self._verificar_nodo(nodo.hijos[0])
-                    tipo_der = self._verificar_nodo(nodo.hijos[1])
-                    
-                    tipo_resultado = self._verificar_operacion_binaria(nodo.valor, tipo_izq, tipo_der, nodo)
-                    
-            # Uso variable - verificar existencia
-            elif nodo.tipo == "Identifier":
-                # No marcar "print" como variable no definida
-                if nodo.valor in self.funciones_std:
-                    tipo_resultado = 'funcion'
-                elif nodo.valor in self.tabla_simbolos:
-                    tipo_resultado = self.tabla_simbolos[nodo.valor]
-                else:
-                    self._agregar_error(f"Variable no definida '{nodo.valor}'", nodo)
-                    tipo_resultado = 'unknown'
-
-            # Determinar tipo literal
-            elif nodo.tipo == "Literal":
-                if nodo.valor is not None:
-                    if isinstance(nodo.valor, str):
-                        if nodo.valor.startswith(('"', "'")):
-                            tipo_resultado = 'string'
-                        elif nodo.valor.isdigit() or (nodo.valor.startswith('-') and nodo.valor[1:].isdigit()):
-                            tipo_resultado = 'int'
-                        elif '.' in nodo.valor or 'e' in nodo.valor.lower():
-                            try:
-                                float(nodo.valor)
-                                tipo_resultado = 'float'
-                            except ValueError:
-                                tipo_resultado = 'unknown'
-                    
-                    # Valor tipo Python
-                    else:
-                        if isinstance(nodo.valor, int):
-                            tipo_resultado = 'int'
-                        elif isinstance(nodo.valor, float):
-                            tipo_resultado = 'float'
-                        elif isinstance(nodo.valor, str):
-                            tipo_resultado = 'string'
-                
-                if tipo_resultado == 'unknown':
-                    self._agregar_error(f"Tipo de literal no reconocido '{nodo.valor}'", nodo)
-
-            # Expresion statement
-            elif nodo.tipo == "ExprStmt":
-                if len(nodo.hijos) == 1:
-                    tipo_resultado = self._verificar_nodo(nodo.hijos[0])
-
-        except Exception as e:
-            self._agregar_error(f"Error durante verificacion semantica: {str(e)}", nodo)
-
-        return tipo_resultado
+        if tipo != declarado and tipo != 'unknown' and tipo not in CONVERSIONES_ASIGNACION.get(declarado, ()):
+            self._agregar_error(
+                "No se puede asignar {} a la variable '{}' de tipo {}", indice, tipo, self.nombres.nombres[simbolo],
+                declarado
+            )
+        return declarado
+
+    # Verificar expresion dentro de print valida
+    def _verificar_print(self, indice, valor, tipos_hijos):
+        if len(tipos_hijos) != 1:
+            return 'unknown'
+
+        # print aceptar cualquier tipo
+        return 'void'
+
+    # Operaciones binarias: +, -, *, /, %, ** y comparaciones
+    def _verificar_binaria(self, indice, valor, tipos_hijos):
+        if len(tipos_hijos) != 2:
+            return 'unknown'
+        operador = self.arbol.tabla_valores[valor]
+        return self._verificar_operacion_binaria(operador, tipos_hijos[0], tipos_hijos[1], indice)
+
+    # Uso variable - verificar existencia
+    def _verificar_identificador(self, indice, simbolo, tipos_hijos):
+        # No marcar "print" como variable no definida
+        if simbolo in self.ids_std:
+            return 'funcion'
+        tipo = self.tipos_nombres[simbolo]
+        if tipo is None:
+            self._agregar_error("Variable no definida '{}'", indice, self.nombres.nombres[simbolo])
+            return 'unknown'
+        return tipo
+
+    # Determinar tipo literal a partir de la clasificacion del lexer
+    def _verificar_literal(self, indice, valor, tipos_hijos):
+        tipo = TIPOS_LITERAL.get(self.arbol.tipos_token[indice])
+        if tipo is None:
+            self._agregar_error("Tipo de literal no reconocido '{}'", indice, self.arbol.tabla_valores[valor])
+            return 'unknown'
+        return tipo
+
+    # Expresion statement
+    def _verificar_expresion(self, indice, valor, tipos_hijos):
+        if len(tipos_hijos) != 1:
+            return 'unknown'
+        return tipos_hijos[0]
 
     # Metodo verificar compatibilidad tipo operaciones binarias
-    def _verificar_operacion_binaria(self, operador, tipo_izq, tipo_der, nodo):
+    def _verificar_operacion_binaria(self, operador, tipo_izq, tipo_der, indice):
         # Operaciones aritmeticas
-        operadores_aritmeticos = ['+', '-', '*', '/', '%']
+        operadores_aritmeticos = ['+', '-', '*', '/', '%', '**']
         
         # Verificar ambos operandos sean numericos
         if operador in operadores_aritmeticos:
@@ -112,7 +231,7 @@ class Checker:
                     return 'float'
                 return 'int'
             else:
-                self._agregar_error(f"Operacion aritmetica '{operador}' no valida entre {tipo_izq} y {tipo_der}", nodo)
+                self._agregar_error("Operacion aritmetica '{}' no valida entre {} y {}", indice, operador, tipo_izq, tipo_der)
                 return 'unknown'
 
         # Operaciones comparacion
@@ -126,21 +245,22 @@ class Checker:
                 return 'bool'
             else:
                 self._agregar_error(
-                    f"Comparacion '{operador}' no valida entre {tipo_izq} y {tipo_der}",
-                    nodo
+                    "Comparacion '{}' no valida entre {} y {}", indice, operador, tipo_izq, tipo_der
                 )
                 return 'unknown'
 
         return 'unknown'
 
-    # Metodo agregar error a lista de errores
-    def _agregar_error(self, mensaje, nodo=None):
-        if nodo and hasattr(nodo, 'linea') and hasattr(nodo, 'columna'):
-            self.errores.append(f"Error semantico: {mensaje} en linea {nodo.linea}, columna {nodo.columna}")
-        elif nodo and hasattr(nodo, 'linea'):
-            self.errores.append(f"Error semantico: {mensaje} en linea {nodo.linea}")
-        else:
-            self.errores.append(f"Error semantico: {mensaje}")
+    # Metodo agregar error a lista de errores, con la posicion del nodo de
+    # la arena. El mensaje se formatea al mostrarlo
+    def _agregar_error(self, plantilla, indice, *argumentos):
+        linea, columna = self.arbol.ubicar(indice)
+        self.errores.append(Diagnostico(
+            'errores_semanticos', "Error semantico: " + plantilla + " en linea {}, columna {}",
+            argumentos + (linea, columna), linea, columna
+        ))
+        if len(self.errores) == self.max_errores:
+            raise LimiteErrores()
 
     # Metodo mostrar errores semanticos
     def mostrar_errores(self):
@@ -149,4 +269,4 @@ class Checker:
 
     # Retorna tabla simbolos actual (Debugging)
     def obtener_tabla_simbolos(self):
-        return self.tabla_simbolos.copy()
+        return self._tabla_simbolos.copy()
@@ -1,58 +1,484 @@
 import os
+import re
 
+from lexer.lexer import CODIGOS_TOKEN
+from parser.parser import CODIGOS_NODO, SIN_NODO
+
+# Lineas fijas antes y despues de las sentencias del programa. cout no se
+# sincroniza con stdio y cada print termina en '\n' sin vaciar el buffer;
+# se vacia una sola vez al salir
+ENCABEZADO_CPP = [
+    "#include <iostream>",
+    "using namespace std;",
+    "",
+    "int main() {",
+    "    ios::sync_with_stdio(false);"
+]
+PIE_CPP = [
+    "    cout << flush;",
+    "    return 0;",
+    "}"
+]
+
+# Cabeceras y funcion que se agregan solo si el programa usa **. Entre
+# enteros es una potencia entera del tipo de a * b que da la vuelta como
+# los demas operadores (con exponente negativo, 1 / a^-b truncado hacia
+# cero); con un double es pow(). Se llama como ::potencia para que una
+# variable del programa con ese nombre no la oculte
+INCLUDES_POTENCIA = ["#include <cmath>", "#include <type_traits>"]
+FUNCION_POTENCIA = [
+    "template <class B, class E>",
+    "typename enable_if<is_integral<B>::value && is_integral<E>::value, decltype(B() * E())>::type",
+    "potencia(B base, E exponente) {",
+    "    typedef typename make_unsigned<decltype(B() * E())>::type U;",
+    "    if (exponente < 0) return base == 1 ? 1 : base == -1 ? (exponente % 2 ? -1 : 1) : 0;",
+    "    U resultado = 1, factor = base;",
+    "    for (; exponente; exponente /= 2) {",
+    "        if (exponente % 2) resultado *= factor;",
+    "        factor *= factor;",
+    "    }",
+    "    return resultado;",
+    "}",
+    "template <class B, class E>",
+    "typename enable_if<!(is_integral<B>::value && is_integral<E>::value), double>::type",
+    "potencia(B base, E exponente) {",
+    "    return pow(base, exponente);",
+    "}",
+    "",
+]
+
+# Cabecera de fmod(), el % entre double; ** la incluye con las suyas
+INCLUDE_CMATH = "#include <cmath>"
+
+# Cabecera que se agrega solo si el programa declara variables de texto o
+# compara literales de cadena
+INCLUDE_STRING = "#include <string>"
+
+# Tipo de C++ con el que se declara cada tipo del checker
+TIPOS_CPP = {
+    'int': "int",
+    'float': "double",
+    'string': "std::string",
+    'bool': "bool",
+}
+
+# Codigos de los tipos de nodo que recorre el generador
+N_BINARY_OP = CODIGOS_NODO["BinaryOp"]
+N_IDENTIFIER = CODIGOS_NODO["Identifier"]
+N_LITERAL = CODIGOS_NODO["Literal"]
+T_LITERAL_STRING = CODIGOS_TOKEN["LITERAL_STRING"]
+T_LITERAL_FLOAT = CODIGOS_TOKEN["LITERAL_FLOAT"]
+
+# Operadores cuyo resultado es bool aunque sus operandos sean double
+OPERADORES_COMPARACION = frozenset(('==', '!=', '<', '>', '<=', '>='))
+
+# Prefijo de las variables temporales que guardan subexpresiones comunes
+PREFIJO_TEMPORAL = "_t"
+
+# Secuencias de escape y comillas dobles dentro de un literal de cadena
+ESCAPE_O_COMILLA = re.compile(r'\\.|"', re.DOTALL)
+
+
+# Texto C++ de un literal de cadena. Entre comillas simples seria un char
+# en C++: se pasa a comillas dobles, con \' sin escapar y " escapada; las
+# demas secuencias de escape quedan igual
+def literal_cadena(texto):
+    if not texto.startswith("'"):
+        return texto
+
+    def recomillar(match):
+        escape = match.group()
+        return "'" if escape == "\\'" else '\\"' if escape == '"' else escape
+
+    return '"' + ESCAPE_O_COMILLA.sub(recomillar, texto[1:-1]) + '"'
+
+
+# Tabla de hash-consing: las subexpresiones estructuralmente iguales
+# (mismo operador y mismos hijos) reciben el mismo identificador. Cada
+# variable tiene un identificador por valor: al reasignarla se invalida el
+# vigente, y todas las expresiones construidas sobre el quedan muertas
+# porque su clave ya no se puede volver a formar
+class TablaExpresiones:
+    def __init__(self):
+        self.ids = {}           # clave estructural -> identificador
+        self.variables = {}     # nombre -> identificador de su valor vigente
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Identificador de una variable con su valor actual
+    def variable(self, nombre):
+        identificador = self.variables.get(nombre)
+        if identificador is None:
+            identificador = self.variables[nombre] = self._nuevo(("Identifier", nombre, len(self.ids)))
+        return identificador
+
+    # Identificador de un literal, que nunca se invalida
+    def literal(self, texto):
+        return self.ids.get(("Literal", texto)) or self._nuevo(("Literal", texto))
+
+    # Identificador de una operacion binaria sobre dos expresiones ya
+    # identificadas
+    def operacion(self, operador, izquierda, derecha):
+        clave = (operador, izquierda, derecha)
+        return self.ids.get(clave) or self._nuevo(clave)
+
+    # La variable cambia de valor: su proxima lectura es una expresion nueva
+    def invalidar(self, nombre):
+        self.variables.pop(nombre, None)
+
+    # Los identificadores empiezan en 1 para que 0 no pase por ausente
+    def _nuevo(self, clave):
+        identificador = self.ids[clave] = len(self.ids) + 1
+        return identificador
+
+
+# Con subexpresiones_globales (-O2) las temporales de las subexpresiones
+# comunes abarcan todo el programa. Si no, cada sentencia tiene las suyas
+# en un bloque propio y su C++ no depende de las demas sentencias, asi que
+# se puede generar (y conservar) por separado
 class CodeGenerator:
-    def __init__(self, ast):
+    def __init__(self, ast, tabla_simbolos=None, subexpresiones_globales=False):
         self.ast = ast
+        self.tabla_simbolos = tabla_simbolos if tabla_simbolos is not None else {}
+        self.subexpresiones_globales = subexpresiones_globales
+        self.usa_cmath = False      # fmod() o **
+        self.usa_potencia = False   # **
+        self.usa_string = False
+        self.temporales_creados = 0
 
     def generar_codigo(self):
-        lineas = [
-            "#include <iostream>",
-            "using namespace std;",
-            "",
-            "int main() {"
-        ]
+        if self.subexpresiones_globales:
+            return self.armar_programa(self.convertir_sentencias(self.ast.hijos))
+        return self.armar_programa([self.convertir_sentencia(nodo) for nodo in self.ast.hijos])
+
+    # Programa completo: cabeceras, declaracion de las variables y las
+    # lineas de las sentencias dentro de main
+    def armar_programa(self, sentencias):
+        lineas = self.encabezado()
+        lineas.extend(sentencias)
+        lineas.extend(PIE_CPP)
+        return "\n".join(lineas)
 
-        for nodo in self.ast.hijos:
-            linea_cpp = self._convertir_nodo(nodo)
-            if linea_cpp:
-                lineas.append(linea_cpp)
+    # Lineas anteriores a las sentencias: cabeceras (las opcionales despues
+    # de iostream), la funcion de ** antes de main y declaraciones de las
+    # variables al inicio de main
+    def encabezado(self):
+        lineas = list(ENCABEZADO_CPP)
+        if self.usa_potencia:
+            lineas[3:3] = FUNCION_POTENCIA
+        if self.usa_string or 'string' in self.tabla_simbolos.values():
+            lineas.insert(1, INCLUDE_STRING)
+        if self.usa_potencia:
+            lineas[1:1] = INCLUDES_POTENCIA
+        elif self.usa_cmath:
+            lineas.insert(1, INCLUDE_CMATH)
+        lineas.extend(self.declarar_variables())
+        return lineas
 
-        lineas.append("    return 0;")
-        lineas.append("}")
+    # Cada variable se declara una vez al inicio de main con el tipo que le
+    # dio el checker; las asignaciones del programa son solo escrituras. El
+    # orden es alfabetico para que no dependa del orden de verificacion
+    def declarar_variables(self):
+        return [
+            f"    {TIPOS_CPP.get(self.tabla_simbolos[nombre], 'int')} {nombre};"
+            for nombre in sorted(self.tabla_simbolos)
+        ]
+
+    # Traduce una sentencia de nivel superior del AST a código C++, con sus
+    # temporales dentro de un bloque para que no choquen con las de otra.
+    # Dentro de una sentencia ninguna variable cambia de valor, asi que una
+    # operacion se repite solo si su texto se repite: la sentencia se
+    # traduce primero sin identificar sus subexpresiones, y solo si repite
+    # alguna se vuelve a traducir con temporales
+    def convertir_sentencia(self, nodo):
+        self.temporales_creados = 0
+        lineas = self._convertir_sentencia(nodo, None, None, None, None)
+        if lineas is None:
+            lineas = self.convertir_sentencias([nodo])
+            lineas = ["    {"] + ["    " + linea for linea in lineas] + ["    }"]
         return "\n".join(lineas)
 
-    # Traduce cada tipo de nodo del AST a código C++
-    def _convertir_nodo(self, nodo):
-        if nodo.tipo == "Assign":
-            expr = self._convertir_expresion(nodo.hijos[0])
-            return f"    int {nodo.valor} = {expr};"
+    # Traduce una secuencia de sentencias a lineas de C++. Las
+    # subexpresiones que se repiten sin que cambien sus variables se
+    # calculan una vez en una temporal y las siguientes apariciones la usan
+    def convertir_sentencias(self, nodos):
+        tabla = TablaExpresiones()
+        usos = {}
+        nombres = set()
+        ids_sentencias = []
+        for nodo in nodos:
+            ids = self.identificar_expresion(nodo, tabla, nombres)
+            self._contar_usos(nodo, ids, usos)
+            if nodo.tipo == "Assign":
+                nombres.add(nodo.valor)
+                tabla.invalidar(nodo.valor)
+            ids_sentencias.append(ids)
 
-        elif nodo.tipo == "Print":
-            expr = self._convertir_expresion(nodo.hijos[0])
-            return f"    cout << {expr} << endl;"
+        prefijo = PREFIJO_TEMPORAL
+        while any(nombre.startswith(prefijo) for nombre in nombres):
+            prefijo = "_" + prefijo
 
-        elif nodo.tipo == "ExprStmt":
-            expr = self._convertir_expresion(nodo.hijos[0])
-            return f"    {expr};"
+        lineas = []
+        temporales = {}
+        self.temporales_creados = 0
+        for nodo, ids in zip(nodos, ids_sentencias):
+            lineas.extend(self._convertir_sentencia(nodo, ids, usos, temporales, prefijo))
+        return lineas
 
-        else:
-            return f"    // Nodo no reconocido: {nodo.tipo}"
+    # Identificadores de la tabla para cada nodo de la expresion de una
+    # sentencia, de abajo hacia arriba. Agrega a nombres las variables leidas
+    def identificar_expresion(self, nodo, tabla, nombres=None):
+        ids = {}
+        arbol = nodo.arbol
+        if nodo.tipo not in ("Assign", "Print", "ExprStmt"):
+            return ids
+        raiz = arbol.primeros_hijos[nodo.indice]
+        if raiz == SIN_NODO:
+            return ids
+
+        tipos = arbol.tipos
+        valores = arbol.valores
+        tabla_valores = arbol.tabla_valores
+        nombres_arbol = arbol.nombres.nombres
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        constantes = arbol.constantes
+
+        # Nodos en preorden; recorridos al reves, cada hijo se identifica
+        # antes que su padre. Un subarbol plegado es un literal mas
+        orden = []
+        pendientes = [raiz]
+        while pendientes:
+            indice = pendientes.pop()
+            orden.append(indice)
+            if tipos[indice] == N_BINARY_OP and not (constantes and indice in constantes):
+                izquierda = primeros_hijos[indice]
+                pendientes.append(izquierda)
+                pendientes.append(siguientes[izquierda])
 
-    # Traduce expresiones recursivamente
-    def _convertir_expresion(self, nodo):
-        if nodo.tipo == "Literal":
-            # Asegura que las cadenas mantengan comillas
-            if not (nodo.valor.startswith('"') or nodo.valor.startswith("'")):
-                return nodo.valor
-            return nodo.valor  
+        operacion = tabla.operacion
+        for indice in reversed(orden):
+            tipo = tipos[indice]
+            if constantes and indice in constantes:
+                ids[indice] = tabla.literal(constantes[indice])
+            elif tipo == N_BINARY_OP:
+                izquierda = primeros_hijos[indice]
+                ids[indice] = operacion(tabla_valores[valores[indice]], ids[izquierda], ids[siguientes[izquierda]])
+            elif tipo == N_IDENTIFIER:
+                nombre = nombres_arbol[valores[indice]]
+                if nombres is not None:
+                    nombres.add(nombre)
+                ids[indice] = tabla.variable(nombre)
+            elif tipo == N_LITERAL:
+                ids[indice] = tabla.literal(tabla_valores[valores[indice]])
+        return ids
 
-        elif nodo.tipo == "Identifier":
-            return nodo.valor
+    # Cuenta cuantas veces se evalua cada operacion de la sentencia. Una
+    # operacion que ya se evaluo antes cuenta un uso mas y no se recorre por
+    # dentro, porque sus partes no se vuelven a calcular
+    def _contar_usos(self, nodo, ids, usos):
+        if not ids:
+            return
+        arbol = nodo.arbol
+        tipos = arbol.tipos
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        constantes = arbol.constantes
 
-        elif nodo.tipo == "BinaryOp":
-            izq = self._convertir_expresion(nodo.hijos[0])
-            der = self._convertir_expresion(nodo.hijos[1])
-            return f"({izq} {nodo.valor} {der})"
+        pendientes = [primeros_hijos[nodo.indice]]
+        while pendientes:
+            indice = pendientes.pop()
+            if tipos[indice] != N_BINARY_OP or (constantes and indice in constantes):
+                continue
+            identificador = ids[indice]
+            if identificador in usos:
+                usos[identificador] += 1
+                continue
+            usos[identificador] = 1
+            izquierda = primeros_hijos[indice]
+            pendientes.append(siguientes[izquierda])
+            pendientes.append(izquierda)
 
+    # Lineas de C++ de una sentencia: primero las temporales que se
+    # calculan por primera vez en ella y despues la sentencia
+    def _convertir_sentencia(self, nodo, ids, usos, temporales, prefijo):
+        if nodo.tipo not in ("Assign", "Print", "ExprStmt"):
+            return [f"    // Nodo no reconocido: {nodo.tipo}"]
+
+        lineas = []
+        expr = self._convertir_expresion(nodo, ids, usos, temporales, prefijo, lineas)
+        if expr is None:
+            return None
+        if nodo.tipo == "Assign":
+            lineas.append(f"    {nodo.valor} = {expr};")
+        elif nodo.tipo == "Print":
+            lineas.append(f"    cout << {expr} << '\\n';")
         else:
-            return "0"
+            lineas.append(f"    {expr};")
+        return lineas
+
+    # Traduce la expresion de una sentencia en postorden con una pila
+    # explicita, para no depender del limite de recursion en expresiones
+    # muy anidadas. Las expresiones con temporal se reemplazan por su
+    # nombre; las que se usaran mas de una vez crean su temporal en lineas.
+    # Con ids None no hay temporales y devuelve None si una operacion se
+    # repite
+    def _convertir_expresion(self, nodo, ids, usos, temporales, prefijo, lineas):
+        arbol = nodo.arbol
+        tipos = arbol.tipos
+        valores = arbol.valores
+        tabla_valores = arbol.tabla_valores
+        nombres = arbol.nombres.nombres
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        constantes = arbol.constantes
+        tipos_token = arbol.tipos_token
+
+        vistas = set() if ids is None else None
+        resultados = []
+        pendientes = [(primeros_hijos[nodo.indice], False)]
+        while pendientes:
+            indice, visitado = pendientes.pop()
+            tipo = tipos[indice]
+
+            # Subarbol que el optimizador reemplazo por su valor
+            if constantes and indice in constantes:
+                resultados.append(constantes[indice])
+
+            # Los literales conservan su texto; las cadenas, en comillas dobles
+            elif tipo == N_LITERAL:
+                if arbol.tipos_token[indice] == T_LITERAL_STRING:
+                    resultados.append(literal_cadena(tabla_valores[valores[indice]]))
+                else:
+                    resultados.append(tabla_valores[valores[indice]])
+
+            # Las variables se buscan por su id en la tabla de nombres
+            elif tipo == N_IDENTIFIER:
+                resultados.append(nombres[valores[indice]])
+
+            elif tipo == N_BINARY_OP:
+                if ids is not None:
+                    identificador = ids[indice]
+                    temporal = temporales.get(identificador)
+                    if temporal is not None:
+                        resultados.append(temporal)
+                        continue
+                if not visitado:
+                    izquierda = primeros_hijos[indice]
+                    pendientes.append((indice, True))
+                    pendientes.append((siguientes[izquierda], False))
+                    pendientes.append((izquierda, False))
+                    continue
+
+                der = resultados.pop()
+                izq = resultados.pop()
+                operador = tabla_valores[valores[indice]]
+
+                # Un literal de cadena es un char* en C++: se compara como
+                # std::string (el checker solo acepta cadenas en comparaciones).
+                # Su texto ya esta entre comillas dobles
+                izquierda = primeros_hijos[indice]
+                if tipos[izquierda] == N_LITERAL and tipos_token[izquierda] == T_LITERAL_STRING:
+                    self.usa_string = True
+                    izq = f"string{{{izq}}}"
+                derecha = siguientes[izquierda]
+                if tipos[derecha] == N_LITERAL and tipos_token[derecha] == T_LITERAL_STRING:
+                    self.usa_string = True
+                    der = f"string{{{der}}}"
+                if operador == "**":
+                    self.usa_cmath = self.usa_potencia = True
+                    texto = f"::potencia({izq}, {der})"
+                elif operador == "%" and (self.es_double(arbol, izquierda) or self.es_double(arbol, derecha)):
+                    self.usa_cmath = True
+                    texto = f"fmod({izq}, {der})"
+                else:
+                    texto = f"({izq} {operador} {der})"
+
+                if ids is None:
+                    if texto in vistas:
+                        return None
+                    vistas.add(texto)
+                elif usos.get(identificador, 0) > 1:
+                    temporal = temporales[identificador] = f"{prefijo}{self.temporales_creados}"
+                    self.temporales_creados += 1
+                    lineas.append(f"    auto {temporal} = {texto};")
+                    texto = temporal
+                resultados.append(texto)
+
+            else:
+                resultados.append("0")
+
+        return resultados[0]
+
+    # Indica si el subarbol es un double: tiene un operando float al que se
+    # llega por operaciones aritmeticas (una comparacion es bool). Un
+    # subarbol plegado es double si el texto de su constante lo es
+    def es_double(self, arbol, indice):
+        tipos = arbol.tipos
+        constantes = arbol.constantes
+        pendientes = [indice]
+        while pendientes:
+            indice = pendientes.pop()
+            if constantes and indice in constantes:
+                texto = constantes[indice]
+                if '.' in texto or 'e+' in texto or 'e-' in texto:
+                    return True
+                continue
+            tipo = tipos[indice]
+            if tipo == N_LITERAL:
+                if arbol.tipos_token[indice] == T_LITERAL_FLOAT:
+                    return True
+            elif tipo == N_IDENTIFIER:
+                if self.tabla_simbolos.get(arbol.nombres.nombres[arbol.valores[indice]]) == 'float':
+                    return True
+            elif tipo == N_BINARY_OP and arbol.tabla_valores[arbol.valores[indice]] not in OPERADORES_COMPARACION:
+                izquierda = arbol.primeros_hijos[indice]
+                pendientes.append(izquierda)
+                pendientes.append(arbol.siguientes[izquierda])
+        return False
+
+
+# Generador de la compilacion en flujo: recibe las sentencias de a una y
+# produce exactamente las mismas lineas que generar_codigo sin tener el
+# programa completo. Las cabeceras y las declaraciones dependen de todo el
+# programa, asi que las sentencias se recorren dos veces: contar() en el
+# primer recorrido y convertir_sentencia() en el segundo. Las temporales
+# son siempre las de cada sentencia: la compilacion en flujo no admite -O2
+class GeneradorFlujo(CodeGenerator):
+    def __init__(self, tabla_simbolos=None):
+        super().__init__(None, tabla_simbolos)
+
+    # Primer recorrido: uso de **, de % entre double y de literales de
+    # cadena en operaciones (todo nodo de la expresion menos la raiz es un
+    # operando) de una sentencia ya optimizada. Los tipos de las variables
+    # que lee ya estan en la tabla de simbolos
+    def contar(self, nodo):
+        if nodo.tipo not in ("Assign", "Print", "ExprStmt"):
+            return
+        arbol = nodo.arbol
+        raiz = arbol.primeros_hijos[nodo.indice]
+        if raiz == SIN_NODO:
+            return
+        tipos = arbol.tipos
+        constantes = arbol.constantes
+        primeros_hijos = arbol.primeros_hijos
+
+        pendientes = [raiz]
+        while pendientes:
+            indice = pendientes.pop()
+            if constantes and indice in constantes:
+                continue
+            tipo = tipos[indice]
+            if tipo == N_BINARY_OP:
+                operador = arbol.tabla_valores[arbol.valores[indice]]
+                izquierda = primeros_hijos[indice]
+                if operador == "**":
+                    self.usa_cmath = self.usa_potencia = True
+                elif operador == "%" and (self.es_double(arbol, izquierda)
+                                          or self.es_double(arbol, arbol.siguientes[izquierda])):
+                    self.usa_cmath = True
+                pendientes.append(izquierda)
+                pendientes.append(arbol.siguientes[izquierda])
+            elif tipo == N_LITERAL and indice != raiz and arbol.tipos_token[indice] == T_LITERAL_STRING:
+                self.usa_string = True
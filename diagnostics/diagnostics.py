@@ -0,0 +1,58 @@
+import re
+
+# Posicion que los errores de cada fase incluyen en el mensaje
+PATRON_POSICION = re.compile(r"l[ií]nea (\d+)(?:, columna (\d+))?")
+
+
+# Un error de una fase con su posicion separada del texto del mensaje. El
+# texto se arma con la plantilla y sus argumentos recien cuando se pide
+# (al mostrarlo o guardarlo): un archivo con muchos errores no paga por
+# formatear los que nadie lee
+class Diagnostico:
+    __slots__ = ('fase', 'plantilla', 'argumentos', 'linea', 'columna', '_mensaje')
+
+    def __init__(self, fase, plantilla, argumentos=(), linea=None, columna=None):
+        self.fase = fase
+        self.plantilla = plantilla      # Texto con {} para cada argumento
+        self.argumentos = argumentos
+        self.linea = linea
+        self.columna = columna
+        self._mensaje = None
+
+    # Diagnostico de un mensaje ya formateado, tomando la posicion del texto
+    @classmethod
+    def desde_mensaje(cls, fase, mensaje):
+        posicion = PATRON_POSICION.search(mensaje)
+        if posicion is None:
+            return cls(fase, mensaje)
+        columna = posicion.group(2)
+        return cls(fase, mensaje, (), int(posicion.group(1)), int(columna) if columna else None)
+
+    @property
+    def mensaje(self):
+        if self._mensaje is None:
+            self._mensaje = self.plantilla.format(*self.argumentos) if self.argumentos else self.plantilla
+        return self._mensaje
+
+    def a_diccionario(self):
+        return {'fase': self.fase, 'mensaje': self.mensaje, 'linea': self.linea, 'columna': self.columna}
+
+    def __str__(self):
+        return self.mensaje
+
+    def __repr__(self):
+        return f"Diagnostico({self.fase!r}, {self.mensaje!r}, linea={self.linea}, columna={self.columna})"
+
+
+# Diagnosticos de los errores de una fase, que pueden ser Diagnostico o
+# mensajes ya formateados (por ejemplo, los guardados en la cache)
+def diagnosticos(fase, errores):
+    return [
+        error if isinstance(error, Diagnostico) else Diagnostico.desde_mensaje(fase, error)
+        for error in errores
+    ]
+
+
+# Indica si una fase alcanzo el limite de errores (None: sin limite)
+def limite_alcanzado(errores, max_errores):
+    return max_errores is not None and len(errores) >= max_errores
@@ -0,0 +1,500 @@
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+from lexer.lexer import Lexer, T_LITERAL_STRING
+from parser.parser import Parser, CODIGOS_NODO
+from checker.checker import Checker
+from optimizer.optimizer import Optimizador, EliminadorAsignaciones, usos_sentencia
+from codegen.generator import CodeGenerator
+from symbols.symbols import TablaNombres
+
+# Tamaño de los trozos que se comparan al buscar el prefijo y sufijo comunes
+TROZO_COMPARACION = 1 << 16
+
+# Caracteres minimos entre dos cortes de bloque; cortar en cada linea hace
+# que el costo de llamar al lexer y crear los bloques supere al del analisis
+TAMANO_MINIMO_BLOQUE = 256
+
+# Una comilla sin cerrar depende del resto del archivo: si despues aparece
+# la comilla de cierre, todo lo intermedio pasa a ser cadena. Pasa con los
+# errores lexicos por comilla y con un '"""' sin cierre, que el lexer lee
+# como la cadena vacia '""' seguida de otra comilla
+COMILLAS_SIN_CERRAR = tuple(f"Caracter inesperado {repr(c)} " for c in ('"', "'"))
+
+
+# Sentencia de nivel superior con el resultado de cada fase
+class Sentencia:
+    __slots__ = ('nodo', 'nodos', 'usos', 'destino', 'tipo', 'constante',
+                 'errores', 'cpp', 'usa_cmath', 'usa_potencia', 'usa_string', 'verificada', 'leidas', 'efectos')
+
+    def __init__(self, nodo):
+        self.nodo = nodo
+        self.destino = nodo.valor if nodo.tipo == "Assign" else None
+        self.tipo = None        # Tipo asignado a destino tras la verificacion
+        self.constante = None   # Valor constante de destino tras optimizar
+        self.errores = []       # Errores semanticos de la sentencia
+        self.cpp = None         # Linea de C++ generada por si sola
+        self.usa_cmath = False  # La linea usa ** o fmod()
+        self.usa_potencia = False  # La linea usa **
+        self.usa_string = False  # La linea compara literales de cadena
+        self.verificada = False
+        self.leidas = None      # Variables que lee tras optimizar (-O2)
+        self.efectos = False    # Su expresion puede terminar el programa
+
+        # Cantidad de nodos y variables que lee la sentencia
+        arbol = nodo.arbol
+        identificador = CODIGOS_NODO["Identifier"]
+        nodos = 0
+        usos = set()
+        for indice in arbol.subarbol(nodo.indice):
+            nodos += 1
+            if arbol.tipos[indice] == identificador:
+                usos.add(arbol.nombres.nombres[arbol.valores[indice]])
+        self.nodos = nodos
+        self.usos = frozenset(usos)
+
+    # Desplaza las lineas de todos los nodos de la sentencia
+    def desplazar(self, delta):
+        self.nodo.arbol.desplazar_lineas(self.nodo.indice, delta)
+
+
+# Trozo del archivo que empieza en un inicio de linea, en un limite entre
+# sentencias, y que se puede volver a analizar sin tocar el resto
+class Bloque:
+    __slots__ = ('longitud', 'lineas', 'linea_inicio', 'tokens', 'sentencias',
+                 'errores_lexicos', 'errores_sintacticos', 'comilla_abierta')
+
+    def __init__(self, longitud, lineas, linea_inicio, tokens, sentencias,
+                 errores_lexicos, errores_sintacticos, triple_sin_cerrar):
+        self.longitud = longitud
+        self.lineas = lineas
+        self.linea_inicio = linea_inicio
+        self.tokens = tokens
+        self.sentencias = sentencias
+        self.errores_lexicos = errores_lexicos
+        self.errores_sintacticos = errores_sintacticos
+        self.comilla_abierta = triple_sin_cerrar or any(
+            comilla in str(error) for error in errores_lexicos for comilla in COMILLAS_SIN_CERRAR
+        )
+
+
+# Compilador que conserva el resultado de la compilacion anterior y, ante un
+# cambio, vuelve a analizar solo los bloques afectados por la edicion. Con
+# eliminar_muertas (-O2) las asignaciones muertas se quitan al generar, pero
+# las subexpresiones comunes no abarcan todo el programa como en la
+# compilacion completa con -O2
+class CompiladorIncremental:
+    def __init__(self, optimizar=True, eliminar_muertas=False):
+        self.optimizar = optimizar
+        self.eliminar_muertas = eliminar_muertas
+        self.texto = None
+        self.bloques = []
+        self.tabla_simbolos = {}
+        self.codigo_cpp = None
+
+        # Estadisticas de la ultima actualizacion
+        self.bloques_reanalizados = 0
+        self.sentencias_verificadas = 0
+
+        self.generador = CodeGenerator(None)
+        # Todos los bloques comparten la tabla de nombres, asi el checker
+        # no tiene que volver a enlazar sus tipos en cada bloque
+        self.nombres = TablaNombres()
+
+    # Compila la nueva version del codigo reutilizando lo que no cambio
+    def actualizar(self, texto):
+        self.bloques_reanalizados = 0
+        self.sentencias_verificadas = 0
+        if texto == self.texto:
+            return
+
+        if self.texto is None or not self.bloques:
+            i0, inicio, linea = 0, 0, 1
+            destinos = iter([(len(texto), len(self.bloques))])
+        else:
+            i0, inicio, linea, destinos = self._localizar_cambio(self.texto, texto)
+
+        # Tipos y constantes a la salida de la zona vieja, para comparar
+        entrada = self._tabla_hasta(i0)
+        nuevos, i1 = self._analizar_region(texto, inicio, linea, destinos)
+        salida_vieja = dict(entrada)
+        for bloque in self.bloques[i0:i1]:
+            self._aplicar_definiciones(salida_vieja, bloque)
+
+        self.bloques[i0:i1] = nuevos
+        self.texto = texto
+        self.bloques_reanalizados = len(nuevos)
+
+        fin_region = i0 + len(nuevos)
+        ultimo_pendiente = max(fin_region - 1, self._reubicar_desde(texto, fin_region))
+        self._verificar_desde(i0, fin_region, ultimo_pendiente, entrada, salida_vieja)
+        self._generar()
+
+    # Errores de la primera fase que fallo, igual que la compilacion completa
+    def errores(self):
+        for atributo in ('errores_lexicos', 'errores_sintacticos'):
+            errores = [error for bloque in self.bloques for error in getattr(bloque, atributo)]
+            if errores:
+                return atributo, errores
+        errores = [error for bloque in self.bloques for s in bloque.sentencias for error in s.errores]
+        if errores:
+            return 'errores_semanticos', errores
+        return None, []
+
+    def contar_tokens(self):
+        return sum(bloque.tokens for bloque in self.bloques)
+
+    def contar_nodos(self):
+        return 1 + sum(s.nodos for bloque in self.bloques for s in bloque.sentencias)
+
+    # --- Localizacion del cambio ---
+
+    def _localizar_cambio(self, viejo, nuevo):
+        prefijo = prefijo_comun(viejo, nuevo)
+        sufijo = min(sufijo_comun(viejo, nuevo), min(len(viejo), len(nuevo)) - prefijo)
+        fin_viejo = len(viejo) - sufijo
+        delta = len(nuevo) - len(viejo)
+
+        inicios = []
+        posicion = 0
+        for bloque in self.bloques:
+            inicios.append(posicion)
+            posicion += bloque.longitud
+
+        # El bloque anterior al cambio tambien se repite: su ultima sentencia
+        # miro el primer token del bloque editado. Una comilla sin cerrar
+        # antes del cambio puede cerrarse con el texto nuevo
+        k = max(bisect_right(inicios, prefijo) - 1, 0)
+        i0 = max(k - 1, 0)
+        for i in range(i0):
+            if self.bloques[i].comilla_abierta:
+                i0 = i
+                break
+
+        # Puntos de resincronizacion: inicios de bloques que quedaron enteros
+        # en el sufijo comun, junto con el salto de linea que los precede,
+        # en coordenadas del texto nuevo
+        primero = max(bisect_right(inicios, fin_viejo), i0 + 1)
+        destinos = chain(
+            ((inicios[i] + delta, i) for i in range(primero, len(self.bloques))),
+            [(len(nuevo), len(self.bloques))],
+        )
+        return i0, inicios[i0], self.bloques[i0].linea_inicio, destinos
+
+    # --- Analisis lexico y sintactico de una region ---
+
+    # Analiza el texto desde "inicio" hasta el primer destino en el que el
+    # lexer y el parser quedan en el mismo estado que en la compilacion
+    # completa. "destinos" es un iterador de pares (posicion, indice del
+    # bloque viejo) en orden creciente que termina en el final del texto.
+    # Devuelve los bloques nuevos y el indice del primer bloque viejo que se
+    # conserva
+    def _analizar_region(self, texto, inicio, linea, destinos):
+        lexer = Lexer(texto, nombres=self.nombres)
+        lexer.empezar_en(inicio, linea)
+
+        # Inicios de linea en los que termina un lexema: (posicion, tokens,
+        # errores lexicos, linea)
+        cortes = [(inicio, 0, 0, linea)]
+        destino, indice_viejo = next(destinos)
+        while True:
+            while lexer.posicion_actual < destino:
+                salto = texto.find('\n', lexer.posicion_actual + TAMANO_MINIMO_BLOQUE, destino)
+                limite = destino if salto == -1 else salto + 1
+                lexer.analizar(limite)
+                if lexer.posicion_actual == limite:
+                    cortes.append((limite, len(lexer.tokens), len(lexer.errores), lexer.linea_actual))
+
+            # Un lexema (docstring o cadena) paso por encima del destino
+            if lexer.posicion_actual != destino:
+                while destino < lexer.posicion_actual:
+                    destino, indice_viejo = next(destinos)
+                continue
+            if cortes[-1][0] != destino:
+                cortes.append((destino, len(lexer.tokens), len(lexer.errores), lexer.linea_actual))
+
+            iteraciones, errores_sintacticos = self._parsear_region(texto, lexer, destino)
+            if iteraciones is not None:
+                break
+            destino, indice_viejo = next(destinos)
+
+        bloques = self._crear_bloques(lexer, errores_sintacticos, cortes, iteraciones)
+        return bloques, indice_viejo
+
+    # Parsea los tokens de la region mas el primer token que le sigue. Si la
+    # ultima sentencia consume ese token, la region no termina en un limite
+    # entre sentencias y devuelve None en lugar de las iteraciones
+    def _parsear_region(self, texto, lexer, destino):
+        tokens = lexer.tokens
+        total = len(tokens)
+
+        siguiente = Lexer(texto, nombres=self.nombres)
+        siguiente.empezar_en(destino, lexer.linea_actual)
+        while not len(siguiente.tokens) and siguiente.posicion_actual < len(texto):
+            siguiente.analizar(siguiente.posicion_actual + 1)
+        extra = len(siguiente.tokens) > 0
+        if extra:
+            otro = siguiente.tokens
+            tokens.agregar(otro.tipos[0], otro.inicios[0], otro.fines[0], otro.simbolos[0])
+
+        parser = Parser(tokens)
+        iteraciones = []
+        while parser.pos < total:
+            posicion = parser.pos
+            errores = len(parser.errores)
+            iteraciones.append((posicion, errores, parser.parsear_siguiente()))
+        iteraciones.append((total, len(parser.errores), None))
+
+        if extra:
+            for columna in tokens.columnas_token():
+                columna.pop()
+        if parser.pos > total:
+            return None, None
+        return iteraciones, parser.errores
+
+    # Parte la region en bloques por los inicios de linea que son a la vez
+    # limite de lexema y comienzo de una sentencia
+    def _crear_bloques(self, lexer, errores_sintacticos, cortes, iteraciones):
+        por_token = {}
+        for indice, (posicion, _, _) in enumerate(iteraciones):
+            por_token.setdefault(posicion, indice)
+
+        elegidos = {}
+        for corte in cortes[1:]:
+            if corte[1] in por_token:
+                elegidos[corte[1]] = corte
+        limites = [cortes[0]] + sorted(elegidos.values())
+
+        # Tokens '""' o "''" que en el texto van seguidos de la misma comilla
+        tokens = lexer.tokens
+        texto = lexer.codigo_fuente
+        triples = [
+            i for i in range(len(tokens))
+            if tokens.tipos[i] == T_LITERAL_STRING and tokens.fines[i] - tokens.inicios[i] == 2
+            and texto[tokens.fines[i]:tokens.fines[i] + 1] == texto[tokens.inicios[i]]
+        ]
+
+        bloques = []
+        for actual, siguiente in zip(limites, limites[1:]):
+            desde = por_token[actual[1]]
+            hasta = por_token[siguiente[1]]
+            sentencias = [Sentencia(nodo) for _, _, nodo in iteraciones[desde:hasta] if nodo]
+            bloques.append(Bloque(
+                longitud=siguiente[0] - actual[0],
+                lineas=siguiente[3] - actual[3],
+                linea_inicio=actual[3],
+                tokens=siguiente[1] - actual[1],
+                sentencias=sentencias,
+                errores_lexicos=lexer.errores[actual[2]:siguiente[2]],
+                errores_sintacticos=errores_sintacticos[iteraciones[desde][1]:iteraciones[hasta][1]],
+                triple_sin_cerrar=bisect_left(triples, siguiente[1]) > bisect_left(triples, actual[1]),
+            ))
+        return bloques
+
+    # Actualiza las lineas de los bloques que quedaron despues del cambio.
+    # Los que tienen errores lexicos o sintacticos se vuelven a analizar para
+    # que los mensajes muestren la linea nueva. Devuelve el indice del ultimo
+    # bloque con sentencias pendientes de verificar, o -1
+    def _reubicar_desde(self, texto, indice):
+        ultimo_pendiente = -1
+        if indice == 0 or indice >= len(self.bloques):
+            return ultimo_pendiente
+        anterior = self.bloques[indice - 1]
+        delta = anterior.linea_inicio + anterior.lineas - self.bloques[indice].linea_inicio
+        if delta == 0:
+            return ultimo_pendiente
+
+        posicion = sum(bloque.longitud for bloque in self.bloques[:indice])
+        i = indice
+        while i < len(self.bloques):
+            bloque = self.bloques[i]
+            if bloque.errores_lexicos or bloque.errores_sintacticos:
+                destinos = iter([(posicion + bloque.longitud, i + 1), (len(texto), len(self.bloques))])
+                nuevos, hasta = self._analizar_region(texto, posicion, bloque.linea_inicio + delta, destinos)
+                self.bloques[i:hasta] = nuevos
+                self.bloques_reanalizados += len(nuevos)
+                posicion += sum(nuevo.longitud for nuevo in nuevos)
+                i += len(nuevos)
+                ultimo_pendiente = i - 1
+                continue
+
+            bloque.linea_inicio += delta
+            for sentencia in bloque.sentencias:
+                sentencia.desplazar(delta)
+                if sentencia.errores:
+                    sentencia.verificada = False
+                    ultimo_pendiente = i
+            posicion += bloque.longitud
+            i += 1
+        return ultimo_pendiente
+
+    # --- Analisis semantico y generacion ---
+
+    # Tipo y valor constante de cada variable antes del bloque indicado
+    def _tabla_hasta(self, indice):
+        definiciones = {}
+        for bloque in self.bloques[:indice]:
+            self._aplicar_definiciones(definiciones, bloque)
+        return definiciones
+
+    @staticmethod
+    def _aplicar_definiciones(definiciones, bloque):
+        for sentencia in bloque.sentencias:
+            if sentencia.destino is not None:
+                definiciones[sentencia.destino] = estado_variable(sentencia.tipo, sentencia.constante)
+
+    # Verifica (y optimiza) las sentencias nuevas y las que leen una
+    # variable cuyo tipo o valor constante cambio. Al pasar el final de la
+    # region se compara con el estado viejo de las variables; cuando vuelven
+    # a coincidir y no quedan sentencias pendientes, el resto del programa
+    # (y la tabla final) no cambia
+    def _verificar_desde(self, desde, fin_region, ultimo_pendiente, entrada, salida_vieja):
+        checker = Checker()
+        checker.tabla_simbolos = {nombre: tipo for nombre, (tipo, _, _) in entrada.items()}
+        tabla = checker.tabla_simbolos
+        optimizador = Optimizador(tabla) if self.optimizar else None
+        constantes = {nombre: valor for nombre, (_, _, valor) in entrada.items() if valor is not None}
+        if optimizador is not None:
+            optimizador.constantes = constantes
+        cambiados = set()
+
+        for i in range(desde, len(self.bloques)):
+            if i == fin_region:
+                cambiados = {
+                    nombre for nombre in set(tabla) | set(salida_vieja)
+                    if estado_variable(tabla.get(nombre), constantes.get(nombre)) != salida_vieja.get(nombre)
+                }
+            if i >= fin_region and i > ultimo_pendiente and not cambiados:
+                return
+
+            for sentencia in self.bloques[i].sentencias:
+                # Una asignacion depende tambien del tipo con el que ya estaba
+                # declarada su variable
+                if (sentencia.verificada and not (sentencia.usos & cambiados)
+                        and sentencia.destino not in cambiados):
+                    # Mismas entradas que antes: mismo resultado
+                    if sentencia.destino is not None:
+                        checker.declarar(sentencia.destino, sentencia.tipo)
+                        if sentencia.constante is None:
+                            constantes.pop(sentencia.destino, None)
+                        else:
+                            constantes[sentencia.destino] = sentencia.constante
+                    continue
+
+                estado_anterior = estado_variable(sentencia.tipo, sentencia.constante)
+                sentencia.errores = checker.verificar_sentencia(sentencia.nodo)
+                if optimizador is not None:
+                    optimizador.optimizar_sentencia(sentencia.nodo)
+                if sentencia.destino is not None:
+                    sentencia.tipo = tabla[sentencia.destino]
+                    sentencia.constante = constantes.get(sentencia.destino)
+                    estado = estado_variable(sentencia.tipo, sentencia.constante)
+                    if estado != estado_anterior and i >= fin_region:
+                        cambiados.add(sentencia.destino)
+                    else:
+                        cambiados.discard(sentencia.destino)
+                sentencia.cpp = sentencia.leidas = None
+                sentencia.verificada = True
+                self.sentencias_verificadas += 1
+
+        self.tabla_simbolos = dict(tabla)
+
+    # El C++ de una sentencia no depende de las demas (sus temporales van
+    # en su propio bloque, tambien con -O2), asi que se genera una vez y se
+    # conserva hasta que la sentencia se vuelve a verificar
+    def _generar(self):
+        sentencias = [sentencia for bloque in self.bloques for sentencia in bloque.sentencias]
+        tabla_simbolos = self.tabla_simbolos
+        if self.eliminar_muertas:
+            sentencias, tabla_simbolos = self._eliminar_muertas(sentencias)
+
+        generador = self.generador
+        generador.tabla_simbolos = tabla_simbolos
+        lineas = []
+        usa_cmath = usa_potencia = usa_string = False
+        for sentencia in sentencias:
+            if sentencia.cpp is None:
+                generador.usa_cmath = generador.usa_potencia = generador.usa_string = False
+                sentencia.cpp = generador.convertir_sentencia(sentencia.nodo)
+                sentencia.usa_cmath = generador.usa_cmath
+                sentencia.usa_potencia = generador.usa_potencia
+                sentencia.usa_string = generador.usa_string
+            lineas.append(sentencia.cpp)
+            usa_cmath = usa_cmath or sentencia.usa_cmath
+            usa_potencia = usa_potencia or sentencia.usa_potencia
+            usa_string = usa_string or sentencia.usa_string
+
+        generador.usa_cmath = usa_cmath
+        generador.usa_potencia = usa_potencia
+        generador.usa_string = usa_string
+        self.codigo_cpp = generador.armar_programa(lineas)
+
+    # Sentencias que quedan sin las asignaciones muertas, y la tabla de las
+    # variables que hay que declarar. Las lecturas de cada sentencia se
+    # guardan hasta que se vuelve a optimizar
+    def _eliminar_muertas(self, sentencias):
+        eliminador = EliminadorAsignaciones()
+        conservadas = []
+        for sentencia in reversed(sentencias):
+            if sentencia.leidas is None:
+                sentencia.leidas, sentencia.efectos = usos_sentencia(sentencia.nodo.arbol, sentencia.nodo.indice)
+            if eliminador.conservar(sentencia.destino, sentencia.leidas, sentencia.efectos):
+                conservadas.append(sentencia)
+        conservadas.reverse()
+        tabla_simbolos = {
+            nombre: tipo for nombre, tipo in self.tabla_simbolos.items() if nombre in eliminador.variables
+        }
+        return conservadas, tabla_simbolos
+
+
+# Estado de una variable que, si no cambia, no cambia el resultado de las
+# sentencias que la leen. El valor constante se compara tambien por su
+# representacion, para distinguir 1 de 1.0 o de True
+def estado_variable(tipo, constante):
+    return (tipo, repr(constante), constante)
+
+
+# Longitud del prefijo comun de dos cadenas, comparando por trozos
+def prefijo_comun(a, b):
+    limite = min(len(a), len(b))
+    inicio = 0
+    while inicio < limite:
+        fin = min(inicio + TROZO_COMPARACION, limite)
+        if a[inicio:fin] != b[inicio:fin]:
+            break
+        inicio = fin
+    else:
+        return limite
+
+    # Busqueda binaria dentro del trozo que difiere
+    bajo, alto = inicio, min(inicio + TROZO_COMPARACION, limite)
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if a[inicio:medio] == b[inicio:medio]:
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
+
+
+# Longitud del sufijo comun de dos cadenas, comparando por trozos
+def sufijo_comun(a, b):
+    limite = min(len(a), len(b))
+    largo_a, largo_b = len(a), len(b)
+    comun = 0
+    while comun < limite:
+        tramo = min(TROZO_COMPARACION, limite - comun)
+        if a[largo_a - comun - tramo:largo_a - comun] != b[largo_b - comun - tramo:largo_b - comun]:
+            break
+        comun += tramo
+    else:
+        return limite
+
+    bajo, alto = comun, comun + min(TROZO_COMPARACION, limite - comun)
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if a[largo_a - medio:largo_a - comun] == b[largo_b - medio:largo_b - comun]:
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
@@ -0,0 +1,560 @@
+import gc
+import math
+import re
+import sys
+from contextlib import contextmanager
+
+from checker.checker import TIPOS_LITERAL
+from optimizer.optimizer import INT_MIN, INT_MAX
+from parser.parser import CODIGOS_NODO, SIN_NODO
+from diagnostics.diagnostics import Diagnostico
+
+# Rango del long de C++ (64 bits en Linux): el tipo de un literal entero
+# que no cabe en int
+LONG_MIN = -2 ** 63
+LONG_MAX = 2 ** 63 - 1
+
+# Codigos de los tipos de nodo que compila el interprete
+N_ASSIGN = CODIGOS_NODO["Assign"]
+N_PRINT = CODIGOS_NODO["Print"]
+N_BINARY_OP = CODIGOS_NODO["BinaryOp"]
+N_IDENTIFIER = CODIGOS_NODO["Identifier"]
+N_LITERAL = CODIGOS_NODO["Literal"]
+
+# NaN que produce el procesador en 0.0 / 0.0 o inf - inf; el del programa
+# C++ tiene el mismo signo (en x86, negativo: cout lo muestra como -nan)
+NAN_POR_DEFECTO = math.inf - math.inf
+
+# Sentencias que se ejecutan entre cada escritura de la salida acumulada
+SENTENCIAS_POR_ESCRITURA = 4096
+
+# Secuencias de escape de los literales de cadena de C++
+ESCAPE_CPP = re.compile(r'\\(?:([0-7]{1,3})|x([0-9a-fA-F]+)|(.))', re.DOTALL)
+ESCAPES_SIMPLES = {
+    'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v',
+    '\\': '\\', '"': '"', "'": "'", '?': '?',
+}
+
+PLANTILLA_DIVISION = "Error de ejecucion: division entera por cero en linea {}, columna {}"
+PLANTILLA_MODULO = "Error de ejecucion: modulo entero por cero en linea {}, columna {}"
+
+
+# Error del programa al ejecutarlo, o construccion que el C++ generado no
+# acepta. Guarda el nodo que lo produjo; la posicion se busca al reportarlo
+class ErrorEjecucion(Exception):
+    def __init__(self, plantilla, indice, *argumentos):
+        super().__init__(plantilla)
+        self.plantilla = plantilla
+        self.indice = indice
+        self.argumentos = argumentos
+
+
+def _fallar(plantilla, indice, *argumentos):
+    raise ErrorEjecucion(plantilla, indice, *argumentos)
+
+
+# --- Operaciones ---
+# Cada operacion es una fabrica que recibe las clausuras de los operandos
+# y el nodo, y devuelve la clausura de la operacion. Las tablas se eligen
+# por el tipo del resultado, asi que al ejecutar no se pregunta por tipos
+
+# Operaciones enteras de C++ sobre un tipo con el rango indicado: un
+# resultado fuera del rango da la vuelta (lo que hace el ejecutable) y / y %
+# truncan hacia cero
+def _operaciones_enteras(minimo, maximo):
+    modulo = maximo - minimo + 1
+
+    def envolver(resultado):
+        return (resultado - minimo) % modulo + minimo
+
+    def sumar(izq, der, indice):
+        def suma():
+            resultado = izq() + der()
+            return resultado if minimo <= resultado <= maximo else envolver(resultado)
+        return suma
+
+    def restar(izq, der, indice):
+        def resta():
+            resultado = izq() - der()
+            return resultado if minimo <= resultado <= maximo else envolver(resultado)
+        return resta
+
+    def multiplicar(izq, der, indice):
+        def producto():
+            resultado = izq() * der()
+            return resultado if minimo <= resultado <= maximo else envolver(resultado)
+        return producto
+
+    def dividir(izq, der, indice):
+        def division():
+            dividendo = izq()
+            divisor = der()
+            if not divisor:
+                _fallar(PLANTILLA_DIVISION, indice)
+            cociente = dividendo // divisor
+            if cociente < 0 and cociente * divisor != dividendo:
+                cociente += 1
+            return cociente if cociente <= maximo else envolver(cociente)
+        return division
+
+    def modulo_entero(izq, der, indice):
+        def resto():
+            dividendo = izq()
+            divisor = der()
+            if not divisor:
+                _fallar(PLANTILLA_MODULO, indice)
+            resultado = dividendo % divisor
+            if resultado and (dividendo < 0) != (divisor < 0):
+                resultado -= divisor
+            return resultado
+        return resto
+
+    def potenciar(izq, der, indice):
+        def potencia():
+            return potencia_entera(izq(), der(), minimo, maximo)
+        return potencia
+
+    return {'+': sumar, '-': restar, '*': multiplicar, '/': dividir, '%': modulo_entero, '**': potenciar}
+
+
+# a ** b entre enteros (la funcion potencia del C++ generado) sobre un tipo
+# con el rango indicado: el resultado da la vuelta como el de *, y con
+# exponente negativo es 1 / a^-b truncado hacia cero
+def potencia_entera(base, exponente, minimo, maximo):
+    if exponente < 0:
+        return base ** (exponente % 2) if base == 1 or base == -1 else 0
+    modulo = maximo - minimo + 1
+    return (pow(base, exponente, modulo) - minimo) % modulo + minimo
+
+
+# Division de double por cero con la semantica IEEE del ejecutable
+def division_ieee(dividendo, divisor):
+    dividendo = float(dividendo)
+    if dividendo != dividendo:
+        return dividendo
+    if dividendo == 0:
+        return NAN_POR_DEFECTO
+    return math.copysign(math.inf, dividendo) * math.copysign(1.0, divisor)
+
+
+def _dividir_double(izq, der, indice):
+    def division():
+        dividendo = izq()
+        divisor = der()
+        if divisor:
+            return dividendo / divisor
+        return division_ieee(dividendo, divisor)
+    return division
+
+
+# pow() de C++: donde math.pow lanza una excepcion, C++ devuelve infinito o
+# NaN, y un NaN negativo elevado a un entero impar pierde el signo
+def pow_cpp(base, exponente):
+    try:
+        resultado = math.pow(base, exponente)
+    except OverflowError:
+        impar = float(exponente).is_integer() and exponente % 2 == 1
+        return -math.inf if base < 0 and impar else math.inf
+    except ValueError:
+        if base == 0:
+            impar = float(exponente).is_integer() and exponente % 2 == 1
+            return math.copysign(math.inf, base) if impar else math.inf
+        return NAN_POR_DEFECTO
+    if base != base and math.copysign(1.0, base) < 0 and float(exponente).is_integer() and exponente % 2 == 1:
+        return -resultado
+    return resultado
+
+
+def _potencia(izq, der, indice):
+    potencia = math.pow
+
+    def pow_():
+        base = izq()
+        exponente = der()
+        try:
+            resultado = potencia(base, exponente)
+        except (ValueError, OverflowError):
+            return pow_cpp(base, exponente)
+        return resultado if resultado == resultado else pow_cpp(base, exponente)
+    return pow_
+
+
+# fmod() de C++, el % entre double: donde math.fmod lanza una excepcion
+# (divisor cero o dividendo infinito), C++ devuelve NaN
+def fmod_cpp(dividendo, divisor):
+    try:
+        return math.fmod(dividendo, divisor)
+    except ValueError:
+        return NAN_POR_DEFECTO
+
+
+def _modulo_double(izq, der, indice):
+    return lambda: fmod_cpp(izq(), der())
+
+
+OPERACIONES_INT = _operaciones_enteras(INT_MIN, INT_MAX)
+OPERACIONES_LONG = _operaciones_enteras(LONG_MIN, LONG_MAX)
+OPERACIONES_DOUBLE = {
+    '+': lambda izq, der, indice: lambda: izq() + der(),
+    '-': lambda izq, der, indice: lambda: izq() - der(),
+    '*': lambda izq, der, indice: lambda: izq() * der(),
+    '/': _dividir_double,
+    '%': _modulo_double,
+    '**': _potencia,
+}
+OPERACIONES_COMPARACION = {
+    '==': lambda izq, der, indice: lambda: izq() == der(),
+    '!=': lambda izq, der, indice: lambda: izq() != der(),
+    '<': lambda izq, der, indice: lambda: izq() < der(),
+    '>': lambda izq, der, indice: lambda: izq() > der(),
+    '<=': lambda izq, der, indice: lambda: izq() <= der(),
+    '>=': lambda izq, der, indice: lambda: izq() >= der(),
+}
+
+# Tabla de operaciones y tipo del resultado de una operacion aritmetica
+# segun el tipo de sus operandos (los enteros se promueven a long y
+# cualquiera de los dos a double)
+RANGO_NUMERICO = {'int': 0, 'long': 1, 'float': 2}
+OPERACIONES_POR_RANGO = ((OPERACIONES_INT, 'int'), (OPERACIONES_LONG, 'long'), (OPERACIONES_DOUBLE, 'float'))
+
+
+# --- Valores ---
+
+# Texto con el que cout muestra un double: %g con 6 digitos, y -nan para
+# el NaN con signo
+def formato_double(valor):
+    if valor != valor:
+        return "-nan" if math.copysign(1.0, valor) < 0 else "nan"
+    return "%g" % valor
+
+
+# Texto de un literal de cadena de C++ sin las comillas. Los escapes octales
+# y hexadecimales son bytes; si no forman UTF-8 valido se reemplazan
+def texto_cadena(literal):
+    def escape(match):
+        octal, hexadecimal, simple = match.groups()
+        if octal is not None:
+            return chr(int(octal, 8) & 0xFF)
+        if hexadecimal is not None:
+            return chr(int(hexadecimal, 16) & 0xFF)
+        return ESCAPES_SIMPLES.get(simple, simple)
+
+    texto = ESCAPE_CPP.sub(escape, literal[1:-1])
+    if any(0x80 <= ord(caracter) <= 0xFF for caracter in texto):
+        try:
+            texto = texto.encode('latin-1').decode('utf-8', 'replace')
+        except UnicodeEncodeError:
+            pass
+    return texto
+
+
+# --- Interprete ---
+
+# Ejecuta en el proceso un programa ya verificado (y optimizado), con la
+# misma salida que el ejecutable del C++ generado (--run). Cada sentencia
+# se compila una sola vez a clausuras de Python anidadas: un Identifier es
+# una lectura de una posicion de la lista de valores (indexada por el id
+# del nombre), un Literal devuelve su valor y un BinaryOp llama a las
+# clausuras de sus operandos con la operacion ya elegida por los tipos de
+# C++ (division y modulo enteros truncan hacia cero, un int que desborda da
+# la vuelta, ** entre enteros es una potencia entera y con un double, pow()),
+# asi que al ejecutar no se despacha por el tipo de cada nodo. Los
+# subarboles que el optimizador plego son constantes y las sentencias que
+# elimino con -O2 no se ejecutan.
+# Lo que C++ deja sin definir puede dar otro resultado en el ejecutable:
+# un int que desborda (con -O2 el compilador de C++ supone que no pasa;
+# con -fwrapv da la vuelta como aqui), la division entera por cero (aqui
+# es un error de ejecucion) y el signo de una operacion entre dos NaN.
+#
+#   errores = Interprete(resultado.tabla_simbolos).ejecutar(resultado.ast, sys.stdout)
+class Interprete:
+    def __init__(self, tabla_simbolos=None):
+        self.tabla_simbolos = tabla_simbolos if tabla_simbolos is not None else {}
+        self.valores = []       # Valor de cada variable, por id de nombre
+        self.partes = []        # Salida pendiente de escribir
+        self.altura = 0         # Anidamiento maximo de las clausuras
+
+    # Compila y ejecuta el programa escribiendo su salida en "salida" (por
+    # defecto la salida estandar). Devuelve los errores: si el programa
+    # falla, lo que escribio hasta entonces ya esta en la salida
+    def ejecutar(self, ast, salida=None):
+        try:
+            sentencias = self.compilar(ast)
+        except ErrorEjecucion as e:
+            return [self._diagnostico(ast.arbol, e)]
+        return self.correr(ast, sentencias, salida)
+
+    # Ejecuta las sentencias ya compiladas de "ast"; se pueden ejecutar
+    # varias veces sin volver a compilarlas
+    def correr(self, ast, sentencias, salida=None):
+        if salida is None:
+            salida = sys.stdout
+
+        # Cada nivel de anidamiento de una expresion es una llamada
+        limite = sys.getrecursionlimit()
+        if self.altura + 100 > limite:
+            sys.setrecursionlimit(self.altura + 100)
+        partes = self.partes
+        try:
+            with _sin_recolector():
+                for inicio in range(0, len(sentencias), SENTENCIAS_POR_ESCRITURA):
+                    for sentencia in sentencias[inicio:inicio + SENTENCIAS_POR_ESCRITURA]:
+                        sentencia()
+                    if partes:
+                        salida.write("".join(partes))
+                        partes.clear()
+        except ErrorEjecucion as e:
+            return [self._diagnostico(ast.arbol, e)]
+        finally:
+            if partes:
+                salida.write("".join(partes))
+                partes.clear()
+            sys.setrecursionlimit(limite)
+        return []
+
+    # Clausuras de las sentencias del programa, en orden
+    def compilar(self, ast):
+        arbol = ast.arbol
+        self.valores = [None] * len(arbol.nombres)
+        with _sin_recolector():
+            return [self.compilar_sentencia(arbol, indice) for indice in arbol.hijos(ast.indice)]
+
+    # Clausura de una sentencia de nivel superior
+    def compilar_sentencia(self, arbol, indice):
+        if len(self.valores) < len(arbol.nombres):
+            self.valores.extend([None] * (len(arbol.nombres) - len(self.valores)))
+        raiz = arbol.primeros_hijos[indice]
+        if raiz == SIN_NODO:
+            return _nada
+        expresion, tipo, constante = self._compilar_expresion(arbol, raiz)
+        codigo = arbol.tipos[indice]
+        if codigo == N_ASSIGN:
+            return self._asignacion(arbol, indice, expresion, tipo, constante)
+        if codigo == N_PRINT:
+            return self._print(expresion, tipo)
+        return expresion
+
+    # Asignacion: el valor se guarda convertido al tipo con el que se
+    # declara la variable
+    def _asignacion(self, arbol, indice, expresion, tipo, constante):
+        valores = self.valores
+        posicion = arbol.valores[indice]
+        declarado = self.tabla_simbolos.get(arbol.nombres.nombres[posicion], tipo)
+        convertir = conversion_asignacion(declarado, tipo)
+
+        if constante is not None:
+            valor = convertir(constante[0]) if convertir else constante[0]
+
+            def asignar_constante():
+                valores[posicion] = valor
+            return asignar_constante
+        if convertir is not None:
+            def asignar_convertido():
+                valores[posicion] = convertir(expresion())
+            return asignar_convertido
+
+        def asignar():
+            valores[posicion] = expresion()
+        return asignar
+
+    # print: cout muestra los bool como 1 y 0 y los double con %g
+    def _print(self, expresion, tipo):
+        agregar = self.partes.append
+        if tipo == 'string':
+            def imprimir_cadena():
+                agregar(expresion() + "\n")
+            return imprimir_cadena
+        if tipo == 'float':
+            def imprimir_double():
+                valor = expresion()
+                agregar("%g\n" % valor if valor == valor else formato_double(valor) + "\n")
+            return imprimir_double
+        if tipo == 'bool':
+            def imprimir_bool():
+                agregar("1\n" if expresion() else "0\n")
+            return imprimir_bool
+
+        def imprimir_entero():
+            agregar("%d\n" % expresion())
+        return imprimir_entero
+
+    # Clausura, tipo y valor constante (una tupla, o None) de una expresion.
+    # Los nodos se compilan en postorden con pilas explicitas, asi que
+    # compilar no depende del limite de recursion; ejecutar una expresion
+    # muy anidada si, y ejecutar() lo amplia
+    def _compilar_expresion(self, arbol, raiz):
+        tipos_nodo = arbol.tipos
+        valores_nodo = arbol.valores
+        tabla_valores = arbol.tabla_valores
+        nombres = arbol.nombres.nombres
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        constantes = arbol.constantes
+        tabla_simbolos = self.tabla_simbolos
+        valores = self.valores
+
+        # Nodos en preorden (el derecho antes que el izquierdo) con su
+        # profundidad; recorridos al reves quedan en postorden. Un subarbol
+        # plegado es una constante
+        orden = []
+        pendientes = [raiz]
+        profundidades = [1]
+        altura = 1
+        while pendientes:
+            indice = pendientes.pop()
+            profundidad = profundidades.pop()
+            orden.append(indice)
+            if tipos_nodo[indice] == N_BINARY_OP and not (constantes and indice in constantes):
+                izquierda = primeros_hijos[indice]
+                pendientes.append(izquierda)
+                pendientes.append(siguientes[izquierda])
+                profundidad += 1
+                profundidades.append(profundidad)
+                profundidades.append(profundidad)
+                if profundidad > altura:
+                    altura = profundidad
+
+        # Pilas paralelas de clausuras, tipos y constantes de los operandos
+        clausuras = []
+        tipos = []
+        valores_constantes = []
+        for indice in reversed(orden):
+            codigo = tipos_nodo[indice]
+            if constantes and indice in constantes:
+                valor, tipo = valor_constante(constantes[indice])
+                clausuras.append(_constante(valor))
+                tipos.append(tipo)
+                valores_constantes.append((valor,))
+            elif codigo == N_LITERAL:
+                valor, tipo = valor_literal(arbol, indice, tabla_valores[valores_nodo[indice]])
+                clausuras.append(_constante(valor))
+                tipos.append(tipo)
+                valores_constantes.append((valor,))
+            elif codigo == N_IDENTIFIER:
+                posicion = valores_nodo[indice]
+                clausuras.append(_lectura(valores, posicion))
+                tipos.append(tabla_simbolos.get(nombres[posicion], 'int'))
+                valores_constantes.append(None)
+            elif codigo == N_BINARY_OP:
+                der = clausuras.pop()
+                tipo_der = tipos.pop()
+                izq = clausuras[-1]
+                fabrica, tipo = _operacion(tabla_valores[valores_nodo[indice]], tipos[-1], tipo_der)
+                valores_constantes.pop()
+                clausuras[-1] = fabrica(izq, der, indice)
+                tipos[-1] = tipo
+                valores_constantes[-1] = None
+            else:
+                clausuras.append(_constante(0))
+                tipos.append('int')
+                valores_constantes.append((0,))
+
+        if altura > self.altura:
+            self.altura = altura
+        return clausuras[0], tipos[0], valores_constantes[0]
+
+    # Diagnostico de un error con la posicion de su nodo
+    @staticmethod
+    def _diagnostico(arbol, error):
+        linea, columna = arbol.ubicar(error.indice)
+        return Diagnostico('errores_ejecucion', error.plantilla, error.argumentos + (linea, columna), linea, columna)
+
+
+# Fabrica y tipo del resultado de una operacion binaria segun el tipo de
+# sus operandos, ya aceptados por el checker. Hay pocas combinaciones, asi
+# que se eligen una sola vez
+def _operacion(operador, tipo_izq, tipo_der):
+    clave = (operador, tipo_izq, tipo_der)
+    elegida = _OPERACIONES_ELEGIDAS.get(clave)
+    if elegida is None:
+        elegida = _OPERACIONES_ELEGIDAS[clave] = _elegir_operacion(operador, tipo_izq, tipo_der)
+    return elegida
+
+
+def _elegir_operacion(operador, tipo_izq, tipo_der):
+    comparacion = OPERACIONES_COMPARACION.get(operador)
+    if comparacion is not None:
+        return comparacion, 'bool'
+    operaciones, tipo = OPERACIONES_POR_RANGO[max(RANGO_NUMERICO.get(tipo_izq, 0), RANGO_NUMERICO.get(tipo_der, 0))]
+    return operaciones[operador], tipo
+
+
+_OPERACIONES_ELEGIDAS = {}
+
+
+# Valor y tipo de C++ de un literal. Una cadena es la misma entre
+# comillas simples o dobles; un entero que no cabe en int es long, y los
+# que C++ no acepta hacen que el C++ generado no compile
+def valor_literal(arbol, indice, texto):
+    tipo = TIPOS_LITERAL.get(arbol.tipos_token[indice])
+    if tipo == 'string':
+        return texto_cadena(texto), 'string'
+    if not texto.isascii():
+        _fallar("Error de ejecucion: literal numerico no valido en C++ '{}' en linea {}, columna {}", indice, texto)
+    if tipo == 'float':
+        return float(texto), 'float'
+    try:
+        # En C++ un entero con cero inicial es octal
+        valor = int(texto, 8) if len(texto) > 1 and texto[0] == '0' else int(texto)
+    except ValueError:
+        _fallar("Error de ejecucion: literal numerico no valido en C++ '{}' en linea {}, columna {}", indice, texto)
+    if valor <= INT_MAX:
+        return valor, 'int'
+    if valor <= LONG_MAX:
+        return valor, 'long'
+    _fallar("Error de ejecucion: el entero {} no cabe en long en linea {}, columna {}", indice, texto)
+
+
+# Conversion que C++ aplica al asignar un valor de tipo "tipo" a una
+# variable declarada con tipo "declarado" (None si no hace falta)
+def conversion_asignacion(declarado, tipo):
+    if declarado == 'float' and tipo != 'float':
+        return float
+    if declarado == 'int' and tipo == 'bool':
+        return int
+    if declarado == 'int' and tipo == 'long':
+        return a_int
+    return None
+
+
+# Valor y tipo del texto C++ de una constante plegada por el optimizador
+def valor_constante(texto):
+    if texto in ("true", "false"):
+        return texto == "true", 'bool'
+    try:
+        valor = int(texto)
+    except ValueError:
+        return float(texto), 'float'
+    return valor, 'int' if INT_MIN <= valor <= INT_MAX else 'long'
+
+
+# Conversion de long a int: el valor da la vuelta
+def a_int(valor):
+    return (valor - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+# Desactiva el recolector de ciclos mientras se compila o se ejecuta: las
+# clausuras no forman ciclos, pero son muchos objetos nuevos y cada pasada
+# del recolector las recorre todas, asi que compilar un programa grande
+# creceria mas que linealmente
+@contextmanager
+def _sin_recolector():
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo:
+            gc.enable()
+
+
+def _constante(valor):
+    return lambda: valor
+
+
+def _lectura(valores, posicion):
+    return lambda: valores[posicion]
+
+
+def _nada():
+    pass
@@ -1,7 +1,14 @@
 import re
-from typing import List, Tuple
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from diagnostics.diagnostics import Diagnostico
+from symbols.symbols import TablaNombres
 
 class Token:
+    __slots__ = ('tipo', 'valor', 'linea', 'columna')
+
     def __init__(self, tipo: str, valor: str, linea: int, columna: int):
         self.tipo = tipo
         self.valor = valor
@@ -18,137 +25,511 @@ class Token:
         return self.__str__()
 
 
+# Palabras reservadas de Python reconocidas por el lexer
+PALABRAS_CLAVE: Tuple[str, ...] = ('class', 'def', 'return', 'if', 'else', 'while', 'for', 'None', 'True', 'False')
+OPERADORES_LOGICOS: Tuple[str, ...] = ('and', 'or', 'not')
+
+# Definicion de los patrones regex para cada tipo de token, en orden de prioridad
+PATRONES_CRUDOS: List[Tuple[str, str]] = [
+
+    # Comentarios (se ignoran pero deben actualizar posicion)
+    ('COMENTARIO', r'#.*'),
+
+    # Docstrings (triple comillas, pueden ser multilinea)
+    ('DOCSTRING', r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\''),
+
+    # Saltos de linea (actualizan posicion pero normalmente no generan token)
+    ('NEWLINE', r'\n'),
+
+    # Palabras clave de Python
+    ('PALABRA_CLAVE', r'\b(?:' + '|'.join(PALABRAS_CLAVE) + r')\b'),
+
+    # Operadores logicos
+    ('OPERADOR_LOGICO', r'\b(?:' + '|'.join(OPERADORES_LOGICOS) + r')\b'),
+
+    # Literales
+    ('LITERAL_STRING', r'\"(?:\\.|[^"\\])*\"|\'(?:\\.|[^\'\\])*\''),
+    ('LITERAL_FLOAT', r'\b(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?\b'),
+    ('LITERAL_INT', r'\b\d+\b'),
+
+    # Operadores aritmeticos, asignacion y comparacion
+    ('OPERADOR_MATEMATICO', r'\*\*|\*|/|\+|-|%'),
+    ('OPERADOR_ASIGNACION', r'\+=|-=|\*=|/=|%=|='),
+    ('OPERADOR_COMPARACION', r'==|!=|<=|>=|<|>'),
+
+    # Delimitadores
+    ('DELIMITADOR', r'[:;,\(\)\[\]\{\}]'),
+
+    # Identificadores
+    ('IDENTIFICADOR', r'[A-Za-z_][A-Za-z0-9_]*'),
+
+    # Espacios y tabulaciones
+    ('ESPACIO', r'[ \t]+'),
+
+    # Caracter no reconocido
+    ('ERROR', r'.'),
+]
+
+# Patrones compilados una sola vez al importar el modulo
+PATRONES_COMPILADOS: List[Tuple[str, re.Pattern]] = [
+    (tipo, re.compile(patron, re.MULTILINE)) for tipo, patron in PATRONES_CRUDOS
+]
+
+# Codigos numericos de los tipos de token (posicion en PATRONES_CRUDOS)
+TIPOS_TOKEN: Tuple[str, ...] = tuple(tipo for tipo, _ in PATRONES_CRUDOS)
+CODIGOS_TOKEN: Dict[str, int] = {tipo: codigo for codigo, tipo in enumerate(TIPOS_TOKEN)}
+
+T_NEWLINE = CODIGOS_TOKEN['NEWLINE']
+T_DOCSTRING = CODIGOS_TOKEN['DOCSTRING']
+T_LITERAL_STRING = CODIGOS_TOKEN['LITERAL_STRING']
+T_IDENTIFICADOR = CODIGOS_TOKEN['IDENTIFICADOR']
+T_ERROR = CODIGOS_TOKEN['ERROR']
+
+# Mensaje de un caracter que no forma ningun token
+PLANTILLA_CARACTER_INESPERADO = "Error lexico: Caracter inesperado {!r} en linea {}, columna {}"
+
+# Tabla de reclasificacion: un identificador que coincide con una palabra
+# reservada se convierte en PALABRA_CLAVE u OPERADOR_LOGICO
+PALABRAS_RESERVADAS: Dict[str, int] = {}
+for _palabra in PALABRAS_CLAVE:
+    PALABRAS_RESERVADAS[_palabra] = CODIGOS_TOKEN['PALABRA_CLAVE']
+for _palabra in OPERADORES_LOGICOS:
+    PALABRAS_RESERVADAS[_palabra] = CODIGOS_TOKEN['OPERADOR_LOGICO']
+PALABRAS_RESERVADAS_BYTES: Dict[bytes, int] = {
+    palabra.encode('ascii'): codigo for palabra, codigo in PALABRAS_RESERVADAS.items()
+}
+LONGITUD_MAX_RESERVADA = max(len(palabra) for palabra in PALABRAS_RESERVADAS)
+
+# Patron maestro: una sola alternancia con grupos nombrados. El motor de regex
+# prueba las alternativas en el mismo orden que PATRONES_CRUDOS, asi que el
+# primer grupo que coincide es el mismo tipo que encontraria el recorrido
+# patron por patron. Las palabras reservadas se omiten porque se resuelven
+# con PALABRAS_RESERVADAS sobre el identificador.
+PATRON_MAESTRO: re.Pattern = re.compile(
+    '|'.join(
+        f'(?P<{tipo}>{patron})'
+        for tipo, patron in PATRONES_CRUDOS
+        if tipo not in ('PALABRA_CLAVE', 'OPERADOR_LOGICO')
+    ),
+    re.MULTILINE,
+)
+
+# Codigo de token para cada numero de grupo del patron maestro (match.lastindex)
+CODIGO_POR_GRUPO: List[int] = [0] * (PATRON_MAESTRO.groups + 1)
+for _tipo, _grupo in PATRON_MAESTRO.groupindex.items():
+    CODIGO_POR_GRUPO[_grupo] = CODIGOS_TOKEN[_tipo]
+
+# Limite de palabra (equivalente al \b de los patrones de palabras reservadas)
+FRONTERA_PALABRA: re.Pattern = re.compile(r'\b')
+
+# Lexemas que solo actualizan la posicion
+CODIGOS_IGNORADOS = frozenset(CODIGOS_TOKEN[tipo] for tipo in ('COMENTARIO', 'DOCSTRING', 'ESPACIO', 'NEWLINE'))
+
+# Versiones en bytes para analizar el codigo sin decodificarlo (por ejemplo
+# desde un mmap). Fuera de comentarios y literales todo lexema valido es
+# ASCII, donde \b, \d y . se comportan igual que en los patrones de texto
+PATRON_MAESTRO_BYTES: re.Pattern = re.compile(PATRON_MAESTRO.pattern.encode('ascii'), re.MULTILINE)
+FRONTERA_PALABRA_BYTES: re.Pattern = re.compile(rb'\b')
+NO_ASCII_BYTES: re.Pattern = re.compile(rb'[\x80-\xff]')
+
+# Posicion de un nodo que no viene de un token (la raiz)
+SIN_POSICION = 0xFFFFFFFF
+
+
+# Inicios de linea de un codigo fuente, para obtener la linea y la columna
+# de una posicion solo cuando se piden (diagnosticos y volcados): el lexer
+# y el parser guardan solo posiciones. La tabla se llena buscando los
+# saltos de linea una sola vez y de a tramos, hasta la posicion mas
+# avanzada que se haya pedido; cada consulta es una biseccion. Empieza en
+# la posicion y la linea indicadas, porque el lexer puede empezar a mitad
+# del archivo (siempre en un inicio de linea). Las columnas se cuentan en
+# caracteres tambien si la fuente es bytes UTF-8
+class IndiceLineas:
+    __slots__ = ('fuente', 'salto', 'inicios', 'primera', 'explorado')
+
+    def __init__(self, fuente: Union[str, bytes], posicion: int = 0, linea: int = 1):
+        self.fuente = fuente
+        self.salto = '\n' if isinstance(fuente, str) else b'\n'
+        self.reiniciar(posicion, linea)
+
+    # Vuelve a empezar la tabla en otra posicion y linea
+    def reiniciar(self, posicion: int, linea: int) -> None:
+        self.inicios = array('I', [posicion])
+        self.primera = linea
+        self.explorado = posicion   # Saltos buscados hasta aqui
+
+    # Agrega los inicios de las lineas que empiezan hasta la posicion
+    def _explorar(self, hasta: int) -> None:
+        buscar = self.fuente.find
+        salto = self.salto
+        agregar = self.inicios.append
+        posicion = buscar(salto, self.explorado, hasta)
+        while posicion != -1:
+            agregar(posicion + 1)
+            posicion = buscar(salto, posicion + 1, hasta)
+        self.explorado = hasta
+
+    def linea(self, posicion: int) -> int:
+        if posicion > self.explorado:
+            self._explorar(posicion)
+        return bisect_right(self.inicios, posicion) - 1 + self.primera
+
+    def columna(self, posicion: int) -> int:
+        return self.ubicar(posicion)[1]
+
+    # Linea y columna de una posicion
+    def ubicar(self, posicion: int) -> Tuple[int, int]:
+        if posicion > self.explorado:
+            self._explorar(posicion)
+        indice = bisect_right(self.inicios, posicion) - 1
+        inicio = self.inicios[indice]
+        columna = posicion - inicio + 1
+        if not isinstance(self.fuente, str) and NO_ASCII_BYTES.search(self.fuente, inicio, posicion):
+            columna = len(self.fuente[inicio:posicion].decode('utf-8')) + 1
+        return indice + self.primera, columna
+
+
+# Linea o columna de cada elemento de una columna de posiciones, calculada
+# al pedirla; las posiciones SIN_POSICION dan 0
+class VistaPosiciones:
+    __slots__ = ('posiciones', 'resolver')
+
+    def __init__(self, posiciones, resolver):
+        self.posiciones = posiciones
+        self.resolver = resolver
+
+    def __len__(self) -> int:
+        return len(self.posiciones)
+
+    def __getitem__(self, indice: int) -> int:
+        posicion = self.posiciones[indice]
+        return 0 if posicion == SIN_POSICION else self.resolver(posicion)
+
+    def __iter__(self) -> Iterator[int]:
+        for indice in range(len(self.posiciones)):
+            yield self[indice]
+
+
+# Lista de tokens guardada por columnas: codigo de tipo, inicio y fin del
+# lexema en el codigo fuente. Un identificador guarda en la columna de
+# fines su id en la tabla de nombres en lugar del fin, que se deduce del
+# largo del nombre (un identificador es ASCII y no tiene saltos de linea);
+# asi el id no ocupa una columna mas por token. El texto de cada token se
+# obtiene del codigo fuente solo cuando se pide (decodificando si es
+# bytes), y su linea y columna, de la tabla de inicios de linea de la fuente
+class TokenBuffer:
+    def __init__(self, fuente: Union[str, bytes], nombres: Optional[TablaNombres] = None,
+                 indice_lineas: Optional[IndiceLineas] = None):
+        self.fuente = fuente
+        self.nombres = nombres if nombres is not None else TablaNombres()
+        self.indice_lineas = indice_lineas if indice_lineas is not None else IndiceLineas(fuente)
+        self.tipos = array('B')
+        self.inicios = array('I')
+        self.fines = array('I')
+
+    # Construye un buffer a partir de una lista de objetos Token. Cada token
+    # se ubica en su linea y columna rellenando con saltos de linea y
+    # espacios; uno que quedaria antes del anterior va a continuacion
+    @classmethod
+    def desde_tokens(cls, tokens: List[Token]) -> 'TokenBuffer':
+        partes = []
+        buffer = cls('')
+        posicion = 0
+        linea = columna = 1
+        for token in tokens:
+            if token.linea > linea:
+                partes.append('\n' * (token.linea - linea))
+                posicion += token.linea - linea
+                linea = token.linea
+                columna = 1
+            if token.linea == linea and token.columna > columna:
+                partes.append(' ' * (token.columna - columna))
+                posicion += token.columna - columna
+                columna = token.columna
+            partes.append(token.valor)
+            codigo = CODIGOS_TOKEN[token.tipo]
+            simbolo = buffer.nombres.identificador(token.valor) if codigo == T_IDENTIFICADOR else 0
+            buffer.agregar(codigo, posicion, posicion + len(token.valor), simbolo)
+            posicion += len(token.valor)
+            saltos = token.valor.count('\n')
+            if saltos:
+                linea += saltos
+                columna = len(token.valor) - token.valor.rfind('\n')
+            else:
+                columna += len(token.valor)
+        buffer.fuente = ''.join(partes)
+        buffer.indice_lineas = IndiceLineas(buffer.fuente)
+        return buffer
+
+    # Para un identificador se guarda el id del nombre en lugar del fin
+    def agregar(self, codigo: int, inicio: int, fin: int, simbolo: int = 0) -> None:
+        self.tipos.append(codigo)
+        self.inicios.append(inicio)
+        self.fines.append(simbolo if codigo == T_IDENTIFICADOR else fin)
+
+    # Id en la tabla de nombres de cada token, valido solo para los
+    # identificadores: es la misma columna que la de fines
+    @property
+    def simbolos(self) -> array:
+        return self.fines
+
+    # Fin del lexema del token en el codigo fuente
+    def fin(self, indice: int) -> int:
+        if self.tipos[indice] == T_IDENTIFICADOR:
+            return self.inicios[indice] + len(self.nombres.nombres[self.fines[indice]])
+        return self.fines[indice]
+
+    # Columnas del buffer
+    def columnas_token(self) -> Tuple[array, ...]:
+        return self.tipos, self.inicios, self.fines
+
+    # Linea y columna de cada token, calculadas al pedirlas
+    @property
+    def lineas(self) -> VistaPosiciones:
+        return VistaPosiciones(self.inicios, self.indice_lineas.linea)
+
+    @property
+    def columnas(self) -> VistaPosiciones:
+        return VistaPosiciones(self.inicios, self.indice_lineas.columna)
+
+    def linea(self, indice: int) -> int:
+        return self.indice_lineas.linea(self.inicios[indice])
+
+    def columna(self, indice: int) -> int:
+        return self.indice_lineas.columna(self.inicios[indice])
+
+    # Linea y columna del token
+    def ubicar(self, indice: int) -> Tuple[int, int]:
+        return self.indice_lineas.ubicar(self.inicios[indice])
+
+    def tipo(self, indice: int) -> str:
+        return TIPOS_TOKEN[self.tipos[indice]]
+
+    def valor(self, indice: int) -> str:
+        valor = self.fuente[self.inicios[indice]:self.fin(indice)]
+        if isinstance(valor, str):
+            return valor
+        return valor.decode('utf-8')
+
+    # Compatibilidad con la lista de objetos Token: indexar o iterar el
+    # buffer crea los Token bajo demanda
+    def __len__(self) -> int:
+        return len(self.tipos)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        linea, columna = self.ubicar(indice)
+        return Token(self.tipo(indice), self.valor(indice), linea, columna)
+
+    def __iter__(self) -> Iterator[Token]:
+        for indice in range(len(self)):
+            yield self[indice]
+
+
 class Lexer:
-    # Recibe el código fuente como cadena
-    def __init__(self, codigo_fuente: str):
+    # Recibe el código fuente como cadena, o como bytes / mmap codificado en
+    # UTF-8. Con max_errores el analisis se detiene al llegar a esa cantidad
+    # de errores. Los identificadores se internalizan en la tabla de nombres
+    # indicada (para compartirla con otros lexers) o en una nueva
+    def __init__(self, codigo_fuente: Union[str, bytes], max_errores: Optional[int] = None,
+                 nombres: Optional[TablaNombres] = None):
         self.codigo_fuente = codigo_fuente
-        self.tokens: List[Token] = []
-        self.linea_actual = 1
-        self.columna_actual = 1
+        self.nombres = nombres if nombres is not None else TablaNombres()
+        self.indice_lineas = IndiceLineas(codigo_fuente)
+        self.tokens = TokenBuffer(codigo_fuente, self.nombres, self.indice_lineas)
+        self.ids_bytes: Dict[bytes, int] = {}
         self.posicion_actual = 0
-        self.errores: List[str] = []
+        self.errores: List[Diagnostico] = []
+        self.max_errores = max_errores
 
-        # Precompilacion de los patrones de tokens
+        # Patrones de tokens (precompilados a nivel de modulo)
         self.patrones = self.definir_patrones_compilados()
 
-    # Definicion de los patrones regex para cada tipo de token
-    def definir_patrones_compilados(self) -> List[Tuple[str, re.Pattern]]:
-        patrones_crudos: List[Tuple[str, str]] = [
-
-            # Comentarios (se ignoran pero deben actualizar posicion)
-            ('COMENTARIO', r'#.*'),
-
-            # Docstrings (triple comillas, pueden ser multilinea)
-            ('DOCSTRING', r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\''),
-
-            # Saltos de linea (actualizan posicion pero normalmente no generan token)
-            ('NEWLINE', r'\n'),
-
-            # Palabras clave de Python
-            ('PALABRA_CLAVE', r'\b(?:class|def|return|if|else|while|for|None|True|False)\b'),
+    # Empieza el analisis en una posicion que es inicio de la linea indicada
+    # (un fragmento o una region del archivo), antes del primer analizar()
+    def empezar_en(self, posicion: int, linea: int) -> None:
+        self.posicion_actual = posicion
+        self.indice_lineas.reiniciar(posicion, linea)
 
-            # Operadores logicos
-            ('OPERADOR_LOGICO', r'\b(?:and|or|not)\b'),
+    # Linea y columna de la posicion hasta la que se analizo
+    @property
+    def linea_actual(self) -> int:
+        return self.indice_lineas.linea(self.posicion_actual)
 
-            # Literales
-            ('LITERAL_STRING', r'\"(?:\\.|[^"\\])*\"|\'(?:\\.|[^\'\\])*\''),
-            ('LITERAL_FLOAT', r'\b(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?\b'),
-            ('LITERAL_INT', r'\b\d+\b'),
+    @property
+    def columna_actual(self) -> int:
+        return self.indice_lineas.columna(self.posicion_actual)
 
-            # Operadores aritmeticos, asignacion y comparacion
-            ('OPERADOR_MATEMATICO', r'\*\*|\*|/|\+|-|%'),
-            ('OPERADOR_ASIGNACION', r'\+=|-=|\*=|/=|%=|='),
-            ('OPERADOR_COMPARACION', r'==|!=|<=|>=|<|>'),
-
-            # Delimitadores
-            ('DELIMITADOR', r'[:;,\(\)\[\]\{\}]'),
+    # Patrones regex compilados para cada tipo de token
+    def definir_patrones_compilados(self) -> List[Tuple[str, re.Pattern]]:
+        return PATRONES_COMPILADOS
 
-            # Identificadores
-            ('IDENTIFICADOR', r'[A-Za-z_][A-Za-z0-9_]*'),
+    # Generacion de la lista de tokens del codigo fuente. Con "fin" se
+    # detiene en el primer lexema que termina en esa posicion o despues, y
+    # una llamada posterior continua desde donde se quedo. Solo se guardan
+    # posiciones: la linea y la columna de un token o de un error salen del
+    # indice de lineas cuando se piden
+    def analizar(self, fin: int = None) -> TokenBuffer:
+        if not isinstance(self.codigo_fuente, str):
+            return self.analizar_bytes(fin)
 
-            # Espacios y tabulaciones
-            ('ESPACIO', r'[ \t]+'),
+        codigo = self.codigo_fuente
+        longitud = len(codigo) if fin is None else min(fin, len(codigo))
+        buscar = PATRON_MAESTRO.match
+        frontera = FRONTERA_PALABRA.match
+        codigo_por_grupo = CODIGO_POR_GRUPO
+        reservadas = PALABRAS_RESERVADAS
+        ignorados = CODIGOS_IGNORADOS
+        ids = self.nombres.ids
+        internalizar = self.nombres.identificador
+
+        tokens = self.tokens
+        agregar_tipo = tokens.tipos.append
+        agregar_inicio = tokens.inicios.append
+        agregar_fin = tokens.fines.append
+
+        posicion = self.posicion_actual
+        while posicion < longitud:
+            match = buscar(codigo, posicion)
 
-            # Caracter no reconocido
-            ('ERROR', r'.'),
-        ]
+            # Patrones sin match
+            if match is None:
+                self.errores.append(Diagnostico(
+                    'errores_lexicos', "Error lexico: No se pudo procesar el codigo en posicion {}", (posicion,),
+                    self.indice_lineas.linea(posicion)
+                ))
+                break
 
-        # Compilar todos patrones para optimizar
-        patrones_compilados: List[Tuple[str, re.Pattern]] = []
-        for tipo, patron in patrones_crudos:
-            patrones_compilados.append((tipo, re.compile(patron, re.MULTILINE)))
-        return patrones_compilados
+            tipo = codigo_por_grupo[match.lastindex]
+            fin = match.end()
+
+            # Los ignorados (espacios, saltos, comentarios, docstrings) solo
+            # avanzan
+            if tipo in ignorados:
+                posicion = fin
+                continue
+
+            # Error lexico; al llegar al limite de errores el bucle termina
+            if tipo == T_ERROR:
+                linea, columna = self.indice_lineas.ubicar(posicion)
+                self.errores.append(Diagnostico(
+                    'errores_lexicos', PLANTILLA_CARACTER_INESPERADO, (codigo[posicion:fin], linea, columna),
+                    linea, columna
+                ))
+                if len(self.errores) == self.max_errores:
+                    longitud = fin
+                posicion = fin
+                continue
+
+            # Token valido, se añade al buffer. Cada identificador se
+            # internaliza: el texto se recorta y se busca una sola vez, y en
+            # la columna de fines se guarda su id, que es lo que usa el parser
+            fin_o_id = fin
+            if tipo == T_IDENTIFICADOR:
+                texto = codigo[posicion:fin]
+                reservada = reservadas.get(texto) if fin - posicion <= LONGITUD_MAX_RESERVADA else None
+                if reservada is not None and frontera(codigo, posicion) and frontera(codigo, fin):
+                    tipo = reservada
+                else:
+                    simbolo = ids.get(texto)
+                    if simbolo is None:
+                        simbolo = internalizar(texto)
+                    fin_o_id = simbolo
+            agregar_tipo(tipo)
+            agregar_inicio(posicion)
+            agregar_fin(fin_o_id)
+            posicion = fin
+
+        self.posicion_actual = posicion
+        return self.tokens
 
-    # Generacion de la lista de tokens del codigo fuente
-    def analizar(self) -> List[Token]:
+    # Analisis directo sobre bytes UTF-8, sin copiar el archivo a una cadena.
+    # Un caracter no ASCII fuera de un comentario o literal es siempre un
+    # error lexico; en ese caso se repite el analisis sobre el texto
+    # decodificado para que tokens y mensajes sean exactamente los del
+    # analisis de cadenas
+    def analizar_bytes(self, fin: int = None) -> TokenBuffer:
         codigo = self.codigo_fuente
-        longitud = len(codigo)
-
-        while self.posicion_actual < longitud:
-            coincide = False
-
-            for tipo, regex in self.patrones:
-                match = regex.match(codigo, self.posicion_actual)
-                if not match:
-                    continue
-
-                valor = match.group()
-                fin = match.end()
-
-                # Tokens ignorados, pero actualizan posicion
-                if tipo in ('COMENTARIO', 'DOCSTRING', 'ESPACIO'):
-                    self.actualizar_contadores(valor)
-                    self.posicion_actual = fin
-                    coincide = True
-                    break
-
-                # Actualizar contadores, no generar token
-                if tipo == 'NEWLINE':
-                    self.actualizar_contadores(valor)
-                    self.posicion_actual = fin
-                    coincide = True
-                    break
-
-                # Error lexico
-                if tipo == 'ERROR':
-                    self.errores.append(
-                        f"Error lexico: Caracter inesperado {repr(valor)} "
-                        f"en linea {self.linea_actual}, columna {self.columna_actual}"
-                    )
-                    self.actualizar_contadores(valor)
-                    self.posicion_actual = fin
-                    coincide = True
-                    break
-
-                # Token valido, se añade a la lista
-                token = Token(tipo, valor, self.linea_actual, self.columna_actual)
-                self.tokens.append(token)
-
-                # Actualizar posicion
-                self.actualizar_contadores(valor)
-                self.posicion_actual = fin
-                coincide = True
-                break
+        longitud = len(codigo) if fin is None else min(fin, len(codigo))
+        buscar = PATRON_MAESTRO_BYTES.match
+        frontera = FRONTERA_PALABRA_BYTES.match
+        codigo_por_grupo = CODIGO_POR_GRUPO
+        reservadas = PALABRAS_RESERVADAS_BYTES
+        ignorados = CODIGOS_IGNORADOS
+        ids = self.ids_bytes
+        internalizar = self.nombres.identificador
+
+        tokens = self.tokens
+        agregar_tipo = tokens.tipos.append
+        agregar_inicio = tokens.inicios.append
+        agregar_fin = tokens.fines.append
+
+        posicion = self.posicion_actual
+        while posicion < longitud:
+            match = buscar(codigo, posicion)
 
             # Patrones sin match
-            if not coincide:
-                self.errores.append(
-                    f"Error lexico: No se pudo procesar el codigo en posicion {self.posicion_actual}"
-                )
+            if match is None:
+                self.errores.append(Diagnostico(
+                    'errores_lexicos', "Error lexico: No se pudo procesar el codigo en posicion {}", (posicion,),
+                    self.indice_lineas.linea(posicion)
+                ))
                 break
 
+            tipo = codigo_por_grupo[match.lastindex]
+            fin = match.end()
+
+            # Los ignorados solo avanzan
+            if tipo in ignorados:
+                posicion = fin
+                continue
+
+            # Error lexico
+            if tipo == T_ERROR:
+                if codigo[posicion] >= 0x80:
+                    return self._reanalizar_como_texto()
+                linea, columna = self.indice_lineas.ubicar(posicion)
+                self.errores.append(Diagnostico(
+                    'errores_lexicos', PLANTILLA_CARACTER_INESPERADO, (chr(codigo[posicion]), linea, columna),
+                    linea, columna
+                ))
+                if len(self.errores) == self.max_errores:
+                    longitud = fin
+                posicion = fin
+                continue
+
+            # Token valido, se añade al buffer. Un identificador es ASCII:
+            # se decodifica solo la primera vez que aparece
+            fin_o_id = fin
+            if tipo == T_IDENTIFICADOR:
+                texto = codigo[posicion:fin]
+                reservada = reservadas.get(texto) if fin - posicion <= LONGITUD_MAX_RESERVADA else None
+                if reservada is not None and frontera(codigo, posicion) and frontera(codigo, fin):
+                    tipo = reservada
+                else:
+                    simbolo = ids.get(texto)
+                    if simbolo is None:
+                        simbolo = ids[texto] = internalizar(texto.decode('ascii'))
+                    fin_o_id = simbolo
+            agregar_tipo(tipo)
+            agregar_inicio(posicion)
+            agregar_fin(fin_o_id)
+            posicion = fin
+
+        self.posicion_actual = posicion
         return self.tokens
 
-    # Actualizacion de contadores de linea y columna
-    def actualizar_contadores(self, valor: str) -> None:
-        if '\n' in valor:
-            partes = valor.split('\n')
-            num_saltos = len(partes) - 1
-            self.linea_actual += num_saltos
-            sufijo = partes[-1]
-            self.columna_actual = len(sufijo) + 1
-        else:
-            self.columna_actual += len(valor)
+    # Reinicia el estado y analiza el codigo decodificado como cadena
+    def _reanalizar_como_texto(self) -> TokenBuffer:
+        self.codigo_fuente = bytes(self.codigo_fuente).decode('utf-8')
+        self.indice_lineas = IndiceLineas(self.codigo_fuente)
+        self.tokens = TokenBuffer(self.codigo_fuente, self.nombres, self.indice_lineas)
+        self.errores.clear()
+        self.posicion_actual = 0
+        return self.analizar()
 
     # Funcion para imprimir tokens encontrados
     def mostrar_tokens(self) -> None:
@@ -158,4 +539,4 @@ class Lexer:
     # Funcion para imprimir errores encontrados
     def mostrar_errores(self) -> None:
         for error in self.errores:
-            print(error)
\ No newline at end of file
+            print(error)
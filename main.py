@@ -1,51 +1,111 @@
 import sys
 import os
-from lexer.lexer import Lexer
-from parser.parser import Parser
-from checker.checker import Checker
-from codegen.generator import CodeGenerator
+import mmap
+import codecs
+import time
+from pipeline.pipeline import Compilador
+from streaming.streaming import CompiladorFlujo
+from optimizer.optimizer import variables_sin_leer
+from parallel.parallel import CompiladorParalelo
+from native.native import CompiladorNativo, CompiladorNoEncontrado
+from diagnostics.diagnostics import limite_alcanzado
+from incremental.incremental import CompiladorIncremental
+from batch.batch import buscar_archivos, compilar_lote
+from cache.cache import CacheCompilacion, entrada_de_resultado, escribir_si_cambio
+from serialization.serialization import guardar as guardar_serializado, cargar as cargar_serializado, es_serializado
+from profiling.profiling import Perfilador, PerfiladorNulo
+from interpreter.interpreter import Interprete
+from server.server import (ServidorCompilacion, ClienteCompilacion, servir_stdio, servir_socket,
+                           instalar_senales, MEMORIA_MAXIMA_MB)
 
-def compilar_python_a_cpp(archivo_entrada, mostrar_tokens=False, mostrar_ast=False):
+# Tamaño a partir del cual el archivo se analiza directamente desde un mmap
+UMBRAL_MMAP = 64 * 1024 * 1024
+
+# Tamaño de los bloques usados para validar el UTF-8 de un archivo mapeado
+BLOQUE_VALIDACION = 1024 * 1024
+
+# Extension del archivo con los tokens y el AST serializados (--emit-ast)
+EXTENSION_AST = ".ast"
+
+# Extension del archivo con las estadisticas de --profile=cprofile
+EXTENSION_PSTATS = ".pstats"
+
+# Segundos entre revisiones del archivo en modo --watch
+INTERVALO_VIGILANCIA = 0.5
+
+# Encabezado de cada fase al mostrar errores en modo --watch
+FASES_ERRORES = {
+    'errores_lectura': ("No se pudo leer el archivo:", "{}"),
+    'errores_lexicos': ("Se encontraron errores lexicos:", "{}"),
+    'errores_sintacticos': ("Se encontraron errores sintacticos:", "{}"),
+    'errores_semanticos': ("Se encontraron errores semanticos:", "  - {}"),
+    'errores_escritura': ("No se pudo escribir el archivo de salida:", "{}"),
+    'errores_ejecucion': ("Se encontraron errores de ejecucion:", "{}"),
+}
+
+def compilar_python_a_cpp(archivo_entrada, mostrar_tokens=False, mostrar_ast=False, usar_mmap=None,
+                          nivel_optimizacion=1, usar_cache=True, directorio_cache=None, emitir_ast=False,
+                          perfil=None, max_errores=None, trabajos=1, advertir=False, nativo=None, ejecutar=False):
     print(f"=== COMPILADOR PYTHON A C++ ===")
     print(f"Archivo de entrada: {archivo_entrada}")
     print("=" * 50)
+    if perfil is None:
+        perfil = PerfiladorNulo()
+
+    # 0 - Buscar el resultado en la cache; con -t, -a, --emit-ast,
+    # --warn-unused o --run hay que correr las fases para mostrar, guardar,
+    # revisar o ejecutar los tokens y el arbol, y con --profile para medirlas
+    cache = clave = None
+    if usar_cache and not (mostrar_tokens or mostrar_ast or emitir_ast or advertir or ejecutar or perfil):
+        cache = CacheCompilacion(directorio_cache)
+        try:
+            clave = cache.clave(archivo_entrada, nivel_optimizacion, max_errores)
+        except OSError as e:
+            print(f"Error al leer el archivo: {e}")
+            return False
+        entrada = cache.buscar(clave)
+        if entrada is not None:
+            return mostrar_resultado_cache(archivo_entrada, entrada, cache, max_errores, nativo)
     
     # 1 - Leer archivo de entrada
     try:
-        with open(archivo_entrada, 'r', encoding='utf-8') as f:
-            codigo_fuente = f.read()
+        with perfil.fase('lectura') as medicion:
+            codigo_fuente = leer_codigo_fuente(archivo_entrada, usar_mmap)
+        if perfil:
+            medicion.elementos['bytes'] = os.path.getsize(archivo_entrada)
         print("Archivo leido correctamente")
     except Exception as e:
         print(f"Error al leer el archivo: {e}")
         return False
     
-    # 2 - Analisis lexico
+    # 2 y 3 - Analisis lexico y sintactico; con -j N repartidos entre
+    # varios procesos
+    if trabajos > 1:
+        compilador = CompiladorParalelo(nivel_optimizacion, max_errores, trabajos)
+    else:
+        compilador = Compilador(nivel_optimizacion, max_errores)
+    resultado = compilador.analizar(codigo_fuente, perfil)
+    tokens = resultado.tokens
+
     print("\n--- FASE 1: ANALISIS LEXICO ---")
-    lexer = Lexer(codigo_fuente)
-    tokens = lexer.analizar()
-    
-    if lexer.errores:
-        print("Se encontraron errores lexicos:")
-        lexer.mostrar_errores()
+    if resultado.fase == 'errores_lexicos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        guardar_en_cache(cache, clave, entrada_de_resultado(resultado))
         return False
     else:
         print("Analisis lexico completado sin errores")
-        print(f"Tokens encontrados: {len(tokens)}")
+        print(f"Tokens encontrados: {resultado.cantidad_tokens}")
     
     # Mostrar tokens si se solicita
     if mostrar_tokens:
         print("\n--- TOKENS ENCONTRADOS ---")
-        lexer.mostrar_tokens()
+        for token in tokens:
+            print(token)
     
-    # 3 - Analisis sintactico
     print("\n--- FASE 2: ANALISIS SINTACTICO ---")
-    parser = Parser(tokens)
-    ast = parser.parsear()
-    
-    if parser.errores:
-        print("Se encontraron errores sintacticos:")
-        for error in parser.errores:
-            print(f"{error}")
+    if resultado.fase == 'errores_sintacticos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        guardar_en_cache(cache, clave, entrada_de_resultado(resultado))
         return False
     else:
         print("Analisis sintactico completado sin errores")
@@ -54,49 +114,464 @@ def compilar_python_a_cpp(archivo_entrada, mostrar_tokens=False, mostrar_ast=Fal
     # Mostrar AST si se solicita
     if mostrar_ast:
         print("\n--- ARBOL DE SINTAXIS ABSTRACTRA (AST) ---")
-        parser.mostrar_arbol(ast)
+        resultado.ast.mostrar()
+
+    # Guardar tokens y AST en formato binario si se solicita
+    if emitir_ast:
+        nombre_ast = os.path.splitext(archivo_entrada)[0] + EXTENSION_AST
+        try:
+            with perfil.fase('serializacion', tokens=len(tokens)):
+                guardar_serializado(nombre_ast, tokens, resultado.ast)
+            print(f"Tokens y AST guardados en: {nombre_ast}")
+        except OSError as e:
+            print(f"Error al guardar el AST: {e}")
+            return False
+
+    # Las variables que nunca se leen se buscan antes de que el optimizador
+    # modifique el arbol
+    advertencias = variables_sin_leer(resultado.ast) if advertir else ()
+    compilador.completar(resultado, perfil)
+    return mostrar_compilacion(archivo_entrada, resultado, nivel_optimizacion, cache, clave, perfil, max_errores,
+                               advertencias, nativo, ejecutar)
+
+# Fases 3 a 5: muestra el resultado del analisis semantico, la
+# optimizacion y la generacion de codigo (ya hechos por el Compilador) y
+# escribe el .cpp; con --build construye ademas el ejecutable y con --run
+# ejecuta el programa
+def mostrar_compilacion(archivo_entrada, resultado, nivel_optimizacion=1, cache=None, clave=None,
+                        perfil=None, max_errores=None, advertencias=(), nativo=None, ejecutar=False):
+    if perfil is None:
+        perfil = PerfiladorNulo()
 
     # 4 - Analisis semantico
     print("\n--- FASE 3: ANALISIS SEMANTICO ---")
-    checker = Checker()
-    errores_semanticos = checker.verificar(ast)
-    
-    if errores_semanticos:
-        print("Se encontraron errores semanticos:")
-        for error in errores_semanticos:
-            print(f"  - {error}")
+    if resultado.fase == 'errores_semanticos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        guardar_en_cache(cache, clave, entrada_de_resultado(resultado))
         return False
     else:
         print("Analisis semantico completado sin errores")
         # Mostrar tabla de simbolos para debugging
         print("Tabla de simbolos generada correctamente")
+        for advertencia in advertencias:
+            print(advertencia)
+
+    # Optimizacion: plegado y propagacion de constantes (-O1) y eliminacion
+    # de asignaciones muertas (-O2)
+    if nivel_optimizacion > 0:
+        print(f"\n--- OPTIMIZACION (-O{nivel_optimizacion}) ---")
+        print(f"Expresiones reemplazadas por constantes: {resultado.plegados}")
+    if nivel_optimizacion > 1:
+        print(f"Asignaciones muertas eliminadas: {resultado.eliminadas}")
+        print(f"Variables sin usar eliminadas: {resultado.variables_eliminadas}")
 
     # 5- Generacion codigo final
     print("\n--- FASE 4: GENERACION DE CODIGO C++ ---")
-    generador = CodeGenerator(ast)
-    codigo_cpp = generador.generar_codigo()
-    
-    # Crear archivo .cpp
+    codigo_cpp = resultado.cpp
+    entrada = entrada_de_resultado(resultado)
+    guardar_en_cache(cache, clave, entrada)
+
+    # Crear archivo .cpp; si ya tiene el mismo codigo no se toca
+    with perfil.fase('escritura', bytes=len(codigo_cpp)):
+        escrito = escribir_salida(archivo_entrada, codigo_cpp)
+    if not escrito:
+        return False
+
+    # 6 - Compilacion nativa del .cpp (--build)
+    construido = None
+    if nativo is not None:
+        construido = construir_ejecutable(archivo_entrada, nativo, perfil)
+        if construido is None:
+            return False
+
+    # 7 - Ejecucion del programa en el proceso (--run)
+    if ejecutar and not ejecutar_programa(resultado, perfil):
+        return False
+
+    # 8 - Resumen final
+    mostrar_resumen(archivo_entrada, entrada, cache, nativo, construido)
+    return True
+
+# Compila un archivo de tokens y AST serializados con --emit-ast. El
+# arbol se recorre directamente sobre el archivo mapeado, sin volver a
+# hacer el analisis lexico ni el sintactico
+def compilar_desde_ast(archivo_entrada, mostrar_tokens=False, mostrar_ast=False, nivel_optimizacion=1,
+                       perfil=None, max_errores=None, nativo=None, ejecutar=False):
+    print(f"=== COMPILADOR PYTHON A C++ ===")
+    print(f"Archivo de entrada: {archivo_entrada} (AST serializado)")
+    print("=" * 50)
+    if perfil is None:
+        perfil = PerfiladorNulo()
+
+    try:
+        with perfil.fase('carga') as medicion:
+            archivo = cargar_serializado(archivo_entrada)
+        if perfil:
+            medicion.elementos['bytes'] = os.path.getsize(archivo_entrada)
+    except (OSError, ValueError) as e:
+        print(f"Error al leer el archivo: {e}")
+        return False
+    if archivo.ast is None:
+        print("Error al leer el archivo: no contiene un AST")
+        return False
+    cantidad_tokens = len(archivo.tokens) if archivo.tokens is not None else 0
+    print(f"AST cargado correctamente: {contar_nodos_ast(archivo.ast)} nodos, {cantidad_tokens} tokens")
+
+    if mostrar_tokens:
+        print("\n--- TOKENS ENCONTRADOS ---")
+        for token in archivo.tokens or ():
+            print(token)
+    if mostrar_ast:
+        print("\n--- ARBOL DE SINTAXIS ABSTRACTRA (AST) ---")
+        archivo.ast.mostrar()
+
+    resultado = Compilador(nivel_optimizacion, max_errores).compilar_ast(archivo.ast, archivo.tokens, perfil)
+    return mostrar_compilacion(archivo_entrada, resultado, nivel_optimizacion, perfil=perfil, max_errores=max_errores,
+                               nativo=nativo, ejecutar=ejecutar)
+
+# Compila el archivo en flujo (--stream): cada sentencia pasa por todas las
+# fases y su C++ se escribe en el .cpp a medida que se genera, sin tener en
+# memoria los tokens, el AST ni el codigo completos. El resultado es el
+# mismo que el de la compilacion normal; no usa la cache
+def compilar_en_flujo(archivo_entrada, nivel_optimizacion=1, perfil=None, max_errores=None, nativo=None):
+    print(f"=== COMPILADOR PYTHON A C++ (modo flujo) ===")
+    print(f"Archivo de entrada: {archivo_entrada}")
+    print("=" * 50)
+    if perfil is None:
+        perfil = PerfiladorNulo()
+
+    try:
+        with perfil.fase('lectura'):
+            codigo_fuente = leer_codigo_fuente(archivo_entrada, usar_mmap=True)
+        print("Archivo leido correctamente")
+    except Exception as e:
+        print(f"Error al leer el archivo: {e}")
+        return False
+
+    nombre_salida = generar_nombre_salida(archivo_entrada)
+    try:
+        resultado = CompiladorFlujo(nivel_optimizacion, max_errores).compilar(codigo_fuente, nombre_salida, perfil)
+    except OSError as e:
+        print(f"Error al escribir el archivo: {e}")
+        return False
+
+    print("\n--- FASE 1: ANALISIS LEXICO ---")
+    if resultado.fase == 'errores_lexicos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        return False
+    print("Analisis lexico completado sin errores")
+    print(f"Tokens encontrados: {resultado.cantidad_tokens}")
+
+    print("\n--- FASE 2: ANALISIS SINTACTICO ---")
+    if resultado.fase == 'errores_sintacticos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        return False
+    print("Analisis sintactico completado sin errores")
+
+    print("\n--- FASE 3: ANALISIS SEMANTICO ---")
+    if resultado.fase == 'errores_semanticos':
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+        return False
+    print("Analisis semantico completado sin errores")
+
+    if nivel_optimizacion > 0:
+        print("\n--- OPTIMIZACION (-O1) ---")
+        print(f"Expresiones reemplazadas por constantes: {resultado.plegados}")
+
+    print("\n--- FASE 4: GENERACION DE CODIGO C++ ---")
+    if resultado.escrito:
+        print(f"Archivo C++ generado correctamente: {nombre_salida}")
+    else:
+        print(f"Archivo C++ sin cambios: {nombre_salida}")
+
+    construido = None
+    if nativo is not None:
+        construido = construir_ejecutable(archivo_entrada, nativo, perfil)
+        if construido is None:
+            return False
+    mostrar_resumen(archivo_entrada, entrada_de_resultado(resultado), None, nativo, construido)
+    return True
+
+# Muestra un resultado guardado en la cache: los errores de la fase que
+# fallo o el resumen, despues de escribir el .cpp si hace falta
+def mostrar_resultado_cache(archivo_entrada, entrada, cache, max_errores=None, nativo=None):
+    print("Resultado obtenido de la cache (el archivo no cambio desde la ultima compilacion)")
+    if entrada['fase']:
+        mostrar_errores(entrada['fase'], entrada['errores'], max_errores)
+        return False
+
+    if not escribir_salida(archivo_entrada, entrada['cpp']):
+        return False
+    construido = None
+    if nativo is not None:
+        construido = construir_ejecutable(archivo_entrada, nativo)
+        if construido is None:
+            return False
+    mostrar_resumen(archivo_entrada, entrada, cache, nativo, construido)
+    return True
+
+# Muestra los errores de la fase que fallo y, si la fase se detuvo por
+# --max-errors, lo avisa
+def mostrar_errores(fase, errores, max_errores=None):
+    encabezado, formato = FASES_ERRORES[fase]
+    print(encabezado)
+    for error in errores:
+        print(formato.format(error))
+    if limite_alcanzado(errores, max_errores):
+        print(f"Se alcanzo el limite de {max_errores} errores (--max-errors); no se buscaron mas")
+
+# Escribe el .cpp solo si su contenido cambia, para no alterar su fecha de
+# modificacion ni provocar recompilaciones de C++ innecesarias
+def escribir_salida(archivo_entrada, codigo_cpp):
+    nombre_salida = generar_nombre_salida(archivo_entrada)
+    try:
+        escrito = escribir_si_cambio(nombre_salida, codigo_cpp)
+    except OSError as e:
+        print(f"Error al escribir el archivo: {e}")
+        return False
+    if escrito:
+        print(f"Archivo C++ generado correctamente: {nombre_salida}")
+    else:
+        print(f"Archivo C++ sin cambios: {nombre_salida}")
+    return True
+
+# Compila el .cpp con el compilador de C++ local (--build), o toma el
+# ejecutable de la cache de binarios si el C++ no cambio. Devuelve el
+# ResultadoNativo, o None si el compilador de C++ fallo
+def construir_ejecutable(archivo_entrada, nativo, perfil=None):
+    if perfil is None:
+        perfil = PerfiladorNulo()
     nombre_salida = generar_nombre_salida(archivo_entrada)
-    with open(nombre_salida, "w", encoding="utf-8") as f:
-        f.write(codigo_cpp)
-        
-    print(f"Archivo C++ generado correctamente: {nombre_salida}")
+    print(f"\n--- FASE 5: COMPILACION NATIVA ({nativo.comando}) ---")
+    with perfil.fase('nativa', bytes=os.path.getsize(nombre_salida)):
+        construido = nativo.construir(nombre_salida)
+    if not construido.exito:
+        print("Se encontraron errores al compilar el C++:")
+        print(construido.error)
+        return None
+    if construido.desde_cache:
+        print("Ejecutable obtenido de la cache de binarios (el C++ no cambio)")
+    if construido.escrito:
+        print(f"Ejecutable generado correctamente: {construido.binario}")
+    else:
+        print(f"Ejecutable sin cambios: {construido.binario}")
+    return construido
+
+# Ejecuta el programa en el proceso (--run), sin compilar el C++: su
+# salida es la del ejecutable. Devuelve False si el programa fallo
+def ejecutar_programa(resultado, perfil=None):
+    if perfil is None:
+        perfil = PerfiladorNulo()
+    print("\n--- EJECUCION (--run) ---")
+    sys.stdout.flush()
+    inicio = time.perf_counter()
+    with perfil.fase('ejecucion', nodos=resultado.nodos):
+        errores = Interprete(resultado.tabla_simbolos).ejecutar(resultado.ast, sys.stdout)
+    milisegundos = (time.perf_counter() - inicio) * 1000
+    if errores:
+        mostrar_errores('errores_ejecucion', errores)
+        return False
+    print(f"Programa ejecutado en {milisegundos:.1f} ms")
+    return True
 
-    # 6 - Resumen final
+# Resumen final de una compilacion exitosa; con --build incluye el tiempo
+# de la compilacion nativa, la cache de binarios y el tamaño del ejecutable
+def mostrar_resumen(archivo_entrada, entrada, cache, nativo=None, construido=None):
     print("\n" + "=" * 50)
     print("COMPILACION EXITOSA")
-    print(f"    -   Tokens procesados: {len(tokens)}")
-    print(f"    -   Nodos en el AST: {contar_nodos_ast(ast)}")
-    print(f"    -   Variables declaradas: {len(checker.tabla_simbolos)}")
+    print(f"    -   Tokens procesados: {entrada['tokens']}")
+    print(f"    -   Nodos en el AST: {entrada['nodos']}")
+    print(f"    -   Variables declaradas: {entrada['variables']}")
+    eliminacion = entrada['eliminacion']
+    if eliminacion is not None:
+        print(f"    -   Sentencias: {eliminacion['sentencias']} antes de -O2, "
+              f"{eliminacion['sentencias'] - eliminacion['eliminadas']} despues "
+              f"({eliminacion['eliminadas']} asignaciones muertas eliminadas)")
+        print(f"    -   Codigo C++: {len(entrada['cpp'].encode('utf-8'))} bytes "
+              f"({eliminacion['bytes']} bytes menos por las asignaciones y "
+              f"{eliminacion['variables']} declaraciones eliminadas)")
     print(f"    -   Archivo de salida: {generar_nombre_salida(archivo_entrada)}")
-    
+    if cache is not None:
+        print(f"    -   Cache: {cache.aciertos} aciertos, {cache.fallos} fallos")
+    if construido is not None:
+        print(f"    -   Ejecutable: {construido.binario} ({construido.tamano} bytes)")
+        print(f"    -   Compilacion nativa: {construido.segundos:.2f} s")
+        if nativo.cache is not None:
+            print(f"    -   Cache de binarios: {nativo.cache.aciertos} aciertos, {nativo.cache.fallos} fallos")
+
+# Guarda el resultado de la compilacion en la cache, si se usa
+def guardar_en_cache(cache, clave, entrada):
+    if cache is not None:
+        cache.guardar(clave, entrada)
+
+# Recompila el archivo cada vez que cambia, reutilizando el analisis de las
+# partes que no se tocaron. Termina con Ctrl+C
+def vigilar_archivo(archivo_entrada, nivel_optimizacion=1):
+    print(f"=== COMPILADOR PYTHON A C++ (modo vigilancia) ===")
+    print(f"Archivo de entrada: {archivo_entrada}")
+    print("Presione Ctrl+C para terminar")
+    print("=" * 50)
+
+    compilador = CompiladorIncremental(optimizar=nivel_optimizacion > 0, eliminar_muertas=nivel_optimizacion > 1)
+    nombre_salida = generar_nombre_salida(archivo_entrada)
+    ultima_modificacion = None
+    ultimo_cpp = None
+
+    try:
+        while True:
+            try:
+                modificacion = os.stat(archivo_entrada).st_mtime_ns
+                if modificacion != ultima_modificacion:
+                    ultima_modificacion = modificacion
+                    with open(archivo_entrada, 'r', encoding='utf-8') as f:
+                        codigo_fuente = f.read()
+                    if codigo_fuente != compilador.texto:
+                        inicio = time.perf_counter()
+                        compilador.actualizar(codigo_fuente)
+                        milisegundos = (time.perf_counter() - inicio) * 1000
+                        ultimo_cpp = mostrar_resultado_vigilancia(
+                            compilador, nombre_salida, ultimo_cpp, milisegundos
+                        )
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error al leer el archivo: {e}")
+            time.sleep(INTERVALO_VIGILANCIA)
+    except KeyboardInterrupt:
+        print("\nVigilancia terminada")
+
+# Compila todos los archivos .py de las rutas en "trabajos" procesos y
+# muestra los errores de cada archivo, en orden de nombre, y un resumen
+def compilar_lote_archivos(rutas, trabajos, nivel_optimizacion=1, usar_cache=True, directorio_cache=None,
+                           max_errores=None, nativo=None):
+    print(f"=== COMPILADOR PYTHON A C++ (modo lote) ===")
+    archivos = buscar_archivos(rutas)
+    print(f"Archivos encontrados: {len(archivos)}")
+    print(f"Procesos: {trabajos}")
+    print("=" * 50)
+
+    inicio = time.perf_counter()
+    resultados = compilar_lote(archivos, trabajos, nivel_optimizacion, usar_cache, directorio_cache, max_errores)
+    segundos = time.perf_counter() - inicio
+
+    fallidos = [resultado for resultado in resultados if not resultado.exito]
+    for resultado in fallidos:
+        print(f"\n{resultado.archivo}")
+        mostrar_errores(resultado.fase, resultado.errores, max_errores)
+
+    # Con --build, los .cpp generados se compilan a la vez, en hasta
+    # "trabajos" procesos del compilador de C++
+    construidos = []
+    if nativo is not None:
+        inicio_nativo = time.perf_counter()
+        construidos = nativo.construir_varios(
+            [resultado.salida for resultado in resultados if resultado.exito], trabajos
+        )
+        segundos_nativos = time.perf_counter() - inicio_nativo
+    fallidos_nativos = [construido for construido in construidos if not construido.exito]
+    for construido in fallidos_nativos:
+        print(f"\n{construido.fuente}")
+        print("Se encontraron errores al compilar el C++:")
+        print(construido.error)
+
+    print("\n" + "=" * 50)
+    print("COMPILACION EXITOSA" if not fallidos and not fallidos_nativos else "COMPILACION CON ERRORES")
+    print(f"    -   Archivos compilados: {len(resultados) - len(fallidos)} de {len(resultados)}")
+    print(f"    -   Archivos con errores: {len(fallidos)}")
+    print(f"    -   Tokens procesados: {sum(resultado.tokens for resultado in resultados)}")
+    print(f"    -   Nodos en el AST: {sum(resultado.nodos for resultado in resultados)}")
+    if usar_cache:
+        aciertos = sum(1 for resultado in resultados if resultado.desde_cache)
+        consultas = sum(1 for resultado in resultados if resultado.desde_cache is not None)
+        print(f"    -   Cache: {aciertos} aciertos, {consultas - aciertos} fallos")
+    print(f"    -   Tiempo total: {segundos:.2f} s")
+    if nativo is not None:
+        exitosos = [construido for construido in construidos if construido.exito]
+        print(f"    -   Ejecutables construidos: {len(exitosos)} de {len(construidos)} ({nativo.comando})")
+        print(f"    -   Compilacion nativa: {segundos_nativos:.2f} s "
+              f"({sum(construido.segundos for construido in construidos):.2f} s sumando cada compilacion)")
+        if nativo.cache is not None:
+            print(f"    -   Cache de binarios: {nativo.cache.aciertos} aciertos, {nativo.cache.fallos} fallos")
+        print(f"    -   Tamaño de los ejecutables: {sum(construido.tamano for construido in exitosos)} bytes")
+    return not fallidos and not fallidos_nativos
+
+# Muestra el resultado de una recompilacion y escribe el .cpp si no hubo
+# errores y el codigo cambio. Devuelve el ultimo codigo escrito
+def mostrar_resultado_vigilancia(compilador, nombre_salida, ultimo_cpp, milisegundos):
+    print(f"\n[{time.strftime('%H:%M:%S')}] {compilador.bloques_reanalizados} bloques reanalizados, "
+          f"{compilador.sentencias_verificadas} sentencias verificadas en {milisegundos:.1f} ms")
+
+    fase, errores = compilador.errores()
+    if fase:
+        mostrar_errores(fase, errores)
+        return ultimo_cpp
+
+    if compilador.codigo_cpp != ultimo_cpp:
+        with open(nombre_salida, "w", encoding="utf-8") as f:
+            f.write(compilador.codigo_cpp)
+    print("COMPILACION EXITOSA")
+    print(f"    -   Tokens procesados: {compilador.contar_tokens()}")
+    print(f"    -   Nodos en el AST: {compilador.contar_nodos()}")
+    print(f"    -   Variables declaradas: {len(compilador.tabla_simbolos)}")
+    print(f"    -   Archivo de salida: {nombre_salida}")
+    return compilador.codigo_cpp
+
+# Lee el archivo como texto, o lo mapea en memoria para analizarlo en bytes.
+# Con usar_mmap=None se decide segun el tamaño del archivo
+def leer_codigo_fuente(archivo_entrada, usar_mmap=None):
+    if usar_mmap is None:
+        usar_mmap = os.path.getsize(archivo_entrada) >= UMBRAL_MMAP
+
+    if usar_mmap:
+        with open(archivo_entrada, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ''
+            fuente = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # El modo texto traduce \r\n y \r a \n; esos archivos, y los que no
+        # son UTF-8 valido (para conservar el mismo mensaje de error),
+        # se leen por la via normal
+        if fuente.find(b'\r') == -1 and es_utf8_valido(fuente):
+            return fuente
+        fuente.close()
+
+    with open(archivo_entrada, 'r', encoding='utf-8') as f:
+        return f.read()
+
+# Valida el UTF-8 por bloques, sin decodificar el archivo completo de una vez
+def es_utf8_valido(fuente):
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for inicio in range(0, len(fuente), BLOQUE_VALIDACION):
+            decodificador.decode(fuente[inicio:inicio + BLOQUE_VALIDACION])
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+# Muestra el perfil de la compilacion y guarda el reporte JSON y las
+# estadisticas de cProfile que correspondan
+def mostrar_perfil(archivo_entrada, perfil, mostrar_tabla, archivo_perfil):
+    if mostrar_tabla:
+        perfil.mostrar()
+    nombre_base = os.path.splitext(archivo_entrada)[0]
+    try:
+        if archivo_perfil:
+            perfil.guardar_json(archivo_perfil, archivo_entrada)
+            print(f"Reporte del perfil guardado en: {archivo_perfil}")
+        if perfil.perfil_cprofile is not None:
+            perfil.guardar_pstats(nombre_base + EXTENSION_PSTATS)
+            print(f"Estadisticas de cProfile guardadas en: {nombre_base + EXTENSION_PSTATS}")
+    except OSError as e:
+        print(f"Error al guardar el perfil: {e}")
+        return False
     return True
 
 # Cuenta todos los nodos en el AST
 def contar_nodos_ast(nodo):
     if not nodo:
         return 0
+    # El AST en arena conoce su tamaño
+    if hasattr(nodo, 'contar_nodos'):
+        return nodo.contar_nodos()
     count = 1
     for hijo in nodo.hijos:
         count += contar_nodos_ast(hijo)
@@ -112,27 +587,147 @@ def mostrar_uso():
     print("\nOpciones:")
     print(" -t, --tokens        Mostrar lista de tokens")
     print(" -a, --ast           Mostrar el arbol de sintaxis abstracta")
+    print("     --mmap          Analizar el archivo mapeado en memoria, en bytes")
+    print(f"                     (automatico desde {UMBRAL_MMAP // (1024 * 1024)} MB)")
+    print(" -w, --watch         Recompilar el archivo cada vez que se guarda")
+    print(" -O0, -O1, -O2       Nivel de optimizacion: -O1 (por defecto) pliega y")
+    print("                     propaga constantes, -O2 ademas elimina las asignaciones")
+    print("                     muertas y las variables sin usar, -O0 no optimiza")
+    print("     --warn-unused   Advertir las variables que se asignan y nunca se leen")
+    print("     --build         Compilar el .cpp con el compilador de C++ local (CXX, o")
+    print("                     g++/clang++, con las opciones de CXXFLAGS; por defecto -O2)")
+    print("                     y guardar el ejecutable en una cache de binarios")
+    print("     --run           Ejecutar el programa en el proceso, sin compilar el C++,")
+    print("                     con la misma salida que el ejecutable")
+    print("     --batch RUTAS   Compilar todos los .py de los archivos y directorios")
+    print("                     indicados (debe ser la primera opcion)")
+    print(" -j N, --jobs N      Procesos del modo lote (por defecto, uno por nucleo); con")
+    print("                     un archivo, dividirlo en fragmentos que se analizan y")
+    print("                     verifican en N procesos (por defecto, uno)")
+    print("     --no-cache      No usar la cache de compilaciones")
+    print("     --cache-dir DIR Directorio de la cache de compilaciones")
+    print("                     (por defecto ~/.cache/compilador-python-cpp)")
+    print("     --max-errors N  Detener cada fase al llegar a N errores")
+    print("     --stream        Compilar por sentencias y escribir el .cpp a medida que")
+    print("                     se genera, con memoria acotada (sin cache)")
+    print("     --emit-ast      Guardar los tokens y el AST en <archivo>.ast, que se")
+    print("                     puede compilar o mostrar con -a sin volver a analizar")
+    print("     --profile       Medir tiempo, CPU, memoria y rendimiento de cada fase")
+    print("     --profile=tiempo")
+    print("                     Medir sin tracemalloc, solo tiempo y rendimiento")
+    print("     --profile=cprofile")
+    print("                     Medir el tiempo y guardar <archivo>.pstats de cProfile")
+    print("     --profile-json ARCHIVO")
+    print("                     Guardar el perfil de las fases en ARCHIVO (JSON)")
+    print("     --serve         Quedar residente y compilar los pedidos (lineas JSON) que")
+    print("                     llegan por la entrada estandar o por --socket RUTA (debe")
+    print("                     ser la primera opcion; acepta -j N, --memoria MB y las")
+    print(f"                     opciones de la cache; por defecto {MEMORIA_MAXIMA_MB} MB por proceso)")
+    print("     --client SOCKET ARCHIVOS")
+    print("                     Compilar los archivos con el servidor del socket")
     print(" -h, --help          Mostrar ayuda del programa")
     print("\nEjemplos:")
     print(" python main.py programa.py")
     print(" python main.py programa.py --tokens --ast")
+    print(" python main.py programa.py --watch")
+    print(" python main.py programa.py -O0")
+    print(" python main.py programa.py -O2 --warn-unused")
+    print(" python main.py programa.py --run")
+    print(" python main.py programa_grande.py --stream")
+    print(" python main.py programa_grande.py -j 8")
+    print(" python main.py --batch src/ -j 4")
+    print(" python main.py --batch src/ -j 4 --build")
+    print(" python main.py programa.py --emit-ast")
+    print(" python main.py programa.ast --ast")
+    print(" python main.py programa.py --profile --profile-json perfil.json")
+    print(" python main.py --serve --socket /tmp/compilador.sock -j 4")
+    print(" python main.py --client /tmp/compilador.sock programa.py")
 
 def main():
     if len(sys.argv) < 2:
         mostrar_uso()
         return
+
+    if sys.argv[1] == '--batch':
+        main_lote(sys.argv[2:])
+        return
+    if sys.argv[1] == '--serve':
+        main_servidor(sys.argv[2:])
+        return
+    if sys.argv[1] == '--client':
+        main_cliente(sys.argv[2:])
+        return
     
     archivo_entrada = sys.argv[1]
     
     # Procesar opciones
     mostrar_tokens = False
     mostrar_ast = False
+    usar_mmap = None
+    vigilar = False
+    nivel_optimizacion = 1
+    usar_cache = True
+    directorio_cache = None
+    emitir_ast = False
+    perfilar = None
+    archivo_perfil = None
+    max_errores = None
+    en_flujo = False
+    trabajos = 1
+    advertir = False
+    construir = False
+    ejecutar = False
     
-    for arg in sys.argv[2:]:
+    argumentos = sys.argv[2:]
+    i = 0
+    while i < len(argumentos):
+        arg = argumentos[i]
         if arg in ['-t', '--tokens']:
             mostrar_tokens = True
         elif arg in ['-a', '--ast']:
             mostrar_ast = True
+        elif arg == '--mmap':
+            usar_mmap = True
+        elif arg in ['-w', '--watch']:
+            vigilar = True
+        elif arg in ['-O0', '-O1', '-O2']:
+            nivel_optimizacion = int(arg[2])
+        elif arg == '--no-cache':
+            usar_cache = False
+        elif arg == '--cache-dir':
+            i += 1
+            if i == len(argumentos):
+                print("Error: --cache-dir necesita un directorio")
+                mostrar_uso()
+                return
+            directorio_cache = argumentos[i]
+        elif arg == '--emit-ast':
+            emitir_ast = True
+        elif arg == '--stream':
+            en_flujo = True
+        elif arg == '--warn-unused':
+            advertir = True
+        elif arg == '--build':
+            construir = True
+        elif arg == '--run':
+            ejecutar = True
+        elif arg in ['-j', '--jobs'] or arg.startswith('-j'):
+            trabajos, i = leer_cantidad_procesos(argumentos, i)
+            if trabajos is None:
+                return
+        elif arg in ['--profile', '--profile=tiempo', '--profile=cprofile']:
+            perfilar = arg
+        elif arg == '--profile-json':
+            i += 1
+            if i == len(argumentos):
+                print("Error: --profile-json necesita un archivo")
+                mostrar_uso()
+                return
+            archivo_perfil = argumentos[i]
+        elif arg == '--max-errors':
+            max_errores, i = leer_max_errores(argumentos, i)
+            if max_errores is None:
+                return
         elif arg in ['-h', '--help']:
             mostrar_uso()
             return
@@ -140,17 +735,274 @@ def main():
             print(f"Opcion desconocida: {arg}")
             mostrar_uso()
             return
+        i += 1
     
     # Verificar que el archivo existe
     if not os.path.exists(archivo_entrada):
         print(f"Error: El archivo '{archivo_entrada}' no existe")
         return
+
+    if en_flujo and (mostrar_tokens or mostrar_ast or emitir_ast or vigilar or es_serializado(archivo_entrada)):
+        print("Error: --stream no se puede usar con -t, -a, --emit-ast, --watch ni un archivo .ast")
+        return
+    if en_flujo and nivel_optimizacion > 1:
+        print("Error: --stream no se puede usar con -O2 (la eliminacion de asignaciones necesita el programa completo)")
+        return
+    if advertir and (en_flujo or vigilar or es_serializado(archivo_entrada)):
+        print("Error: --warn-unused no se puede usar con --stream, --watch ni un archivo .ast")
+        return
+    if trabajos > 1 and (mostrar_tokens or emitir_ast or en_flujo or vigilar or es_serializado(archivo_entrada)):
+        print("Error: -j no se puede usar con -t, --emit-ast, --stream, --watch ni un archivo .ast")
+        return
+    if ejecutar and (en_flujo or vigilar):
+        print("Error: --run no se puede usar con --stream ni --watch (necesita el AST del programa completo)")
+        return
     
-    # Ejecutar el compilador
-    exito = compilar_python_a_cpp(archivo_entrada, mostrar_tokens, mostrar_ast)
+    if vigilar:
+        if perfilar or archivo_perfil:
+            print("Error: --profile no se puede usar con --watch")
+            return
+        if construir:
+            print("Error: --build no se puede usar con --watch")
+            return
+        vigilar_archivo(archivo_entrada, nivel_optimizacion)
+        return
+
+    nativo = None
+    if construir:
+        nativo = crear_compilador_nativo(usar_cache, directorio_cache)
+        if nativo is None:
+            return
+
+    # Con --profile se miden las fases; --profile-json sin --profile mide
+    # igual, solo que no muestra la tabla
+    perfil = PerfiladorNulo()
+    if perfilar or archivo_perfil:
+        perfil = Perfilador(
+            medir_memoria=perfilar in [None, '--profile'],
+            usar_cprofile=perfilar == '--profile=cprofile',
+        )
+        perfil.iniciar()
+
+    # Ejecutar el compilador; un AST serializado se compila sin volver a
+    # analizar el codigo fuente
+    if en_flujo:
+        exito = compilar_en_flujo(archivo_entrada, nivel_optimizacion, perfil, max_errores, nativo)
+    elif es_serializado(archivo_entrada):
+        exito = compilar_desde_ast(archivo_entrada, mostrar_tokens, mostrar_ast, nivel_optimizacion, perfil,
+                                   max_errores, nativo, ejecutar)
+    else:
+        exito = compilar_python_a_cpp(archivo_entrada, mostrar_tokens, mostrar_ast, usar_mmap, nivel_optimizacion,
+                                      usar_cache, directorio_cache, emitir_ast, perfil, max_errores, trabajos,
+                                      advertir, nativo, ejecutar)
+
+    if perfil:
+        perfil.terminar()
+        if not mostrar_perfil(archivo_entrada, perfil, perfilar is not None, archivo_perfil):
+            exito = False
     
     # Codigo de salida
     sys.exit(0 if exito else 1)
 
+# Opciones del modo lote: rutas de archivos o directorios, -j N, -O0/-O1/-O2,
+# --max-errors N, --build y las opciones de la cache
+def main_lote(argumentos):
+    rutas = []
+    trabajos = os.cpu_count() or 1
+    nivel_optimizacion = 1
+    usar_cache = True
+    directorio_cache = None
+    max_errores = None
+    construir = False
+
+    i = 0
+    while i < len(argumentos):
+        arg = argumentos[i]
+        if arg in ['-j', '--jobs'] or arg.startswith('-j'):
+            trabajos, i = leer_cantidad_procesos(argumentos, i)
+            if trabajos is None:
+                return
+        elif arg in ['-O0', '-O1', '-O2']:
+            nivel_optimizacion = int(arg[2])
+        elif arg == '--no-cache':
+            usar_cache = False
+        elif arg == '--cache-dir':
+            i += 1
+            if i == len(argumentos):
+                print("Error: --cache-dir necesita un directorio")
+                mostrar_uso()
+                return
+            directorio_cache = argumentos[i]
+        elif arg == '--max-errors':
+            max_errores, i = leer_max_errores(argumentos, i)
+            if max_errores is None:
+                return
+        elif arg == '--build':
+            construir = True
+        elif arg in ['-h', '--help']:
+            mostrar_uso()
+            return
+        elif arg.startswith('-'):
+            print(f"Opcion desconocida en modo lote: {arg}")
+            mostrar_uso()
+            return
+        elif not os.path.exists(arg):
+            print(f"Error: La ruta '{arg}' no existe")
+            return
+        else:
+            rutas.append(arg)
+        i += 1
+
+    if not rutas:
+        print("Error: --batch necesita al menos un archivo o directorio")
+        mostrar_uso()
+        return
+
+    nativo = None
+    if construir:
+        nativo = crear_compilador_nativo(usar_cache, directorio_cache)
+        if nativo is None:
+            return
+
+    exito = compilar_lote_archivos(rutas, trabajos, nivel_optimizacion, usar_cache, directorio_cache, max_errores,
+                                   nativo)
+    sys.exit(0 if exito else 1)
+
+# Compilador de C++ para --build: el de la variable CXX o el primero que
+# este instalado, con las opciones de CXXFLAGS. Si no hay ninguno muestra
+# el error y devuelve None
+def crear_compilador_nativo(usar_cache=True, directorio_cache=None):
+    try:
+        nativo = CompiladorNativo(usar_cache=usar_cache, directorio_cache=directorio_cache)
+        nativo.version()
+    except CompiladorNoEncontrado as e:
+        print(f"Error: {e}")
+        return None
+    return nativo
+
+# Valor de -j N, --jobs N o -jN en la posicion i de los argumentos, y la
+# posicion del ultimo argumento usado. Si no es valido muestra el error y
+# devuelve None
+def leer_cantidad_procesos(argumentos, i):
+    arg = argumentos[i]
+    if arg in ['-j', '--jobs']:
+        i += 1
+        valor = argumentos[i] if i < len(argumentos) else ''
+    else:
+        valor = arg[2:]
+    if not valor.isdigit() or int(valor) < 1:
+        print(f"Cantidad de procesos invalida: {valor}")
+        mostrar_uso()
+        return None, i
+    return int(valor), i
+
+# Valor de --max-errors N en la posicion i de los argumentos, y la
+# posicion del valor. Si no es valido muestra el error y devuelve None
+def leer_max_errores(argumentos, i):
+    i += 1
+    valor = argumentos[i] if i < len(argumentos) else ''
+    if not valor.isdigit() or int(valor) < 1:
+        print(f"Cantidad de errores invalida para --max-errors: {valor}")
+        mostrar_uso()
+        return None, i
+    return int(valor), i
+
+# Opciones del modo servidor: --socket RUTA, -j N, --memoria MB y las
+# opciones de la cache. Sin --socket atiende por la entrada y la salida
+# estandar, que quedan reservadas para el protocolo: los mensajes del
+# servidor van a la salida de errores
+def main_servidor(argumentos):
+    ruta_socket = None
+    trabajos = os.cpu_count() or 1
+    memoria_maxima = MEMORIA_MAXIMA_MB
+    usar_cache = True
+    directorio_cache = None
+
+    i = 0
+    while i < len(argumentos):
+        arg = argumentos[i]
+        if arg in ['-j', '--jobs'] or arg.startswith('-j'):
+            trabajos, i = leer_cantidad_procesos(argumentos, i)
+            if trabajos is None:
+                return
+        elif arg in ['--socket', '--memoria', '--cache-dir']:
+            i += 1
+            if i == len(argumentos):
+                print(f"Error: {arg} necesita un valor")
+                mostrar_uso()
+                return
+            if arg == '--socket':
+                ruta_socket = argumentos[i]
+            elif arg == '--cache-dir':
+                directorio_cache = argumentos[i]
+            elif argumentos[i].isdigit():
+                memoria_maxima = int(argumentos[i])
+            else:
+                print(f"Memoria maxima invalida: {argumentos[i]}")
+                return
+        elif arg == '--no-cache':
+            usar_cache = False
+        elif arg in ['-h', '--help']:
+            mostrar_uso()
+            return
+        else:
+            print(f"Opcion desconocida en modo servidor: {arg}")
+            mostrar_uso()
+            return
+        i += 1
+
+    servidor = ServidorCompilacion(trabajos, memoria_maxima, usar_cache, directorio_cache)
+    servidor.iniciar()
+    instalar_senales(servidor)
+    if ruta_socket is None:
+        print(f"Servidor de compilacion atendiendo por la entrada estandar ({trabajos} procesos)", file=sys.stderr)
+        servir_stdio(servidor)
+    else:
+        try:
+            servir_socket(servidor, ruta_socket)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            servidor.apagar()
+            sys.exit(1)
+    print(f"Servidor detenido: {servidor.atendidos} pedidos atendidos", file=sys.stderr)
+
+# Cliente del servidor: compila los archivos indicados con el servidor que
+# escucha en el socket y muestra los errores de cada uno
+def main_cliente(argumentos):
+    if not argumentos or argumentos[0] in ['-h', '--help']:
+        mostrar_uso()
+        return
+    ruta_socket = argumentos[0]
+    archivos = []
+    opciones = {}
+    for arg in argumentos[1:]:
+        if arg in ['-O0', '-O1', '-O2']:
+            opciones['nivel_optimizacion'] = int(arg[2])
+        elif arg == '--no-cache':
+            opciones['cache'] = False
+        elif arg.startswith('-'):
+            print(f"Opcion desconocida en modo cliente: {arg}")
+            mostrar_uso()
+            return
+        else:
+            archivos.append(arg)
+
+    exito = True
+    try:
+        with ClienteCompilacion(ruta_socket) as cliente:
+            for archivo in archivos:
+                respuesta = cliente.compilar(archivo, **opciones)
+                if respuesta['exito']:
+                    print(f"{archivo}: {respuesta['salida']} ({respuesta['milisegundos']:.1f} ms)")
+                    continue
+                exito = False
+                print(f"{archivo}:")
+                for diagnostico in respuesta['diagnosticos']:
+                    print(f"    {diagnostico['mensaje']}")
+    except OSError as e:
+        print(f"Error al conectar con el servidor en {ruta_socket}: {e}")
+        exito = False
+    sys.exit(0 if exito else 1)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,251 @@
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache.cache import CacheCompilacion, directorio_por_defecto, reemplazar_si_cambio, BLOQUE_HASH
+
+# Version del formato de las entradas de binarios; cambiarla invalida
+# todos los binarios guardados
+FORMATO_BINARIOS = 1
+
+# Compiladores de C++ que se buscan, en orden, si no se indica uno con la
+# variable de entorno CXX
+COMPILADORES_CPP = ("g++", "clang++", "c++")
+
+# Opciones del compilador de C++ si no se indican con CXXFLAGS
+OPCIONES_POR_DEFECTO = "-O2"
+
+# Subdirectorio de la cache de compilaciones donde se guardan los binarios;
+# tiene su propio tamaño maximo
+SUBDIRECTORIO_BINARIOS = "binarios"
+TAMANO_MAXIMO_BINARIOS = 512 * 1024 * 1024
+
+
+# No hay un compilador de C++ para la etapa nativa
+class CompiladorNoEncontrado(Exception):
+    pass
+
+
+# Resultado de construir el ejecutable de un .cpp: el binario, si salio de
+# la cache, los segundos del compilador de C++ (0 si no se ejecuto), el
+# tamaño del binario y, si fallo, el mensaje del compilador
+class ResultadoNativo:
+    __slots__ = ('fuente', 'binario', 'desde_cache', 'segundos', 'tamano', 'escrito', 'error')
+
+    def __init__(self, fuente, binario):
+        self.fuente = fuente
+        self.binario = binario
+        self.desde_cache = None     # True/False si se consulto la cache
+        self.segundos = 0.0
+        self.tamano = 0
+        self.escrito = False        # Si el binario de salida cambio
+        self.error = None
+
+    @property
+    def exito(self):
+        return self.error is None
+
+
+# Cache de binarios en disco: la clave es el hash del C++, del compilador y
+# de sus opciones, y cada entrada es el ejecutable tal como lo produjo el
+# compilador. Comparte con la cache de compilaciones el reparto en
+# subdirectorios y el recorte LRU por fecha de modificacion
+class CacheBinarios(CacheCompilacion):
+    def __init__(self, directorio=None, tamano_maximo=TAMANO_MAXIMO_BINARIOS):
+        directorio = os.path.join(directorio or directorio_por_defecto(), SUBDIRECTORIO_BINARIOS)
+        super().__init__(directorio, tamano_maximo)
+
+    # Ruta del binario guardado con la clave, o None. Un acierto renueva la
+    # fecha de la entrada para el orden LRU
+    def buscar(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            os.utime(ruta)
+        except OSError:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return ruta
+
+    # Mueve a la cache el binario recien compilado en temporal; los errores
+    # de disco solo hacen que no se guarde (y el temporal se borra)
+    def guardar(self, clave, temporal):
+        ruta = self._ruta(clave)
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            tamano = os.path.getsize(temporal)
+            os.replace(temporal, ruta)
+        except OSError:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            return
+
+        if self.tamano is None:
+            self._recortar()
+        else:
+            self.tamano += tamano
+            if self.tamano > self.tamano_maximo:
+                self._recortar()
+
+
+# Compilador de C++ de la variable CXX o el primero de COMPILADORES_CPP que
+# este instalado
+def buscar_compilador_cpp():
+    configurado = os.environ.get("CXX")
+    if configurado:
+        return configurado
+    for nombre in COMPILADORES_CPP:
+        ruta = shutil.which(nombre)
+        if ruta is not None:
+            return ruta
+    raise CompiladorNoEncontrado(
+        f"No se encontro un compilador de C++ ({', '.join(COMPILADORES_CPP)}); indique uno con la variable CXX"
+    )
+
+
+# Nombre del ejecutable de un .cpp: el mismo nombre sin extension (.exe en
+# Windows)
+def generar_nombre_binario(ruta_cpp):
+    nombre_base = os.path.splitext(ruta_cpp)[0]
+    return nombre_base + ".exe" if os.name == 'nt' else nombre_base
+
+
+# Etapa nativa: construye con el compilador de C++ local el ejecutable de
+# cada .cpp generado. Los binarios se guardan en una cache indexada por el
+# hash del C++, la version del compilador y sus opciones, asi que un .cpp
+# que no cambio no se vuelve a compilar; como en el .cpp, un ejecutable que
+# ya tiene el mismo contenido no se reescribe. Con varios .cpp, los que
+# faltan en la cache se compilan en paralelo (cada compilacion es un
+# proceso aparte, asi que alcanza con hilos)
+#
+#   nativo = CompiladorNativo()
+#   resultado = nativo.construir("programa.cpp")
+#   resultado.binario, resultado.tamano, resultado.error
+class CompiladorNativo:
+    def __init__(self, compilador=None, opciones=None, usar_cache=True, directorio_cache=None,
+                 tamano_maximo=TAMANO_MAXIMO_BINARIOS):
+        self.compilador = compilador or buscar_compilador_cpp()
+        if opciones is None:
+            opciones = os.environ.get("CXXFLAGS", OPCIONES_POR_DEFECTO)
+        self.opciones = shlex.split(opciones) if isinstance(opciones, str) else list(opciones)
+        self.cache = CacheBinarios(directorio_cache, tamano_maximo) if usar_cache else None
+        self._version = None
+
+    # Comando que se muestra en el resumen
+    @property
+    def comando(self):
+        return shlex.join([os.path.basename(self.compilador)] + self.opciones)
+
+    # Primera linea de "--version" del compilador; forma parte de la clave
+    # para que actualizar el compilador no reutilice binarios viejos
+    def version(self):
+        if self._version is None:
+            try:
+                salida = subprocess.run([self.compilador, "--version"], capture_output=True, text=True,
+                                        errors='replace')
+            except OSError as e:
+                raise CompiladorNoEncontrado(f"No se pudo ejecutar el compilador de C++ {self.compilador}: {e}")
+            self._version = salida.stdout.partition("\n")[0]
+        return self._version
+
+    # Clave de un .cpp; lo lee por bloques para no cargar archivos grandes
+    # completos en memoria
+    def clave(self, ruta_cpp):
+        h = hashlib.sha256(
+            f"formato {FORMATO_BINARIOS} {self.compilador} {self.version()} {self.comando}\n".encode()
+        )
+        with open(ruta_cpp, 'rb') as f:
+            for bloque in iter(lambda: f.read(BLOQUE_HASH), b''):
+                h.update(bloque)
+        return h.hexdigest()
+
+    # Construye el ejecutable de un .cpp
+    def construir(self, ruta_cpp, ruta_binario=None):
+        return self.construir_varios([ruta_cpp], 1, [ruta_binario])[0]
+
+    # Construye los ejecutables de varios .cpp con hasta "trabajos"
+    # compilaciones a la vez. Las consultas y escrituras de la cache se
+    # hacen en este hilo; los hilos solo esperan al compilador. Los
+    # resultados vuelven en el mismo orden que los archivos
+    def construir_varios(self, rutas_cpp, trabajos=1, rutas_binarios=None):
+        if rutas_binarios is None:
+            rutas_binarios = [None] * len(rutas_cpp)
+        self.version()
+        resultados = []
+        pendientes = []
+        for ruta_cpp, ruta_binario in zip(rutas_cpp, rutas_binarios):
+            resultado = ResultadoNativo(ruta_cpp, ruta_binario or generar_nombre_binario(ruta_cpp))
+            resultados.append(resultado)
+            try:
+                clave = self.clave(ruta_cpp)
+            except OSError as e:
+                resultado.error = f"No se pudo leer {ruta_cpp}: {e}"
+                continue
+            guardado = self.cache.buscar(clave) if self.cache is not None else None
+            if guardado is not None:
+                resultado.desde_cache = True
+                self._copiar(resultado, guardado)
+            else:
+                resultado.desde_cache = False if self.cache is not None else None
+                pendientes.append((resultado, clave))
+
+        if trabajos <= 1 or len(pendientes) <= 1:
+            compilados = [self._compilar(resultado) for resultado, _ in pendientes]
+        else:
+            with ThreadPoolExecutor(max_workers=trabajos) as ejecutor:
+                compilados = list(ejecutor.map(self._compilar, [resultado for resultado, _ in pendientes]))
+
+        for (resultado, clave), temporal in zip(pendientes, compilados):
+            if temporal is None:
+                continue
+            self._copiar(resultado, temporal)
+            if self.cache is not None:
+                self.cache.guardar(clave, temporal)
+            else:
+                try:
+                    os.remove(temporal)
+                except OSError:
+                    pass
+        return resultados
+
+    # Ejecuta el compilador de C++ sobre el .cpp y devuelve el temporal con
+    # el ejecutable, o None si fallo (el mensaje queda en el resultado)
+    def _compilar(self, resultado):
+        temporal = f"{resultado.binario}.{os.getpid()}.{id(resultado)}.tmp"
+        comando = [self.compilador] + self.opciones + ["-o", temporal, resultado.fuente]
+        inicio = time.perf_counter()
+        try:
+            proceso = subprocess.run(comando, capture_output=True, text=True, errors='replace')
+        except OSError as e:
+            resultado.error = f"No se pudo ejecutar el compilador de C++ {self.compilador}: {e}"
+            return None
+        finally:
+            resultado.segundos = time.perf_counter() - inicio
+        if proceso.returncode != 0:
+            resultado.error = (proceso.stderr or proceso.stdout).rstrip() or \
+                f"El compilador de C++ termino con codigo {proceso.returncode}"
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            return None
+        return temporal
+
+    # Copia el binario al ejecutable de salida, solo si su contenido cambia
+    def _copiar(self, resultado, origen):
+        temporal = f"{resultado.binario}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(origen, temporal)
+            shutil.copymode(origen, temporal)
+            resultado.escrito = reemplazar_si_cambio(temporal, resultado.binario)
+            resultado.tamano = os.path.getsize(resultado.binario)
+        except OSError as e:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            resultado.error = f"No se pudo escribir el ejecutable {resultado.binario}: {e}"
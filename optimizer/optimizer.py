@@ -0,0 +1,339 @@
+import math
+import operator
+
+from checker.checker import TIPOS_LITERAL
+from parser.parser import CODIGOS_NODO, SIN_NODO
+from diagnostics.diagnostics import Diagnostico
+
+# Rango del int de C++; un resultado fuera de el desborda y no se pliega.
+# INT_MIN tampoco, porque el literal -2147483648 es long en C++
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+# Codigos de los tipos de nodo que recorre el optimizador
+N_ASSIGN = CODIGOS_NODO["Assign"]
+N_BINARY_OP = CODIGOS_NODO["BinaryOp"]
+N_IDENTIFIER = CODIGOS_NODO["Identifier"]
+N_LITERAL = CODIGOS_NODO["Literal"]
+
+OPERACIONES_ARITMETICAS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+}
+OPERACIONES_COMPARACION = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+
+# Optimizador que corre despues del analisis semantico. Pliega las
+# operaciones cuyos operandos son constantes y propaga el valor de las
+# variables asignadas con una constante a sus lecturas posteriores.
+# Los valores siguen la semantica de C++ del codigo generado: division y
+# modulo enteros truncan hacia cero, ** entre enteros es una potencia
+# entera (con exponente negativo, 1 / a^-b truncado) y con un double es
+# pow(), % con un double es fmod(), y nada que desborde, divida por
+# cero o no sea finito se pliega. Las cadenas no se tocan; sus errores de
+# tipo los reporta el checker.
+# tabla_simbolos es la del checker: el valor propagado de una variable es
+# el que queda al guardarlo con el tipo con el que se declara.
+# El AST no se modifica: cada subarbol plegado se anota en arbol.constantes
+# con el texto C++ de su valor, y el generador lo usa en su lugar
+class Optimizador:
+    def __init__(self, tabla_simbolos=None):
+        self.tabla_simbolos = tabla_simbolos if tabla_simbolos is not None else {}
+        self.constantes = {}    # Nombre_variable: valor constante actual
+        self.plegados = 0       # Subarboles reemplazados por una constante
+
+    def optimizar(self, ast):
+        for nodo in ast.hijos:
+            self.optimizar_sentencia(nodo)
+        return self.plegados
+
+    # Optimiza una sentencia de nivel superior con las constantes actuales
+    def optimizar_sentencia(self, nodo):
+        arbol = nodo.arbol
+        raiz = arbol.primeros_hijos[nodo.indice]
+        if raiz == SIN_NODO:
+            return
+
+        tipos = arbol.tipos
+        valores = arbol.valores
+        tabla_valores = arbol.tabla_valores
+        nombres = arbol.nombres.nombres
+        tipos_token = arbol.tipos_token
+        primeros_hijos = arbol.primeros_hijos
+        siguientes = arbol.siguientes
+        constantes = self.constantes
+
+        # Nodos en preorden; recorridos al reves, cada hijo se evalua antes
+        # que su padre. Un nodo sin valor constante queda en None
+        orden = []
+        pendientes = [raiz]
+        while pendientes:
+            indice = pendientes.pop()
+            orden.append(indice)
+            if tipos[indice] == N_BINARY_OP:
+                izquierda = primeros_hijos[indice]
+                pendientes.append(izquierda)
+                pendientes.append(siguientes[izquierda])
+
+        calculados = {}
+        for indice in reversed(orden):
+            tipo = tipos[indice]
+            if tipo == N_BINARY_OP:
+                izquierda = primeros_hijos[indice]
+                valor_izq = calculados[izquierda]
+                valor_der = calculados[siguientes[izquierda]]
+                if valor_izq is None or valor_der is None:
+                    calculados[indice] = None
+                else:
+                    calculados[indice] = operar(tabla_valores[valores[indice]], valor_izq, valor_der)
+            elif tipo == N_IDENTIFIER:
+                calculados[indice] = constantes.get(nombres[valores[indice]])
+            elif tipo == N_LITERAL:
+                calculados[indice] = valor_literal(tabla_valores[valores[indice]], tipos_token[indice])
+            else:
+                calculados[indice] = None
+
+        # Anotar los subarboles constantes mas altos; los literales se
+        # dejan con su texto original. Las anotaciones de una optimizacion
+        # anterior de la sentencia se descartan al pasar
+        anotaciones = arbol.constantes
+        pendientes = [raiz]
+        while pendientes:
+            indice = pendientes.pop()
+            anotaciones.pop(indice, None)
+            valor = calculados[indice]
+            if valor is not None and tipos[indice] != N_LITERAL:
+                anotaciones[indice] = texto_cpp(valor)
+                self.plegados += 1
+            elif tipos[indice] == N_BINARY_OP:
+                izquierda = primeros_hijos[indice]
+                pendientes.append(siguientes[izquierda])
+                pendientes.append(izquierda)
+
+        # La variable guarda el valor convertido a su tipo declarado, o deja
+        # de ser constante
+        if tipos[nodo.indice] == N_ASSIGN:
+            valor = calculados[raiz]
+            if valor is not None:
+                valor = convertir(valor, self.tabla_simbolos.get(nodo.valor))
+            if valor is None:
+                constantes.pop(nodo.valor, None)
+            else:
+                constantes[nodo.valor] = valor
+
+
+# Eliminacion de asignaciones muertas (-O2) con un analisis de
+# definiciones y usos. El programa no tiene saltos, asi que basta recorrer
+# las sentencias de la ultima a la primera recordando que variables se leen
+# mas adelante: una asignacion cuya variable no se lee antes de volver a
+# asignarse (o antes del final) esta muerta y se elimina si su expresion no
+# tiene efectos observables. Las lecturas son las que quedan despues de
+# plegar constantes, asi que corre despues del Optimizador: una variable
+# que solo se lee donde su valor se propago tambien se elimina. Las
+# variables que no se asignan ni se leen en las sentencias que quedan no
+# hace falta declararlas
+class EliminadorAsignaciones:
+    def __init__(self):
+        self.leidas = set()     # Variables cuyo valor actual se lee mas adelante
+        self.variables = set()  # Variables de las sentencias conservadas
+
+    # Recibe las sentencias en orden inverso: la variable asignada (o None),
+    # las que lee y si tiene efectos. Indica si la sentencia se conserva
+    def conservar(self, destino, leidas, efectos):
+        if destino is not None:
+            if destino not in self.leidas and not efectos:
+                return False
+            self.leidas.discard(destino)
+            self.variables.add(destino)
+        self.leidas.update(leidas)
+        self.variables.update(leidas)
+        return True
+
+    # Quita del programa las asignaciones muertas y las devuelve en orden
+    def eliminar(self, ast):
+        arbol = ast.arbol
+        eliminadas = []
+        for indice in reversed(arbol.hijos(ast.indice)):
+            destino = arbol.valor(indice) if arbol.tipos[indice] == N_ASSIGN else None
+            if not self.conservar(destino, *usos_sentencia(arbol, indice)):
+                eliminadas.append(indice)
+        if eliminadas:
+            arbol.quitar_hijos(ast.indice, set(eliminadas))
+        return [arbol.cursor(indice) for indice in reversed(eliminadas)]
+
+
+# Variables que lee la expresion de una sentencia sin contar los subarboles
+# plegados, y si puede tener efectos: una division o un modulo cuyo divisor
+# no es una constante distinta de cero puede terminar el programa
+def usos_sentencia(arbol, indice):
+    leidas = set()
+    efectos = False
+    raiz = arbol.primeros_hijos[indice]
+    if raiz == SIN_NODO:
+        return leidas, efectos
+
+    tipos = arbol.tipos
+    valores = arbol.valores
+    tabla_valores = arbol.tabla_valores
+    nombres = arbol.nombres.nombres
+    primeros_hijos = arbol.primeros_hijos
+    siguientes = arbol.siguientes
+    constantes = arbol.constantes
+    pendientes = [raiz]
+    while pendientes:
+        actual = pendientes.pop()
+        if constantes and actual in constantes:
+            continue
+        tipo = tipos[actual]
+        if tipo == N_IDENTIFIER:
+            leidas.add(nombres[valores[actual]])
+        elif tipo == N_BINARY_OP:
+            izquierda = primeros_hijos[actual]
+            derecha = siguientes[izquierda]
+            if tabla_valores[valores[actual]] in ('/', '%') and not constante_no_nula(arbol, derecha):
+                efectos = True
+            pendientes.append(izquierda)
+            pendientes.append(derecha)
+    return leidas, efectos
+
+
+# Indica si el nodo es una constante (plegada o literal numerico) distinta
+# de cero
+def constante_no_nula(arbol, indice):
+    texto = arbol.constantes.get(indice)
+    if texto is not None:
+        return texto not in ("0", "0.0", "-0.0", "false")
+    if arbol.tipos[indice] != N_LITERAL:
+        return False
+    valor = valor_literal(arbol.tabla_valores[arbol.valores[indice]], arbol.tipos_token[indice])
+    return valor is not None and valor != 0
+
+
+# Advertencias por las variables que se asignan y nunca se leen en el
+# programa (antes de optimizar), en su primera asignacion. Las variables se
+# comparan por su id en la tabla de nombres
+def variables_sin_leer(ast):
+    arbol = ast.arbol
+    tipos = arbol.tipos
+    valores = arbol.valores
+    leidas = {valores[indice] for indice in arbol.subarbol(ast.indice) if tipos[indice] == N_IDENTIFIER}
+    advertencias = []
+    for indice in arbol.hijos(ast.indice):
+        if tipos[indice] != N_ASSIGN:
+            continue
+        simbolo = valores[indice]
+        if simbolo not in leidas:
+            leidas.add(simbolo)
+            nombre = arbol.nombres.nombres[simbolo]
+            linea, columna = arbol.ubicar(indice)
+            advertencias.append(Diagnostico(
+                'advertencias', "Advertencia: la variable '{}' se asigna pero nunca se lee en linea {}, columna {}",
+                (nombre, linea, columna), linea, columna
+            ))
+    return advertencias
+
+
+# Valor de un literal numerico como lo lee C++, o None si no se puede plegar
+# (cadenas, digitos no ASCII, enteros que no caben en int)
+def valor_literal(texto, tipo_token):
+    tipo = TIPOS_LITERAL.get(tipo_token)
+    if tipo not in ('int', 'float') or not texto.isascii():
+        return None
+    if tipo == 'float':
+        return float(texto)
+
+    # En C++ un entero con cero inicial es octal
+    if len(texto) > 1 and texto[0] == '0':
+        try:
+            valor = int(texto, 8)
+        except ValueError:
+            return None
+    else:
+        valor = int(texto)
+    return valor if valor <= INT_MAX else None
+
+
+# Resultado de una operacion binaria entre constantes con la semantica de
+# C++, o None si no se puede plegar
+def operar(operador, izquierda, derecha):
+    comparacion = OPERACIONES_COMPARACION.get(operador)
+    if comparacion is not None:
+        return comparacion(izquierda, derecha)
+
+    if operador == '**' and (isinstance(izquierda, float) or isinstance(derecha, float)):
+        try:
+            resultado = math.pow(izquierda, derecha)
+        except (ValueError, OverflowError):
+            return None
+        return resultado if math.isfinite(resultado) else None
+
+    # Con un operando double la operacion es en double; % es fmod()
+    if isinstance(izquierda, float) or isinstance(derecha, float):
+        izquierda, derecha = float(izquierda), float(derecha)
+        if operador == '/':
+            if derecha == 0:
+                return None
+            resultado = izquierda / derecha
+        elif operador == '%':
+            try:
+                resultado = math.fmod(izquierda, derecha)
+            except ValueError:
+                return None
+        elif operador in OPERACIONES_ARITMETICAS:
+            resultado = OPERACIONES_ARITMETICAS[operador](izquierda, derecha)
+        else:
+            return None
+        return resultado if math.isfinite(resultado) else None
+
+    # Enteros (un bool cuenta como 0 o 1); / y % truncan hacia cero
+    izquierda, derecha = int(izquierda), int(derecha)
+    if operador in ('/', '%'):
+        if derecha == 0:
+            return None
+        cociente = abs(izquierda) // abs(derecha)
+        if (izquierda < 0) != (derecha < 0):
+            cociente = -cociente
+        resultado = cociente if operador == '/' else izquierda - derecha * cociente
+    elif operador in OPERACIONES_ARITMETICAS:
+        resultado = OPERACIONES_ARITMETICAS[operador](izquierda, derecha)
+    elif operador == '**':
+        if derecha < 0:
+            resultado = izquierda ** (derecha % 2) if abs(izquierda) == 1 else 0
+        elif abs(izquierda) > 1 and derecha > 31:
+            return None
+        else:
+            resultado = izquierda ** derecha
+    else:
+        return None
+    return resultado if INT_MIN < resultado <= INT_MAX else None
+
+
+# Valor que queda en una variable del tipo indicado al asignarle la
+# constante, o None si no se conoce el tipo o la conversion no esta
+# definida en C++
+def convertir(valor, tipo):
+    if tipo == 'float':
+        return float(valor)
+    if tipo == 'bool':
+        return bool(valor)
+    if tipo != 'int':
+        return None
+    if isinstance(valor, float):
+        valor = math.trunc(valor)
+    valor = int(valor)
+    return valor if INT_MIN < valor <= INT_MAX else None
+
+
+# Texto C++ de una constante
+def texto_cpp(valor):
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return repr(valor)
@@ -0,0 +1,356 @@
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from lexer.lexer import Lexer, IndiceLineas
+from parser.parser import Parser, ArbolAST, SIN_NODO, CODIGOS_NODO, CODIGOS_CON_NOMBRE
+from checker.checker import Checker
+from pipeline.pipeline import Compilador, ResultadoCompilacion
+from profiling.profiling import PerfiladorNulo
+from diagnostics.diagnostics import limite_alcanzado
+
+# Fragmentos en que se divide el codigo fuente por cada proceso; mas de uno
+# por proceso equilibra la carga cuando algunos fragmentos tardan mas
+FRAGMENTOS_POR_PROCESO = 2
+
+# Tamaño minimo (en caracteres o bytes) de un fragmento: con menos codigo
+# crear los procesos y unir los arboles cuesta mas de lo que se gana
+TAMANO_MINIMO_FRAGMENTO = 256 * 1024
+
+# Codigo fuente y arbol que los procesos trabajadores heredan al crearse
+# (con fork), para no enviarlos en cada tarea
+_fuente = None
+_arbol = None
+
+T_ASSIGN = CODIGOS_NODO["Assign"]
+
+
+# Resultado del analisis lexico y sintactico de un fragmento: lo que el
+# proceso trabajador devuelve al principal. Las columnas del arbol son las
+# de la arena del fragmento, cuya raiz Program es el nodo 0, y nombres son
+# los de su tabla de nombres, en orden de id. definiciones
+# tiene, por cada variable asignada en el fragmento, el indice de la
+# sentencia que la asigna por primera vez
+class FragmentoAnalizado:
+    __slots__ = ('inicio', 'fin', 'fin_lexico', 'errores_lexicos', 'reanalizado', 'cantidad_tokens',
+                 'errores_sintacticos', 'ultima_fallida', 'columnas', 'tabla_valores', 'nombres',
+                 'sentencias', 'definiciones')
+
+    def __init__(self, inicio, fin):
+        self.inicio = inicio
+        self.fin = fin
+        self.fin_lexico = fin
+        self.errores_lexicos = []
+        self.reanalizado = False
+        self.cantidad_tokens = 0
+        self.errores_sintacticos = []
+        self.ultima_fallida = False     # Una sentencia con error llego al fin
+        self.columnas = None
+        self.tabla_valores = None
+        self.nombres = None
+        self.sentencias = []            # Indices de las sentencias, en orden
+        self.definiciones = []
+
+    # Si el fragmento siguiente empieza donde lo hace en el analisis
+    # completo: ningun token cruza el limite y ninguna sentencia con error
+    # llego al final del fragmento (el error podria deberse a que el
+    # fragmento termina ahi)
+    @property
+    def limite_seguro(self):
+        return self.fin_lexico == self.fin and not self.ultima_fallida
+
+
+# Compilador que reparte un codigo fuente muy grande entre varios procesos.
+# El codigo se corta en lineas cercanas a partes iguales; cada fragmento se
+# analiza (lexico y sintactico) en un proceso y sus sentencias se unen en
+# un unico Program. Un corte dentro de un docstring o de una sentencia de
+# varias lineas se detecta porque un token lo cruza o porque la ultima
+# sentencia del fragmento falla, y entonces ese fragmento se une con el
+# siguiente y se vuelve a analizar. La verificacion semantica recorre
+# primero, en orden, solo la primera asignacion de cada variable (lo que
+# decide la tabla de simbolos) y despues verifica cada fragmento en un
+# proceso con la tabla que tendria al empezar. La optimizacion y la
+# generacion se hacen en el proceso principal: la propagacion de
+# constantes y las temporales de las subexpresiones comunes dependen de
+# todo el codigo anterior. Los diagnosticos, la tabla de simbolos y el C++
+# son exactamente los de Compilador; si el lexico tiene errores, o un tipo
+# no se puede decidir por adelantado, la fase se repite sin dividir.
+# Necesita procesos creados con fork (Linux); si no, compila en uno solo.
+#
+#   resultado = CompiladorParalelo(trabajos=8).compilar(fuente)
+class CompiladorParalelo(Compilador):
+    def __init__(self, nivel_optimizacion=1, max_errores=None, trabajos=None):
+        super().__init__(nivel_optimizacion, max_errores)
+        self.trabajos = trabajos or multiprocessing.cpu_count()
+        self.fragmentos = None      # Fragmentos del ultimo analisis
+        self.arbol = None           # Arena unida del ultimo analisis
+
+    # Analisis lexico y sintactico de los fragmentos en paralelo. El
+    # resultado no tiene el TokenBuffer (cada proceso tiene el suyo)
+    def analizar(self, codigo_fuente, perfil=None):
+        if perfil is None:
+            perfil = PerfiladorNulo()
+        limites = self._dividir(codigo_fuente)
+        self.fragmentos = self.arbol = None
+        if len(limites) <= 1:
+            return super().analizar(codigo_fuente, perfil)
+
+        global _fuente
+        _fuente = codigo_fuente
+        try:
+            with perfil.fase('analisis', bytes=len(codigo_fuente)) as medicion:
+                fragmentos = self._analizar_fragmentos(limites)
+        finally:
+            _fuente = None
+        if any(fragmento.errores_lexicos or fragmento.reanalizado for fragmento in fragmentos):
+            # Los errores lexicos tienen prioridad sobre todos los
+            # sintacticos; se buscan en el codigo completo
+            return super().analizar(codigo_fuente, perfil)
+
+        resultado = ResultadoCompilacion()
+        resultado.cantidad_tokens = sum(fragmento.cantidad_tokens for fragmento in fragmentos)
+        medicion.elementos['tokens'] = resultado.cantidad_tokens
+        errores = []
+        for fragmento in fragmentos:
+            errores.extend(fragmento.errores_sintacticos)
+            if limite_alcanzado(errores, self.max_errores):
+                del errores[self.max_errores:]
+                break
+        if errores:
+            resultado.fase = 'errores_sintacticos'
+            resultado.errores = errores
+            return resultado
+
+        with perfil.fase('union', tokens=resultado.cantidad_tokens) as medicion:
+            resultado.ast = self._unir(fragmentos, codigo_fuente)
+        resultado.nodos = len(resultado.ast.arbol)
+        medicion.elementos['nodos'] = resultado.nodos
+        self.fragmentos = fragmentos
+        self.arbol = resultado.ast.arbol
+        return resultado
+
+    # Verificacion semantica: la tabla de simbolos sale de las primeras
+    # asignaciones de cada variable y cada fragmento se verifica en paralelo
+    # con la tabla que tiene al empezar
+    def verificar(self, resultado):
+        fragmentos = self.fragmentos
+        arbol = resultado.ast.arbol
+        if fragmentos is None or arbol is not self.arbol:
+            return super().verificar(resultado)
+
+        checker = Checker()
+        tabla_simbolos = checker.tabla_simbolos
+        tablas = []
+        for fragmento in fragmentos:
+            tablas.append(dict(tabla_simbolos))
+            for indice, nombre in fragmento.definiciones:
+                if tabla_simbolos.get(nombre, 'unknown') == 'unknown':
+                    checker.verificar(arbol.cursor(indice))
+                if tabla_simbolos.get(nombre, 'unknown') == 'unknown':
+                    # La asignacion tiene un error: la tabla depende del
+                    # orden en que se detecten los errores
+                    return super().verificar(resultado)
+        resultado.tabla_simbolos = tabla_simbolos
+
+        global _arbol
+        _arbol = arbol
+        try:
+            with self._ejecutor(len(fragmentos)) as ejecutor:
+                por_fragmento = ejecutor.map(
+                    _verificar_fragmento, [fragmento.sentencias for fragmento in fragmentos], tablas,
+                    [self.max_errores] * len(fragmentos)
+                )
+                errores = []
+                for fragmento, tabla, (errores_fragmento, origenes) in zip(fragmentos, tablas, por_fragmento):
+                    anteriores = len(errores)
+                    errores.extend(errores_fragmento)
+                    if limite_alcanzado(errores, self.max_errores):
+                        # El analisis completo se detiene en la sentencia del
+                        # ultimo error: la tabla no tiene las asignaciones
+                        # posteriores
+                        del errores[self.max_errores:]
+                        detenida = origenes[self.max_errores - anteriores - 1]
+                        checker.tabla_simbolos = resultado.tabla_simbolos = tabla
+                        for indice, _ in fragmento.definiciones:
+                            if indice < detenida:
+                                checker.verificar(arbol.cursor(indice))
+                        break
+        finally:
+            _arbol = None
+        return errores
+
+    # Limites (inicio, fin, linea) de los fragmentos: cada uno empieza al
+    # principio de una linea. Con un solo proceso, sin fork o con poco
+    # codigo hay un unico fragmento
+    def _dividir(self, codigo_fuente):
+        longitud = len(codigo_fuente)
+        cantidad = min(self.trabajos * FRAGMENTOS_POR_PROCESO, longitud // TAMANO_MINIMO_FRAGMENTO)
+        if self.trabajos <= 1 or cantidad <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return [(0, longitud, 1)]
+
+        salto = "\n" if isinstance(codigo_fuente, str) else b"\n"
+        limites = []
+        inicio = 0
+        linea = 1
+        for parte in range(1, cantidad):
+            fin = codigo_fuente.find(salto, max(inicio, longitud * parte // cantidad))
+            if fin == -1:
+                break
+            fin += 1
+            limites.append((inicio, fin, linea))
+            linea += codigo_fuente[inicio:fin].count(salto)
+            inicio = fin
+        limites.append((inicio, longitud, linea))
+        return limites
+
+    # Analiza los fragmentos en paralelo; si un limite no es seguro, une el
+    # fragmento con el siguiente y vuelve a analizar solo el fragmento unido
+    def _analizar_fragmentos(self, limites):
+        fragmentos = [None] * len(limites)
+        with self._ejecutor(len(limites)) as ejecutor:
+            while True:
+                pendientes = [i for i, fragmento in enumerate(fragmentos) if fragmento is None]
+                if not pendientes:
+                    return fragmentos
+                analizados = ejecutor.map(
+                    _analizar_fragmento, *zip(*(limites[i] for i in pendientes)),
+                    [self.max_errores] * len(pendientes)
+                )
+                for i, fragmento in zip(pendientes, analizados):
+                    fragmentos[i] = fragmento
+                if any(fragmento.errores_lexicos or fragmento.reanalizado for fragmento in fragmentos):
+                    return fragmentos
+
+                i = 0
+                while i < len(fragmentos) - 1:
+                    fragmento = fragmentos[i]
+                    if fragmento is not None and not fragmento.limite_seguro:
+                        inicio, _, linea = limites[i]
+                        limites[i] = (inicio, limites[i + 1][1], linea)
+                        fragmentos[i] = None
+                        del limites[i + 1], fragmentos[i + 1]
+                    i += 1
+
+    # Une las arenas de los fragmentos en una sola, con las sentencias de
+    # todos como hijos de un unico Program. Los indices de nodo se corren
+    # y los valores se vuelven a indexar en la tabla de la arena unida (los
+    # nombres de variable, en su tabla de nombres);
+    # despues columnas, sentencias y definiciones de cada fragmento quedan
+    # referidas a la arena unida. Las posiciones ya son del codigo completo
+    def _unir(self, fragmentos, codigo_fuente):
+        arbol = ArbolAST(indice_lineas=IndiceLineas(codigo_fuente))
+        raiz = arbol.raiz = arbol.agregar("Program")
+        indices_valor = arbol.indices_valor
+        tabla_valores = arbol.tabla_valores
+        identificador = arbol.nombres.identificador
+        anterior = SIN_NODO
+        for fragmento in fragmentos:
+            tipos, valores, posiciones, tipos_token, primeros_hijos, siguientes = fragmento.columnas
+            desplazamiento = len(arbol) - 1     # Sin la raiz del fragmento
+            indices = []
+            for valor in fragmento.tabla_valores:
+                indice = indices_valor.get(valor)
+                if indice is None:
+                    indice = indices_valor[valor] = len(tabla_valores)
+                    tabla_valores.append(valor)
+                indices.append(indice)
+            ids = [identificador(nombre) for nombre in fragmento.nombres]
+
+            arbol.tipos.extend(tipos[1:])
+            arbol.valores.extend(array('I', [
+                ids[valor] if tipo in CODIGOS_CON_NOMBRE else indices[valor]
+                for tipo, valor in zip(tipos[1:], valores[1:])
+            ]))
+            arbol.posiciones.extend(posiciones[1:])
+            arbol.tipos_token.extend(tipos_token[1:])
+            for destino, origen in ((arbol.primeros_hijos, primeros_hijos), (arbol.siguientes, siguientes)):
+                destino.extend(array('i', [
+                    hijo + desplazamiento if hijo != SIN_NODO else SIN_NODO for hijo in origen[1:]
+                ]))
+
+            sentencias = [sentencia + desplazamiento for sentencia in fragmento.sentencias]
+            if sentencias:
+                if anterior == SIN_NODO:
+                    arbol.primeros_hijos[raiz] = sentencias[0]
+                else:
+                    arbol.siguientes[anterior] = sentencias[0]
+                anterior = sentencias[-1]
+            fragmento.sentencias = sentencias
+            fragmento.definiciones = [
+                (indice + desplazamiento, nombre) for indice, nombre in fragmento.definiciones
+            ]
+            fragmento.columnas = fragmento.tabla_valores = fragmento.nombres = None
+        if anterior != SIN_NODO:
+            arbol.ultimos_hijos[raiz] = anterior
+        return arbol.cursor(raiz)
+
+    # Procesos para las tareas, creados con fork para que hereden el
+    # codigo fuente o el arbol
+    def _ejecutor(self, tareas):
+        return ProcessPoolExecutor(
+            max_workers=min(self.trabajos, tareas), mp_context=multiprocessing.get_context('fork')
+        )
+
+
+# Analisis lexico y sintactico de un fragmento del codigo fuente heredado,
+# en un proceso trabajador. El lexer empieza en la linea del fragmento y
+# se detiene en su fin
+def _analizar_fragmento(inicio, fin, linea, max_errores):
+    fragmento = FragmentoAnalizado(inicio, fin)
+    lexer = Lexer(_fuente, max_errores)
+    lexer.empezar_en(inicio, linea)
+    tokens = lexer.analizar(fin)
+    fragmento.fin_lexico = lexer.posicion_actual
+    fragmento.errores_lexicos = lexer.errores
+    fragmento.reanalizado = lexer.codigo_fuente is not _fuente
+    fragmento.cantidad_tokens = len(tokens)
+    if lexer.errores or fragmento.reanalizado:
+        return fragmento
+
+    parser = Parser(tokens, max_errores)
+    arbol = parser.arbol
+    raiz = arbol.raiz = arbol.agregar("Program")
+    errores = parser.errores
+    definidas = set()
+    while parser.peek() is not None:
+        cantidad = len(errores)
+        sentencia = parser.parsear_siguiente()
+        if sentencia is not None:
+            fragmento.ultima_fallida = False
+            indice = sentencia.indice
+            arbol.agregar_hijo(raiz, indice)
+            fragmento.sentencias.append(indice)
+            if arbol.tipos[indice] == T_ASSIGN:
+                nombre = arbol.valor(indice)
+                if nombre not in definidas:
+                    definidas.add(nombre)
+                    fragmento.definiciones.append((indice, nombre))
+        elif len(errores) > cantidad:
+            fragmento.ultima_fallida = parser.pos >= parser.total
+            if limite_alcanzado(errores, max_errores):
+                break
+    fragmento.errores_sintacticos = errores
+    fragmento.columnas = (arbol.tipos, arbol.valores, arbol.posiciones, arbol.tipos_token, arbol.primeros_hijos,
+                          arbol.siguientes)
+    fragmento.tabla_valores = arbol.tabla_valores
+    fragmento.nombres = arbol.nombres.nombres
+    return fragmento
+
+
+# Verificacion semantica de las sentencias de un fragmento del arbol
+# heredado, con la tabla de simbolos que tiene al empezar el fragmento.
+# Devuelve los errores y la sentencia de cada uno
+def _verificar_fragmento(sentencias, tabla_simbolos, max_errores):
+    checker = Checker(max_errores)
+    checker.tabla_simbolos = tabla_simbolos
+    errores = []
+    origenes = []       # Sentencia de cada error
+    for sentencia in sentencias:
+        if max_errores is not None:
+            checker.max_errores = max_errores - len(errores)
+        nuevos = checker.verificar(_arbol.cursor(sentencia))
+        errores.extend(nuevos)
+        origenes.extend([sentencia] * len(nuevos))
+        if limite_alcanzado(errores, max_errores):
+            break
+    return errores, origenes
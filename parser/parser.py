@@ -1,3 +1,40 @@
+from array import array
+from bisect import bisect_right
+
+from lexer.lexer import CODIGOS_TOKEN, TokenBuffer, VistaPosiciones, SIN_POSICION
+from diagnostics.diagnostics import Diagnostico
+from symbols.symbols import TablaNombres
+
+# Codigos de los tipos de token que usa el parser
+T_NEWLINE = CODIGOS_TOKEN["NEWLINE"]
+T_IDENTIFICADOR = CODIGOS_TOKEN["IDENTIFICADOR"]
+T_OPERADOR_ASIGNACION = CODIGOS_TOKEN["OPERADOR_ASIGNACION"]
+T_OPERADOR_MATEMATICO = CODIGOS_TOKEN["OPERADOR_MATEMATICO"]
+T_OPERADOR_COMPARACION = CODIGOS_TOKEN["OPERADOR_COMPARACION"]
+T_DELIMITADOR = CODIGOS_TOKEN["DELIMITADOR"]
+T_LITERAL_INT = CODIGOS_TOKEN["LITERAL_INT"]
+T_LITERAL_FLOAT = CODIGOS_TOKEN["LITERAL_FLOAT"]
+T_LITERAL_STRING = CODIGOS_TOKEN["LITERAL_STRING"]
+T_LITERALES = frozenset((T_LITERAL_INT, T_LITERAL_FLOAT, T_LITERAL_STRING))
+
+# Poder de union (izquierdo, derecho) de cada operador binario. Un operador
+# con poder izquierdo mayor que el derecho del operador pendiente se aplica
+# primero; con derecho menor que izquierdo queda asociativo por la derecha
+PODER_UNION = {
+    "==": (10, 11), "!=": (10, 11), "<": (10, 11), ">": (10, 11), "<=": (10, 11), ">=": (10, 11),
+    "+": (20, 21), "-": (20, 21),
+    "*": (30, 31), "/": (30, 31), "%": (30, 31),
+    "**": (41, 40),
+}
+T_OPERADORES_BINARIOS = (T_OPERADOR_MATEMATICO, T_OPERADOR_COMPARACION)
+
+# El lexema del operador se busca tal como esta en el codigo fuente, que
+# puede ser texto o bytes
+PODER_UNION_LEXEMA = {**PODER_UNION, **{op.encode(): poder for op, poder in PODER_UNION.items()}}
+PARENTESIS_ABRE = ("(", b"(")
+PARENTESIS_CIERRA = (")", b")")
+
+
 # Clase NodoAST
 class NodoAST:
     def __init__(self, tipo, valor=None, linea=None, columna=None):
@@ -20,99 +57,454 @@ class NodoAST:
             hijo.mostrar(nivel + 1)
 
 
+# Tipos de nodo, guardados en la arena por su codigo (indice en la tupla)
+TIPOS_NODO = ("Program", "Assign", "Print", "ExprStmt", "BinaryOp", "Identifier", "Literal")
+CODIGOS_NODO = {tipo: codigo for codigo, tipo in enumerate(TIPOS_NODO)}
+
+# Nodos cuyo valor es un nombre de variable, guardado por su id en la
+# tabla de nombres
+CODIGOS_CON_NOMBRE = frozenset((CODIGOS_NODO["Assign"], CODIGOS_NODO["Identifier"]))
+
+# Indice que marca la ausencia de hijo o de hermano siguiente
+SIN_NODO = -1
+
+# Tipo de token de los nodos que no vienen de un token (la raiz)
+SIN_TOKEN = 255
+
+
+# AST en arena: cada nodo es un indice en arreglos paralelos de tipo, valor,
+# posicion en la fuente, tipo del token de origen, primer hijo y hermano
+# siguiente. La linea y la columna se calculan desde la posicion con el
+# indice de lineas solo cuando se piden (mensajes de error, salida -a).
+# El valor de Identifier y Assign es el id del nombre en la tabla de nombres
+# (que puede ser compartida con otros arboles); el de los demas nodos
+# (literales, operadores) es su indice en tabla_valores, donde cada valor se
+# guarda una sola vez
+class ArbolAST:
+    def __init__(self, nombres=None, indice_lineas=None):
+        self.nombres = nombres if nombres is not None else TablaNombres()
+        self.indice_lineas = indice_lineas  # IndiceLineas de la fuente
+        self.tipos = array('B')
+        self.valores = array('I')
+        self.posiciones = array('I')    # SIN_POSICION si no viene de un token
+        self.lineas_fijas = None        # Lineas y columnas ya calculadas
+        self.columnas_fijas = None
+        self.tipos_token = array('B')   # clasificacion del lexer
+        self.primeros_hijos = array('i')
+        self.siguientes = array('i')
+        self.tabla_valores = [None]
+        self.indices_valor = {None: 0}
+        self.ultimos_hijos = {}
+        self.raiz = None
+
+        # Texto C++ de los subarboles que el optimizador reemplaza por una
+        # constante, por indice de nodo
+        self.constantes = {}
+
+    def __len__(self):
+        return len(self.tipos)
+
+    # Agrega un nodo con sus hijos ya creados y devuelve su indice. La
+    # posicion es la del token de origen en la fuente
+    def agregar(self, tipo, valor=None, posicion=SIN_POSICION, hijos=(), tipo_token=SIN_TOKEN):
+        codigo = CODIGOS_NODO[tipo]
+        if codigo in CODIGOS_CON_NOMBRE:
+            return self.agregar_nombre(tipo, self.nombres.identificador(valor), posicion, hijos, tipo_token)
+        indice_valor = self.indices_valor.get(valor)
+        if indice_valor is None:
+            indice_valor = self.indices_valor[valor] = len(self.tabla_valores)
+            self.tabla_valores.append(valor)
+        return self._agregar(codigo, indice_valor, posicion, hijos, tipo_token)
+
+    # Agrega un nodo Identifier o Assign con el id de su nombre, ya
+    # internalizado por el lexer
+    def agregar_nombre(self, tipo, simbolo, posicion=SIN_POSICION, hijos=(), tipo_token=SIN_TOKEN):
+        return self._agregar(CODIGOS_NODO[tipo], simbolo, posicion, hijos, tipo_token)
+
+    def _agregar(self, codigo, valor, posicion, hijos, tipo_token):
+        indice = len(self.tipos)
+        self.tipos.append(codigo)
+        self.valores.append(valor)
+        self.posiciones.append(posicion)
+        self.tipos_token.append(tipo_token)
+        self.primeros_hijos.append(hijos[0] if hijos else SIN_NODO)
+        self.siguientes.append(SIN_NODO)
+        for anterior, hijo in zip(hijos, hijos[1:]):
+            self.siguientes[anterior] = hijo
+        return indice
+
+    # Agrega un hijo al final de los hijos de un nodo ya creado. El ultimo
+    # hijo se recuerda para que agregar muchos hijos al mismo padre (las
+    # sentencias del programa) no recorra la lista cada vez
+    def agregar_hijo(self, padre, hijo):
+        ultimo = self.ultimos_hijos.get(padre)
+        if ultimo is None and self.primeros_hijos[padre] != SIN_NODO:
+            ultimo = self.hijos(padre)[-1]
+        if ultimo is None:
+            self.primeros_hijos[padre] = hijo
+        else:
+            self.siguientes[ultimo] = hijo
+        self.ultimos_hijos[padre] = hijo
+
+    # Quita de los hijos de un nodo los indicados; siguen en la arena pero
+    # ya no forman parte del arbol
+    def quitar_hijos(self, padre, quitar):
+        if not isinstance(self.siguientes, array):
+            # Arena cargada de un archivo: los enlaces son memoryview de
+            # solo lectura sobre el mapeo, se copian antes de modificarlos
+            self.primeros_hijos = array('i', self.primeros_hijos)
+            self.siguientes = array('i', self.siguientes)
+        anterior = SIN_NODO
+        for hijo in self.hijos(padre):
+            if hijo in quitar:
+                continue
+            if anterior == SIN_NODO:
+                self.primeros_hijos[padre] = hijo
+            else:
+                self.siguientes[anterior] = hijo
+            anterior = hijo
+        if anterior == SIN_NODO:
+            self.primeros_hijos[padre] = SIN_NODO
+            self.ultimos_hijos.pop(padre, None)
+        else:
+            self.siguientes[anterior] = SIN_NODO
+            self.ultimos_hijos[padre] = anterior
+
+    # Descarta los nodos creados desde "cantidad" (sentencias con error)
+    def truncar(self, cantidad):
+        for columna in (self.tipos, self.valores, self.posiciones, self.tipos_token, self.primeros_hijos,
+                        self.siguientes):
+            del columna[cantidad:]
+
+    # Linea y columna de cada nodo (0 si no tiene): se calculan al pedirlas
+    # desde la posicion, salvo que ya esten fijas
+    @property
+    def lineas(self):
+        if self.lineas_fijas is not None:
+            return self.lineas_fijas
+        return VistaPosiciones(self.posiciones, self.indice_lineas.linea if self.indice_lineas else _sin_linea)
+
+    @property
+    def columnas(self):
+        if self.columnas_fijas is not None:
+            return self.columnas_fijas
+        return VistaPosiciones(self.posiciones, self.indice_lineas.columna if self.indice_lineas else _sin_linea)
+
+    # Linea y columna del nodo, o (None, None) si no tiene posicion
+    def ubicar(self, indice):
+        if self.lineas_fijas is not None:
+            return self.lineas_fijas[indice] or None, self.columnas_fijas[indice] or None
+        posicion = self.posiciones[indice]
+        if posicion == SIN_POSICION or self.indice_lineas is None:
+            return None, None
+        return self.indice_lineas.ubicar(posicion)
+
+    # Calcula las lineas y columnas de todos los nodos y las deja fijas,
+    # para poder modificarlas (desplazar_lineas)
+    def fijar_lineas(self):
+        if self.lineas_fijas is None:
+            self.lineas_fijas, self.columnas_fijas = self.calcular_lineas()
+
+    # Arreglos con la linea y la columna de cada nodo
+    def calcular_lineas(self):
+        if self.lineas_fijas is not None:
+            return self.lineas_fijas, self.columnas_fijas
+        lineas = array('I')
+        columnas = array('I')
+        for indice in range(len(self.posiciones)):
+            linea, columna = self.ubicar(indice)
+            lineas.append(linea or 0)
+            columnas.append(columna or 0)
+        return lineas, columnas
+
+    def hijos(self, indice):
+        hijos = []
+        hijo = self.primeros_hijos[indice]
+        while hijo != SIN_NODO:
+            hijos.append(hijo)
+            hijo = self.siguientes[hijo]
+        return hijos
+
+    # Indices del subarbol de un nodo, en preorden
+    def subarbol(self, indice):
+        primeros_hijos = self.primeros_hijos
+        siguientes = self.siguientes
+        pendientes = [indice]
+        while pendientes:
+            actual = pendientes.pop()
+            yield actual
+            hijo = primeros_hijos[actual]
+            if hijo != SIN_NODO:
+                hijos = []
+                while hijo != SIN_NODO:
+                    hijos.append(hijo)
+                    hijo = siguientes[hijo]
+                pendientes.extend(reversed(hijos))
+
+    # Suma delta a la linea de todos los nodos del subarbol. Desde entonces
+    # las lineas de la arena quedan fijas
+    def desplazar_lineas(self, indice, delta):
+        self.fijar_lineas()
+        lineas = self.lineas_fijas
+        for actual in self.subarbol(indice):
+            if lineas[actual]:
+                lineas[actual] += delta
+
+    # Valor del nodo: el nombre de la variable o el texto del literal u
+    # operador
+    def valor(self, indice):
+        if self.tipos[indice] in CODIGOS_CON_NOMBRE:
+            return self.nombres.nombres[self.valores[indice]]
+        return self.tabla_valores[self.valores[indice]]
+
+    def cursor(self, indice):
+        return NodoCursor(self, indice)
+
+
+# Acceso de solo lectura a un nodo de la arena con la misma interfaz que
+# NodoAST (tipo, valor, linea, columna, hijos)
+class NodoCursor:
+    __slots__ = ('arbol', 'indice', 'tipo', 'valor')
+
+    def __init__(self, arbol, indice):
+        self.arbol = arbol
+        self.indice = indice
+        self.tipo = TIPOS_NODO[arbol.tipos[indice]]
+        self.valor = arbol.valor(indice)
+
+    @property
+    def linea(self):
+        return self.arbol.ubicar(self.indice)[0]
+
+    @property
+    def columna(self):
+        return self.arbol.ubicar(self.indice)[1]
+
+    # Codigo del tipo de token del que salio el nodo, o None
+    @property
+    def tipo_token(self):
+        tipo_token = self.arbol.tipos_token[self.indice]
+        return None if tipo_token == SIN_TOKEN else tipo_token
+
+    # Valor de un literal numerico segun la clasificacion del lexer; None
+    # para cadenas y nodos que no son literales numericos
+    @property
+    def valor_numerico(self):
+        tipo_token = self.arbol.tipos_token[self.indice]
+        if tipo_token == T_LITERAL_INT:
+            return int(self.valor)
+        if tipo_token == T_LITERAL_FLOAT:
+            return float(self.valor)
+        return None
+
+    # Los cursores de los hijos se crean en cada acceso, sin quedar
+    # guardados en el cursor padre
+    @property
+    def hijos(self):
+        arbol = self.arbol
+        siguientes = arbol.siguientes
+        hijos = []
+        hijo = arbol.primeros_hijos[self.indice]
+        while hijo != SIN_NODO:
+            hijos.append(NodoCursor(arbol, hijo))
+            hijo = siguientes[hijo]
+        return hijos
+
+    # Cantidad de nodos del subarbol; para la raiz es el tamaño de la arena
+    def contar_nodos(self):
+        if self.indice == self.arbol.raiz:
+            return len(self.arbol)
+        return sum(1 for _ in self.arbol.subarbol(self.indice))
+
+    mostrar = NodoAST.mostrar
+
+
+# Resolutor de lineas de una arena sin fuente: ningun nodo tiene linea
+def _sin_linea(posicion):
+    return 0
+
+
 # --- Parser ---
+# Trabaja sobre un TokenBuffer: los tokens se identifican por su indice y el
+# tipo se compara por codigo numerico, sin crear un objeto por token.
+#
+# El lexer no emite saltos de linea, asi que los limites entre sentencias
+# se toman de la fuente: como en Python, fuera de parentesis una expresion
+# termina al final de su linea. Tras una sentencia con error (modo panico)
+# se registra solo su primer error y se saltan los tokens hasta el
+# siguiente inicio de linea, en lugar de reintentar en cada token. Con
+# max_errores el analisis se detiene al llegar a esa cantidad de errores
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, max_errores=None):
+        if not isinstance(tokens, TokenBuffer):
+            tokens = TokenBuffer.desde_tokens(tokens)
         self.tokens = tokens
+        self.tipos = tokens.tipos
+        self.simbolos = tokens.simbolos
+        self.total = len(tokens)
         self.pos = 0
         self.errores = []
+        self.max_errores = max_errores
+        self.en_panico = False
+        self.arbol = ArbolAST(tokens.nombres, tokens.indice_lineas)
+        self.salto = "\n" if isinstance(tokens.fuente, str) else b"\n"
+        self.id_print = tokens.nombres.identificador("print")
+
+    # Sigue el analisis desde el primer token de otro TokenBuffer de la
+    # misma fuente (el analisis en flujo descarta los tokens ya consumidos)
+    def continuar_con(self, tokens):
+        self.tokens = tokens
+        self.tipos = tokens.tipos
+        self.simbolos = tokens.simbolos
+        self.total = len(tokens)
+        self.pos = 0
 
     # Helpers
     def peek(self):
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
+        """Indice del token actual, o None al final de la lista."""
+        if self.pos < self.total:
+            return self.pos
         return None
 
     def advance(self):
         tok = self.peek()
-        if tok:
+        if tok is not None:
             self.pos += 1
         return tok
 
+    def es(self, tok, codigo, valor):
+        """Indica si el token existe y tiene el tipo y el texto dados."""
+        return tok is not None and self.tipos[tok] == codigo and self.tokens.valor(tok) == valor
+
     def expect(self, tipo=None, valor=None):
         """Consume el token si coincide con tipo y/o valor, sino registra error."""
         tok = self.peek()
         if tok is None:
-            self.errores.append("Error sintáctico: fin inesperado de archivo (EOF)")
+            self.error(None, "Error sintáctico: fin inesperado de archivo (EOF)")
             return None
-        if tipo and tok.tipo != tipo:
-            self.errores.append(
-                f"Error sintáctico: se esperaba tipo {tipo}, "
-                f"pero se encontró {tok.tipo} ('{tok.valor}') en línea {tok.linea}"
+        tokens = self.tokens
+        if tipo and self.tipos[tok] != CODIGOS_TOKEN[tipo]:
+            self.error(
+                tok, "Error sintáctico: se esperaba tipo {}, pero se encontró {} ('{}') en línea {}",
+                tipo, tokens.tipo(tok), tokens.valor(tok), tokens.linea(tok)
             )
             return None
-        if valor and tok.valor != valor:
-            self.errores.append(
-                f"Error sintáctico: se esperaba '{valor}', "
-                f"pero se encontró '{tok.valor}' en línea {tok.linea}"
+        if valor and tokens.valor(tok) != valor:
+            self.error(
+                tok, "Error sintáctico: se esperaba '{}', pero se encontró '{}' en línea {}",
+                valor, tokens.valor(tok), tokens.linea(tok)
             )
             return None
         return self.advance()
 
+    # Registra un error en la posicion del token dado (None si no tiene),
+    # salvo que la sentencia ya tenga uno: los siguientes suelen ser
+    # consecuencia del primero. El mensaje se formatea al mostrarlo
+    def error(self, tok, plantilla, *argumentos):
+        if self.en_panico:
+            return
+        self.en_panico = True
+        if tok is None:
+            self.errores.append(Diagnostico('errores_sintacticos', plantilla, argumentos))
+        else:
+            tokens = self.tokens
+            self.errores.append(Diagnostico(
+                'errores_sintacticos', plantilla, argumentos, *tokens.ubicar(tok)
+            ))
+
+    # Indica si el token es el primero de su linea: entre el token anterior
+    # y el hay un salto de linea en la fuente. Si no hay nada entre los dos
+    # no hace falta buscarlo
+    def inicia_linea(self, tok):
+        if tok == 0:
+            return True
+        tokens = self.tokens
+        fin = tokens.fin(tok - 1)
+        inicio = tokens.inicios[tok]
+        return fin != inicio and tokens.fuente.find(self.salto, fin, inicio) != -1
+
+    # Crea un nodo en la arena con la posicion del token dado
+    def nodo(self, tipo, tok, valor=None, hijos=()):
+        return self.arbol.agregar(tipo, valor, self.tokens.inicios[tok], hijos, self.tipos[tok])
+
     # Entrada principal
     def parsear(self):
         """Parsea la lista de tokens y devuelve un nodo raíz tipo 'Program'."""
-        raiz = NodoAST("Program")
+        arbol = self.arbol
+        raiz = arbol.raiz = arbol.agregar("Program")
         while self.peek() is not None:
-            # Saltar saltos de línea
-            if self.peek().tipo == "NEWLINE":
-                self.advance()
-                continue
-            stmt = self.parsear_sentencia()
-            if stmt:
-                raiz.agregar_hijo(stmt)
-            else:
-                # Recuperar para evitar bucle infinito
-                self.advance()
-        return raiz
+            stmt = self._siguiente_sentencia()
+            if stmt is not None:
+                arbol.agregar_hijo(raiz, stmt)
+            elif self.max_errores is not None and len(self.errores) >= self.max_errores:
+                break
+        return arbol.cursor(raiz)
+
+    # Un paso del bucle principal: devuelve la siguiente sentencia o None
+    def parsear_siguiente(self):
+        stmt = self._siguiente_sentencia()
+        return None if stmt is None else self.arbol.cursor(stmt)
+
+    def _siguiente_sentencia(self):
+        # Saltar saltos de línea
+        if self.tipos[self.pos] == T_NEWLINE:
+            self.advance()
+            return None
+        nodos = len(self.arbol)
+        inicio = self.pos
+        self.en_panico = False
+        stmt = self.parsear_sentencia()
+        if stmt is None:
+            # Los nodos de la sentencia fallida no quedan en el arbol
+            self.arbol.truncar(nodos)
+            self.sincronizar(inicio)
+        return stmt
+
+    # Recuperacion en modo panico: continua en el primer token que inicia
+    # una linea, despues de la sentencia fallida y del token del error. El
+    # token que sigue al proximo salto de linea se busca por biseccion
+    def sincronizar(self, inicio):
+        tokens = self.tokens
+        pos = max(self.pos, inicio + 1)
+        while pos < self.total and not self.inicia_linea(pos):
+            salto = tokens.fuente.find(self.salto, tokens.fin(pos - 1))
+            pos = self.total if salto == -1 else bisect_right(tokens.inicios, salto, pos)
+        self.pos = pos
 
     # Detecta qué tipo de sentencia se está leyendo
     def parsear_sentencia(self):
         tok = self.peek()
         if tok is None:
             return None
+        tokens = self.tokens
+        tipo = self.tipos[tok]
 
         # --- print(expr) ---
-        if tok.tipo == "IDENTIFICADOR" and tok.valor == "print":
+        if tipo == T_IDENTIFICADOR and self.simbolos[tok] == self.id_print:
             return self.parsear_print()
 
         # --- asignación: IDENTIFICADOR = EXPRESION ---
-        if tok.tipo == "IDENTIFICADOR":
-            siguiente = self.tokens[self.pos + 1] if self.pos + 1 < len(self.tokens) else None
-            if siguiente and siguiente.tipo == "OPERADOR_ASIGNACION" and siguiente.valor == "=":
+        if tipo == T_IDENTIFICADOR:
+            siguiente = tok + 1 if tok + 1 < self.total else None
+            if self.es(siguiente, T_OPERADOR_ASIGNACION, "=") and not self.inicia_linea(siguiente):
                 return self.parsear_asignacion()
 
             # Expresión suelta
             expr = self.parsear_expresion()
-            nodo_expr_stmt = NodoAST("ExprStmt", linea=tok.linea, columna=tok.columna)
-            if expr:
-                nodo_expr_stmt.agregar_hijo(expr)
-                return nodo_expr_stmt
+            if expr is not None:
+                return self.nodo("ExprStmt", tok, hijos=(expr,))
             else:
-                self.errores.append(f"Error sintáctico cerca de '{tok.valor}' en línea {tok.linea}")
+                self.error(tok, "Error sintáctico cerca de '{}' en línea {}", tokens.valor(tok), tokens.linea(tok))
                 return None
 
         # --- otros casos: literales o expresiones entre paréntesis ---
-        if tok.tipo in ("LITERAL_INT", "LITERAL_FLOAT", "LITERAL_STRING") or \
-           (tok.tipo == "DELIMITADOR" and tok.valor == "("):
+        if tipo in T_LITERALES or self.es(tok, T_DELIMITADOR, "("):
             expr = self.parsear_expresion()
-            nodo_expr_stmt = NodoAST("ExprStmt", linea=tok.linea, columna=tok.columna)
-            if expr:
-                nodo_expr_stmt.agregar_hijo(expr)
-                return nodo_expr_stmt
+            if expr is not None:
+                return self.nodo("ExprStmt", tok, hijos=(expr,))
             return None
 
-        self.errores.append(f"Error sintáctico: inicio de sentencia inválido '{tok.valor}' en línea {tok.linea}")
+        self.error(tok, "Error sintáctico: inicio de sentencia inválido '{}' en línea {}", tokens.valor(tok), tokens.linea(tok))
         return None
 
     # --- print(expr) ---
@@ -121,24 +513,22 @@ class Parser:
         if tok_print is None:
             return None
 
-        if not (self.peek() and self.peek().tipo == "DELIMITADOR" and self.peek().valor == "("):
-            self.errores.append(f"Error sintáctico: se esperaba '(' después de 'print' en línea {tok_print.linea}")
+        if not self.es(self.peek(), T_DELIMITADOR, "("):
+            self.error(tok_print, "Error sintáctico: se esperaba '(' después de 'print' en línea {}", self.tokens.linea(tok_print))
             return None
         self.advance()  # consumir '('
 
         expr = self.parsear_expresion()
         if expr is None:
-            self.errores.append(f"Error sintáctico: expresión inválida dentro de print en línea {tok_print.linea}")
+            self.error(tok_print, "Error sintáctico: expresión inválida dentro de print en línea {}", self.tokens.linea(tok_print))
             return None
 
-        if not (self.peek() and self.peek().tipo == "DELIMITADOR" and self.peek().valor == ")"):
-            self.errores.append(f"Error sintáctico: se esperaba ')' después de print en línea {tok_print.linea}")
+        if not self.es(self.peek(), T_DELIMITADOR, ")"):
+            self.error(tok_print, "Error sintáctico: se esperaba ')' después de print en línea {}", self.tokens.linea(tok_print))
             return None
         self.advance()  # consumir ')'
 
-        nodo = NodoAST("Print", linea=tok_print.linea, columna=tok_print.columna)
-        nodo.agregar_hijo(expr)
-        return nodo
+        return self.nodo("Print", tok_print, hijos=(expr,))
 
     # --- asignaciones ---
     def parsear_asignacion(self):
@@ -148,77 +538,118 @@ class Parser:
         eq_tok = self.expect("OPERADOR_ASIGNACION", "=")
         if eq_tok is None:
             return None
-        expr = self.parsear_expresion()
+        # La expresion empieza en la misma linea que el '='
+        expr = None
+        if self.pos < self.total and not self.inicia_linea(self.pos):
+            expr = self.parsear_expresion()
         if expr is None:
-            self.errores.append(f"Error sintáctico: expresión esperada después de '=' en línea {id_tok.linea}")
+            self.error(id_tok, "Error sintáctico: expresión esperada después de '=' en línea {}", self.tokens.linea(id_tok))
             return None
-        nodo = NodoAST("Assign", id_tok.valor, linea=id_tok.linea, columna=id_tok.columna)
-        nodo.agregar_hijo(expr)
-        return nodo
+        return self.arbol.agregar_nombre(
+            "Assign", self.simbolos[id_tok], self.tokens.inicios[id_tok], (expr,), self.tipos[id_tok]
+        )
 
     # --- expresiones ---
+    # Analisis por precedencia con una pila explicita en lugar de recursion,
+    # asi la profundidad de anidamiento solo esta limitada por la memoria.
+    # La pila guarda un marco por operador que espera su operando derecho,
+    # (izquierda, operador, poder derecho), y uno por parentesis abierto,
+    # (None, parentesis, 0). Fuera de parentesis la expresion no sigue en
+    # la linea siguiente: se recuerda el proximo salto de linea de la
+    # fuente y solo se vuelve a buscar cuando un token lo pasa. Para un
+    # identificador la columna de fines tiene su id: el salto se busca
+    # desde su inicio, que da lo mismo porque no contiene saltos de linea
     def parsear_expresion(self):
-        nodo = self.parsear_term()
-        if nodo is None:
-            return None
-        while True:
-            tok = self.peek()
-            if tok and tok.tipo == "OPERADOR_MATEMATICO" and tok.valor in ("+", "-"):
-                op = self.advance()
-                derecha = self.parsear_term()
-                if derecha is None:
-                    self.errores.append(f"Error sintáctico: operando derecho esperado para '{op.valor}' en línea {op.linea}")
-                    return None
-                nodo_bin = NodoAST("BinaryOp", op.valor, linea=op.linea, columna=op.columna)
-                nodo_bin.agregar_hijo(nodo)
-                nodo_bin.agregar_hijo(derecha)
-                nodo = nodo_bin
-            else:
-                break
-        return nodo
+        tokens = self.tokens
+        tipos = self.tipos
+        valor = tokens.valor
+        fuente = tokens.fuente
+        inicios = tokens.inicios
+        fines = tokens.fines
+        poder_union = PODER_UNION_LEXEMA
+        agregar = self.arbol.agregar
+        agregar_nombre = self.arbol.agregar_nombre
+        simbolos = self.simbolos
+        buscar_salto = fuente.find
+        salto = self.salto
+        total = self.total
+        pos = self.pos
+        pila = []
+        abiertos = 0    # Parentesis abiertos en la pila
+        proximo_salto = -1
 
-    def parsear_term(self):
-        nodo = self.parsear_factor()
-        if nodo is None:
-            return None
         while True:
-            tok = self.peek()
-            if tok and tok.tipo == "OPERADOR_MATEMATICO" and tok.valor in ("*", "/", "%"):
-                op = self.advance()
-                derecha = self.parsear_factor()
-                if derecha is None:
-                    self.errores.append(f"Error sintáctico: operando derecho esperado para '{op.valor}' en línea {op.linea}")
-                    return None
-                nodo_bin = NodoAST("BinaryOp", op.valor, linea=op.linea, columna=op.columna)
-                nodo_bin.agregar_hijo(nodo)
-                nodo_bin.agregar_hijo(derecha)
-                nodo = nodo_bin
+            # Operando: literal, identificador o parentesis que abre
+            if pos >= total:
+                self.pos = pos
+                return self._abandonar_expresion(pila)
+            if pila and not abiertos:
+                # El token anterior es el operador del marco de la pila
+                if proximo_salto < fines[pos - 1]:
+                    proximo_salto = buscar_salto(salto, fines[pos - 1])
+                    if proximo_salto == -1:
+                        proximo_salto = len(fuente)
+                if proximo_salto < inicios[pos]:
+                    self.pos = pos
+                    return self._abandonar_expresion(pila)
+            tipo = tipos[pos]
+            if tipo in T_LITERALES:
+                nodo = agregar("Literal", valor(pos), inicios[pos], (), tipo)
+            elif tipo == T_IDENTIFICADOR:
+                nodo = agregar_nombre("Identifier", simbolos[pos], inicios[pos], (), tipo)
+            elif tipo == T_DELIMITADOR and fuente[inicios[pos]:fines[pos]] in PARENTESIS_ABRE:
+                pila.append((None, pos, 0))
+                abiertos += 1
+                pos += 1
+                continue
             else:
-                break
-        return nodo
+                self.pos = pos
+                self.error(pos, "Error sintáctico: token inesperado '{}' tipo {} en línea {}", valor(pos), tokens.tipo(pos), tokens.linea(pos))
+                return self._abandonar_expresion(pila)
+            pos += 1
 
-    def parsear_factor(self):
-        tok = self.peek()
-        if tok is None:
-            return None
-        if tok.tipo in ("LITERAL_INT", "LITERAL_FLOAT", "LITERAL_STRING"):
-            self.advance()
-            return NodoAST("Literal", tok.valor, linea=tok.linea, columna=tok.columna)
-        if tok.tipo == "IDENTIFICADOR":
-            self.advance()
-            return NodoAST("Identifier", tok.valor, linea=tok.linea, columna=tok.columna)
-        if tok.tipo == "DELIMITADOR" and tok.valor == "(":
-            self.advance()
-            expr = self.parsear_expresion()
-            if expr is None:
-                self.errores.append(f"Error sintáctico: expresión esperada después de '(' en línea {tok.linea}")
-                return None
-            if not (self.peek() and self.peek().tipo == "DELIMITADOR" and self.peek().valor == ")"):
-                self.errores.append(f"Error sintáctico: se esperaba ')' en línea {tok.linea}")
-                return None
-            self.advance()
-            return expr
-        self.errores.append(f"Error sintáctico: token inesperado '{tok.valor}' tipo {tok.tipo} en línea {tok.linea}")
+            # Operador: se aplican los pendientes que unen mas fuerte que el
+            # siguiente operador y se cierran los parentesis
+            while True:
+                poder = None
+                if pos < total and tipos[pos] in T_OPERADORES_BINARIOS:
+                    anterior = inicios[pos - 1] if tipos[pos - 1] == T_IDENTIFICADOR else fines[pos - 1]
+                    if not abiertos and proximo_salto < anterior:
+                        proximo_salto = buscar_salto(salto, anterior)
+                        if proximo_salto == -1:
+                            proximo_salto = len(fuente)
+                    if abiertos or proximo_salto >= inicios[pos]:
+                        poder = poder_union.get(fuente[inicios[pos]:fines[pos]])
+                if poder is not None and poder[0] >= (pila[-1][2] if pila else 0):
+                    pila.append((nodo, pos, poder[1]))
+                    pos += 1
+                    break
+
+                if not pila:
+                    self.pos = pos
+                    return nodo
+                izquierda, op, _ = pila.pop()
+                if izquierda is not None:
+                    nodo = agregar("BinaryOp", valor(op), inicios[op], (izquierda, nodo), tipos[op])
+                elif pos < total and tipos[pos] == T_DELIMITADOR and fuente[inicios[pos]:fines[pos]] in PARENTESIS_CIERRA:
+                    abiertos -= 1
+                    pos += 1
+                else:
+                    self.pos = pos
+                    self.error(op, "Error sintáctico: se esperaba ')' en línea {}", tokens.linea(op))
+                    return self._abandonar_expresion(pila)
+
+    # Abandona la expresion tras un error. Si todavia no se registro
+    # ninguno, el error es el del marco mas interno de la pila: un operador
+    # sin operando derecho o un parentesis sin expresion
+    def _abandonar_expresion(self, pila):
+        if pila:
+            tokens = self.tokens
+            izquierda, tok, _ = pila[-1]
+            if izquierda is not None:
+                self.error(tok, "Error sintáctico: operando derecho esperado para '{}' en línea {}", tokens.valor(tok), tokens.linea(tok))
+            else:
+                self.error(tok, "Error sintáctico: expresión esperada después de '(' en línea {}", tokens.linea(tok))
         return None
 
     def detectar_errores(self):
@@ -0,0 +1,169 @@
+from lexer.lexer import Lexer
+from parser.parser import Parser
+from checker.checker import Checker
+from optimizer.optimizer import Optimizador, EliminadorAsignaciones
+from codegen.generator import CodeGenerator
+from profiling.profiling import PerfiladorNulo
+from diagnostics.diagnostics import diagnosticos
+
+
+# Resultado de compilar un codigo fuente. Conserva el TokenBuffer y el AST
+# (que se leen bajo demanda, sin crear un objeto por token o por nodo hasta
+# que se recorren), la tabla de simbolos, el C++ generado y, si alguna fase
+# fallo, su nombre y sus errores
+class ResultadoCompilacion:
+    __slots__ = ('tokens', 'ast', 'tabla_simbolos', 'cpp', 'fase', 'errores', 'plegados', 'sentencias',
+                 'eliminadas', 'variables_eliminadas', 'bytes_eliminados', 'cantidad_tokens', 'nodos')
+
+    def __init__(self):
+        self.tokens = None          # TokenBuffer
+        self.ast = None             # NodoCursor de la raiz (Program)
+        self.tabla_simbolos = {}
+        self.cpp = None             # Codigo C++, si no hubo errores
+        self.fase = None            # 'errores_lexicos', 'errores_sintacticos' o 'errores_semanticos'
+        self.errores = []
+        self.plegados = 0           # Expresiones reemplazadas por constantes (-O1)
+        # Con -O2: sentencias del programa, asignaciones muertas eliminadas
+        # (None sin -O2), variables que ya no se declaran y bytes de C++ que
+        # ocupaba lo eliminado
+        self.sentencias = 0
+        self.eliminadas = None
+        self.variables_eliminadas = 0
+        self.bytes_eliminados = 0
+        self.cantidad_tokens = 0
+        self.nodos = 0
+
+    @property
+    def exito(self):
+        return self.fase is None and self.cpp is not None
+
+    @property
+    def variables(self):
+        return len(self.tabla_simbolos) if self.exito else 0
+
+    @property
+    def diagnosticos(self):
+        return diagnosticos(self.fase, self.errores)
+
+
+# Compilador reutilizable y sin salida por consola: no imprime nada ni lee
+# o escribe archivos. Se crea una vez y compila muchos codigos fuente (str,
+# o bytes / mmap en UTF-8); los patrones del lexer se compilan una sola
+# vez al importar el modulo y el checker se reutiliza entre compilaciones.
+# No es seguro usar la misma instancia desde varios hilos a la vez.
+#
+#   compilador = Compilador(nivel_optimizacion=1)
+#   resultado = compilador.compilar("x = 1\nprint(x)\n")
+#   resultado.cpp, resultado.diagnosticos
+#
+# compilar() equivale a analizar() (fases lexica y sintactica) seguido de
+# completar() (semantica, optimizacion y generacion); por separado se
+# puede inspeccionar o guardar el AST antes de que lo modifique el
+# optimizador. Cada fase se mide con el perfilador que se indique. Con
+# max_errores cada fase se detiene al llegar a esa cantidad de errores
+class Compilador:
+    def __init__(self, nivel_optimizacion=1, max_errores=None):
+        self.nivel_optimizacion = nivel_optimizacion
+        self.max_errores = max_errores
+        self.checker = Checker(max_errores)
+
+    # Todas las fases sobre el codigo fuente
+    def compilar(self, codigo_fuente, perfil=None):
+        resultado = self.analizar(codigo_fuente, perfil)
+        if resultado.fase is None:
+            self.completar(resultado, perfil)
+        return resultado
+
+    # Analisis lexico y sintactico. Si el lexico tiene errores no se parsea
+    def analizar(self, codigo_fuente, perfil=None):
+        if perfil is None:
+            perfil = PerfiladorNulo()
+        resultado = ResultadoCompilacion()
+
+        lexer = Lexer(codigo_fuente, self.max_errores)
+        with perfil.fase('lexico') as medicion:
+            tokens = lexer.analizar()
+        medicion.elementos['tokens'] = len(tokens)
+        resultado.tokens = tokens
+        resultado.cantidad_tokens = len(tokens)
+        if lexer.errores:
+            resultado.fase = 'errores_lexicos'
+            resultado.errores = lexer.errores
+            return resultado
+
+        parser = Parser(tokens, self.max_errores)
+        with perfil.fase('sintactico', tokens=len(tokens)) as medicion:
+            ast = parser.parsear()
+        resultado.ast = ast
+        if parser.errores:
+            resultado.fase = 'errores_sintacticos'
+            resultado.errores = parser.errores
+            return resultado
+        resultado.nodos = ast.contar_nodos()
+        medicion.elementos['nodos'] = resultado.nodos
+        return resultado
+
+    # Analisis semantico, optimizacion (-O1 y -O2) y generacion de codigo sobre
+    # el AST de un resultado de analizar(). Solo con -O2 las temporales de
+    # subexpresiones comunes abarcan todo el programa
+    def completar(self, resultado, perfil=None):
+        if perfil is None:
+            perfil = PerfiladorNulo()
+        ast = resultado.ast
+        nodos = resultado.nodos
+
+        with perfil.fase('semantico', nodos=nodos):
+            errores_semanticos = self.verificar(resultado)
+        if errores_semanticos:
+            resultado.fase = 'errores_semanticos'
+            resultado.errores = errores_semanticos
+            return resultado
+
+        tabla_simbolos = resultado.tabla_simbolos
+        if self.nivel_optimizacion > 0:
+            with perfil.fase('optimizacion', nodos=nodos):
+                resultado.plegados = Optimizador(tabla_simbolos).optimizar(ast)
+                if self.nivel_optimizacion > 1:
+                    eliminador = EliminadorAsignaciones()
+                    eliminadas = eliminador.eliminar(ast)
+                    tabla_simbolos = {
+                        nombre: tipo for nombre, tipo in tabla_simbolos.items() if nombre in eliminador.variables
+                    }
+                    self._contar_eliminados(resultado, eliminadas, tabla_simbolos)
+
+        with perfil.fase('generacion', nodos=nodos):
+            resultado.cpp = CodeGenerator(ast, tabla_simbolos, self.nivel_optimizacion > 1).generar_codigo()
+        return resultado
+
+    # Estadisticas de -O2: asignaciones y declaraciones eliminadas y los
+    # bytes de C++ que ocupaban (cada asignacion generada por separado)
+    @staticmethod
+    def _contar_eliminados(resultado, eliminadas, declaradas):
+        resultado.sentencias = len(resultado.ast.hijos) + len(eliminadas)
+        generador = CodeGenerator(None, resultado.tabla_simbolos)
+        sin_declarar = {nombre: tipo for nombre, tipo in resultado.tabla_simbolos.items() if nombre not in declaradas}
+        lineas = [generador.convertir_sentencia(nodo) for nodo in eliminadas]
+        lineas.extend(CodeGenerator(None, sin_declarar).declarar_variables())
+        resultado.eliminadas = len(eliminadas)
+        resultado.variables_eliminadas = len(sin_declarar)
+        resultado.bytes_eliminados = sum(len(linea.encode('utf-8')) + 1 for linea in lineas)
+
+    # Analisis semantico del AST del resultado: deja la tabla de simbolos en
+    # el resultado y devuelve los errores
+    def verificar(self, resultado):
+        checker = self.checker
+        checker.tabla_simbolos = {}
+        errores = checker.verificar(resultado.ast)
+        resultado.tabla_simbolos = checker.tabla_simbolos
+        checker.arbol = None
+        return errores
+
+    # Fases semantica a generacion sobre un AST ya construido, por ejemplo
+    # cargado de un archivo serializado
+    def compilar_ast(self, ast, tokens=None, perfil=None):
+        resultado = ResultadoCompilacion()
+        resultado.tokens = tokens
+        resultado.cantidad_tokens = len(tokens) if tokens is not None else 0
+        resultado.ast = ast
+        resultado.nodos = ast.contar_nodos()
+        return self.completar(resultado, perfil)
@@ -0,0 +1,217 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# Version del formato del reporte JSON
+FORMATO_REPORTE = 1
+
+# Funciones que se muestran del reporte de cProfile, ordenadas por tiempo
+# acumulado
+FUNCIONES_CPROFILE = 20
+
+
+# Medicion de una fase: tiempo real y de CPU, memoria y cantidad de
+# elementos procesados para calcular el rendimiento
+class MedicionFase:
+    __slots__ = ('nombre', 'segundos', 'segundos_cpu', 'memoria_pico', 'memoria_retenida', 'elementos')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.segundos = 0.0
+        self.segundos_cpu = 0.0
+        self.memoria_pico = None     # Bytes maximos reservados durante la fase
+        self.memoria_retenida = None # Bytes que siguen reservados al terminar
+        self.elementos = {}          # Unidad ('tokens', 'nodos', 'bytes') -> cantidad
+
+    # Elementos por segundo de cada unidad
+    def rendimiento(self):
+        if self.segundos <= 0:
+            return {}
+        return {unidad: cantidad / self.segundos for unidad, cantidad in self.elementos.items()}
+
+    # Diccionario para el reporte JSON
+    def a_diccionario(self):
+        return {
+            'fase': self.nombre,
+            'segundos': self.segundos,
+            'segundos_cpu': self.segundos_cpu,
+            'memoria_pico': self.memoria_pico,
+            'memoria_retenida': self.memoria_retenida,
+            'elementos': dict(self.elementos),
+            'por_segundo': self.rendimiento(),
+        }
+
+
+# Contexto que mide una fase; al salir guarda la medicion en el perfilador
+class _Fase:
+    __slots__ = ('perfilador', 'medicion', 'inicio', 'inicio_cpu', 'memoria_inicial')
+
+    def __init__(self, perfilador, medicion):
+        self.perfilador = perfilador
+        self.medicion = medicion
+
+    def __enter__(self):
+        # El pico se reinicia para que cada fase mida solo lo que ella reserva
+        if self.perfilador.medir_memoria:
+            tracemalloc.reset_peak()
+            self.memoria_inicial = tracemalloc.get_traced_memory()[0]
+        self.inicio_cpu = time.process_time()
+        self.inicio = time.perf_counter()
+        return self.medicion
+
+    def __exit__(self, *excepcion):
+        segundos = time.perf_counter() - self.inicio
+        segundos_cpu = time.process_time() - self.inicio_cpu
+        medicion = self.medicion
+        medicion.segundos = segundos
+        medicion.segundos_cpu = segundos_cpu
+        if self.perfilador.medir_memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            medicion.memoria_pico = pico - self.memoria_inicial
+            medicion.memoria_retenida = actual - self.memoria_inicial
+        self.perfilador.fases.append(medicion)
+        return False
+
+
+# Mide el tiempo y la memoria de cada fase de una compilacion. Se activa
+# con --profile; sin esa opcion se usa un PerfiladorNulo, cuyas fases no
+# hacen nada. La memoria se mide con tracemalloc, que hace todo el
+# programa varias veces mas lento: con medir_memoria=False los tiempos son
+# los reales. Con usar_cprofile ademas se registra cProfile durante toda
+# la compilacion para encontrar las funciones mas costosas
+class Perfilador:
+    def __init__(self, medir_memoria=True, usar_cprofile=False):
+        self.fases = []
+        self.medir_memoria = medir_memoria
+        self.perfil_cprofile = cProfile.Profile() if usar_cprofile else None
+        self.segundos = 0.0
+        self._inicio = None
+
+    def __bool__(self):
+        return True
+
+    # Empieza a registrar la memoria (y cProfile, si se pidio)
+    def iniciar(self):
+        if self.medir_memoria:
+            tracemalloc.start()
+        self._inicio = time.perf_counter()
+        if self.perfil_cprofile is not None:
+            self.perfil_cprofile.enable()
+
+    # Deja de registrar; las fases medidas quedan para el reporte
+    def terminar(self):
+        if self.perfil_cprofile is not None:
+            self.perfil_cprofile.disable()
+        self.segundos = time.perf_counter() - self._inicio
+        if self.medir_memoria:
+            tracemalloc.stop()
+
+    # Contexto que mide una fase. "elementos" son las cantidades procesadas
+    # por unidad; tambien se pueden cargar dentro del bloque sobre la
+    # medicion que devuelve, cuando se conocen al terminar la fase
+    def fase(self, nombre, **elementos):
+        medicion = MedicionFase(nombre)
+        medicion.elementos.update(elementos)
+        return _Fase(self, medicion)
+
+    # Reporte completo como diccionario
+    def reporte(self, archivo=None):
+        return {
+            'formato': FORMATO_REPORTE,
+            'archivo': archivo,
+            'segundos_total': self.segundos,
+            'memoria_medida': self.medir_memoria,
+            'cprofile': self.perfil_cprofile is not None,
+            'fases': [medicion.a_diccionario() for medicion in self.fases],
+        }
+
+    # Muestra una tabla con el tiempo, la memoria y el rendimiento por fase
+    def mostrar(self):
+        print("\n--- PERFIL DE LA COMPILACION ---")
+        print(f"{'Fase':<14}{'Tiempo':>11}{'CPU':>11}{'Mem. pico':>12}{'Retenida':>12}  Rendimiento")
+        medido = 0.0
+        for medicion in self.fases:
+            medido += medicion.segundos
+            rendimiento = ", ".join(
+                f"{formatear_cantidad(cantidad)} {unidad}/s"
+                for unidad, cantidad in medicion.rendimiento().items()
+            )
+            print(f"{medicion.nombre:<14}{formatear_tiempo(medicion.segundos):>11}"
+                  f"{formatear_tiempo(medicion.segundos_cpu):>11}"
+                  f"{formatear_bytes(medicion.memoria_pico):>12}{formatear_bytes(medicion.memoria_retenida):>12}"
+                  f"  {rendimiento}")
+        print(f"{'Total':<14}{formatear_tiempo(self.segundos):>11}"
+              f"   (fuera de las fases: {formatear_tiempo(max(0.0, self.segundos - medido))})")
+        if self.medir_memoria:
+            print("Los tiempos incluyen el costo de tracemalloc; use --profile=tiempo para medir solo el tiempo")
+
+        if self.perfil_cprofile is not None:
+            salida = io.StringIO()
+            estadisticas = pstats.Stats(self.perfil_cprofile, stream=salida)
+            estadisticas.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(FUNCIONES_CPROFILE)
+            print(f"\n--- FUNCIONES MAS COSTOSAS (cProfile, {FUNCIONES_CPROFILE} primeras) ---")
+            print(salida.getvalue().strip())
+
+    # Escribe el reporte JSON
+    def guardar_json(self, ruta, archivo=None):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.reporte(archivo), f, indent=2)
+            f.write("\n")
+
+    # Escribe las estadisticas de cProfile, para abrirlas con pstats
+    def guardar_pstats(self, ruta):
+        self.perfil_cprofile.dump_stats(ruta)
+
+
+# Perfilador que no mide nada: es el que se usa sin --profile, para que las
+# fases no paguen mas que una llamada
+class PerfiladorNulo:
+    fases = ()
+    perfil_cprofile = None
+
+    def __bool__(self):
+        return False
+
+    def fase(self, nombre, **elementos):
+        return _FASE_NULA
+
+
+# Unico contexto de las fases del perfilador nulo; la medicion que entrega
+# acepta que se le carguen elementos sin guardarlos
+class _MedicionNula:
+    __slots__ = ()
+
+    @property
+    def elementos(self):
+        return {}
+
+
+_FASE_NULA = nullcontext(_MedicionNula())
+
+
+def formatear_tiempo(segundos):
+    if segundos >= 1:
+        return f"{segundos:.2f} s"
+    return f"{segundos * 1000:.1f} ms"
+
+
+def formatear_bytes(cantidad):
+    if cantidad is None:
+        return "-"
+    for unidad in ("B", "KB", "MB"):
+        if abs(cantidad) < 1024:
+            return f"{cantidad:.0f} {unidad}" if unidad == "B" else f"{cantidad:.1f} {unidad}"
+        cantidad /= 1024
+    return f"{cantidad:.1f} GB"
+
+
+def formatear_cantidad(cantidad):
+    if cantidad >= 1e6:
+        return f"{cantidad / 1e6:.2f} M"
+    if cantidad >= 1e3:
+        return f"{cantidad / 1e3:.1f} k"
+    return f"{cantidad:.0f}"
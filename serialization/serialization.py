@@ -0,0 +1,310 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from lexer.lexer import CODIGOS_TOKEN, TIPOS_TOKEN, TokenBuffer, IndiceLineas
+from parser.parser import ArbolAST, TIPOS_NODO
+from symbols.symbols import TablaNombres
+
+# Formato binario de tokens y AST. El archivo empieza con una cabecera y un
+# directorio de secciones; cada seccion es una columna de ancho fijo (la
+# misma representacion en arreglos paralelos del TokenBuffer y del
+# ArbolAST) o un bloque de bytes, alineada a 8 bytes. Al cargar, las
+# columnas son memoryview sobre el archivo mapeado: no se copian ni se
+# crea ningun objeto por nodo. Los nombres de variable se guardan aparte,
+# en el orden de sus ids, y se cargan completos; los tokens y el AST
+# comparten esa tabla (los identificadores de los tokens guardan su id en
+# la columna de fines, como en el TokenBuffer). Los tokens no guardan su
+# linea y columna (salen del codigo fuente guardado, como al compilar); el
+# AST si, porque no lleva el codigo fuente
+MAGIA = b"PYCPPBIN"
+VERSION_FORMATO = 4
+
+# magia, version, orden de bytes (0 little, 1 big), cantidad de secciones
+CABECERA = struct.Struct("<8sIII")
+# nombre, tipo de elemento del arreglo ('B', 'I', 'i'; 'b' para bytes),
+# desplazamiento y tamaño en bytes
+ENTRADA = struct.Struct("<8sc7xQQ")
+ALINEACION = 8
+
+# Nombres de los tipos de token y de nodo con los que se escribio el
+# archivo: si cambian, los codigos guardados ya no significan lo mismo
+ESQUEMA = ("\n".join(TIPOS_TOKEN) + "\0" + "\n".join(TIPOS_NODO)).encode("utf-8")
+
+T_IDENTIFICADOR = CODIGOS_TOKEN["IDENTIFICADOR"]
+
+# Columnas de cada parte, con el tipo de sus elementos
+COLUMNAS_TOKENS = (
+    ("t.tipos", "tipos", "B"),
+    ("t.inicio", "inicios", "I"),
+    ("t.fines", "fines", "I"),
+)
+COLUMNAS_AST = (
+    ("a.tipos", "tipos", "B"),
+    ("a.valor", "valores", "I"),
+    ("a.lineas", "lineas_fijas", "I"),
+    ("a.column", "columnas_fijas", "I"),
+    ("a.token", "tipos_token", "B"),
+    ("a.hijo", "primeros_hijos", "i"),
+    ("a.sigue", "siguientes", "i"),
+)
+
+
+# Tabla de cadenas de un AST cargado: los textos estan una sola vez en un
+# bloque UTF-8 y se decodifican la primera vez que se piden. La entrada 0
+# es None, como en ArbolAST.tabla_valores
+class TablaCadenas:
+    __slots__ = ('datos', 'limites', 'cadenas')
+
+    def __init__(self, datos, limites):
+        self.datos = datos          # memoryview del bloque de textos
+        self.limites = limites      # limites[i]:limites[i + 1] es el texto i
+        self.cadenas = [None] * (len(limites) - 1)
+
+    def __len__(self):
+        return len(self.cadenas)
+
+    def __getitem__(self, indice):
+        cadena = self.cadenas[indice]
+        if cadena is None and indice:
+            cadena = self.cadenas[indice] = str(self.datos[self.limites[indice]:self.limites[indice + 1]], "utf-8")
+        return cadena
+
+
+# Resultado de cargar un archivo: los tokens y la raiz del AST que tenga
+class ArchivoSerializado:
+    def __init__(self, tokens, ast, fuente):
+        self.tokens = tokens    # TokenBuffer, o None
+        self.ast = ast          # NodoCursor de la raiz (Program), o None
+        self.fuente = fuente    # mmap o bytes sobre el que se apoyan
+
+    # Libera el mapeo del archivo; los tokens y el AST dejan de ser validos
+    def cerrar(self):
+        self.tokens = self.ast = None
+        if isinstance(self.fuente, mmap.mmap):
+            self.fuente.close()
+
+
+# --- Escritura ---
+
+# Bytes del archivo con los tokens y/o el AST (la raiz de un parseo, que
+# puede ser el cursor o el ArbolAST)
+def serializar(tokens=None, ast=None):
+    secciones = [("esquema", "b", ESQUEMA)]
+
+    if tokens is not None:
+        nombres = tokens.nombres
+        fuente, inicios, fines = _fuente_utf8(tokens)
+        columnas = {
+            "tipos": tokens.tipos,
+            "inicios": inicios,
+            "fines": fines,
+        }
+        secciones.append(("t.fuente", "b", fuente))
+        for nombre, atributo, tipo in COLUMNAS_TOKENS:
+            secciones.append((nombre, tipo, _como_arreglo(columnas[atributo], tipo)))
+
+    if ast is not None:
+        arbol = getattr(ast, "arbol", ast)
+        # Las lineas y columnas se guardan ya calculadas
+        fijas = dict(zip(("lineas_fijas", "columnas_fijas"), arbol.calcular_lineas()))
+        for nombre, atributo, tipo in COLUMNAS_AST:
+            columna = fijas[atributo] if atributo in fijas else getattr(arbol, atributo)
+            secciones.append((nombre, tipo, _como_arreglo(columna, tipo)))
+        secciones.append(("a.raiz", "i", array("i", [arbol.raiz])))
+        limites, textos = _bloque_textos(arbol.tabla_valores[i] for i in range(1, len(arbol.tabla_valores)))
+        secciones.append(("a.limite", "I", limites))
+        secciones.append(("a.textos", "b", textos))
+        if tokens is not None and arbol.nombres is not nombres:
+            raise ValueError("Los tokens y el AST no comparten la tabla de nombres")
+        nombres = arbol.nombres
+
+    if tokens is not None or ast is not None:
+        limites, textos = _bloque_textos(nombres.nombres)
+        secciones.append(("n.limite", "I", limites))
+        secciones.append(("n.nombre", "b", textos))
+
+    posiciones = _posiciones(secciones)
+    if tokens is not None:
+        # Los limites de los tokens se guardan absolutos dentro del archivo,
+        # para que al cargar el codigo fuente sea el archivo mismo; el id de
+        # un identificador no se desplaza
+        base = posiciones["t.fuente"]
+        tipos = tokens.tipos
+        for i, (nombre, tipo, datos) in enumerate(secciones):
+            if nombre == "t.inicio":
+                secciones[i] = (nombre, tipo, array("I", (posicion + base for posicion in datos)))
+            elif nombre == "t.fines":
+                secciones[i] = (nombre, tipo, array("I", (
+                    valor if codigo == T_IDENTIFICADOR else valor + base for codigo, valor in zip(tipos, datos)
+                )))
+    return _armar(secciones, posiciones)
+
+
+# Escribe el archivo con los tokens y/o el AST
+def guardar(ruta, tokens=None, ast=None):
+    datos = serializar(tokens, ast)
+    with open(ruta, "wb") as f:
+        f.write(datos)
+
+
+# Codigo fuente en UTF-8 con los limites de cada token en bytes (el id en
+# lugar del fin para los identificadores). Un TokenBuffer sobre texto
+# guarda posiciones en caracteres; solo hay que convertirlas si el texto no
+# es ASCII
+def _fuente_utf8(tokens):
+    fuente = tokens.fuente
+    if not isinstance(fuente, str):
+        return bytes(fuente), tokens.inicios, tokens.fines
+    if fuente.isascii():
+        return fuente.encode("ascii"), tokens.inicios, tokens.fines
+
+    # Los tokens estan en orden y no se superponen: se avanza una vez por
+    # el texto sumando el tamaño en bytes de cada tramo
+    inicios = array("I")
+    fines = array("I")
+    caracter = byte = 0
+    for indice, inicio in enumerate(tokens.inicios):
+        fin = tokens.fin(indice)
+        byte += len(fuente[caracter:inicio].encode("utf-8"))
+        inicios.append(byte)
+        byte += len(fuente[inicio:fin].encode("utf-8"))
+        fines.append(tokens.fines[indice] if tokens.tipos[indice] == T_IDENTIFICADOR else byte)
+        caracter = fin
+    return fuente.encode("utf-8"), inicios, fines
+
+
+# Limites y bloque UTF-8 de una tabla de cadenas; la entrada 0 queda vacia,
+# como en TablaCadenas
+def _bloque_textos(valores):
+    textos = [b""] + [str(valor).encode("utf-8") for valor in valores]
+    limites = array("I", [0])
+    total = 0
+    for texto in textos:
+        total += len(texto)
+        limites.append(total)
+    return limites, b"".join(textos)
+
+
+def _como_arreglo(columna, tipo):
+    if isinstance(columna, array) and columna.typecode == tipo:
+        return columna
+    return array(tipo, columna)
+
+
+# Posicion de cada seccion en el archivo, despues de la cabecera y el
+# directorio
+def _posiciones(secciones):
+    posiciones = {}
+    posicion = _alinear(CABECERA.size + ENTRADA.size * len(secciones))
+    for nombre, _, datos in secciones:
+        posiciones[nombre] = posicion
+        posicion = _alinear(posicion + _tamano(datos))
+    return posiciones
+
+
+def _armar(secciones, posiciones):
+    orden = 0 if sys.byteorder == "little" else 1
+    partes = [CABECERA.pack(MAGIA, VERSION_FORMATO, orden, len(secciones))]
+    for nombre, tipo, datos in secciones:
+        partes.append(ENTRADA.pack(nombre.encode("ascii"), tipo.encode("ascii"), posiciones[nombre], _tamano(datos)))
+
+    posicion = CABECERA.size + ENTRADA.size * len(secciones)
+    for nombre, _, datos in secciones:
+        partes.append(b"\0" * (posiciones[nombre] - posicion))
+        partes.append(datos.tobytes() if isinstance(datos, array) else datos)
+        posicion = posiciones[nombre] + _tamano(datos)
+    return b"".join(partes)
+
+
+def _tamano(datos):
+    return len(datos) * datos.itemsize if isinstance(datos, array) else len(datos)
+
+
+def _alinear(posicion):
+    return (posicion + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+# --- Lectura ---
+
+# Indica si el archivo empieza con la marca del formato
+def es_serializado(ruta):
+    try:
+        with open(ruta, "rb") as f:
+            return f.read(len(MAGIA)) == MAGIA
+    except OSError:
+        return False
+
+
+# Carga el archivo mapeandolo en memoria
+def cargar(ruta):
+    with open(ruta, "rb") as f:
+        datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return deserializar(datos)
+
+
+# Tokens y AST de los bytes (o mmap) de un archivo. Las columnas se leen
+# directamente de "datos" salvo que el archivo se haya escrito con el otro
+# orden de bytes, en cuyo caso se copian y se invierten
+def deserializar(datos):
+    if len(datos) < CABECERA.size:
+        raise ValueError("Archivo serializado incompleto")
+    magia, version, orden, cantidad = CABECERA.unpack_from(datos, 0)
+    if magia != MAGIA:
+        raise ValueError("El archivo no es un AST serializado")
+    if version != VERSION_FORMATO:
+        raise ValueError(f"Version de formato no soportada: {version} (se esperaba {VERSION_FORMATO})")
+    invertir = orden != (0 if sys.byteorder == "little" else 1)
+
+    vista = memoryview(datos)
+    secciones = {}
+    posiciones = {}
+    for i in range(cantidad):
+        nombre, tipo, posicion, tamano = ENTRADA.unpack_from(datos, CABECERA.size + ENTRADA.size * i)
+        if posicion + tamano > len(datos):
+            raise ValueError("Archivo serializado incompleto")
+        nombre = nombre.rstrip(b"\0").decode("ascii")
+        secciones[nombre] = (tipo.decode("ascii"), vista[posicion:posicion + tamano])
+        posiciones[nombre] = posicion
+
+    def columna(nombre):
+        tipo, bloque = secciones[nombre]
+        if tipo == "b":
+            return bloque
+        if invertir and tipo != "B":
+            arreglo = array(tipo, bloque.tobytes())
+            arreglo.byteswap()
+            return arreglo
+        return bloque.cast(tipo)
+
+    if bytes(columna("esquema")) != ESQUEMA:
+        raise ValueError("El archivo se escribio con otros tipos de token o de nodo")
+
+    nombres = None
+    if "n.nombre" in secciones:
+        tabla = TablaCadenas(columna("n.nombre"), columna("n.limite"))
+        nombres = TablaNombres(tabla[i] for i in range(1, len(tabla)))
+
+    # Las lineas de los tokens se cuentan desde el inicio del codigo fuente
+    # dentro del archivo
+    tokens = None
+    if "t.tipos" in secciones:
+        tokens = TokenBuffer(datos, nombres, IndiceLineas(datos, posiciones["t.fuente"]))
+        for nombre, atributo, _ in COLUMNAS_TOKENS:
+            setattr(tokens, atributo, columna(nombre))
+
+    ast = None
+    # La arena cargada no tiene codigo fuente: sus lineas y columnas quedan
+    # fijas
+    if "a.tipos" in secciones:
+        arbol = ArbolAST()
+        for nombre, atributo, _ in COLUMNAS_AST:
+            setattr(arbol, atributo, columna(nombre))
+        arbol.tabla_valores = TablaCadenas(columna("a.textos"), columna("a.limite"))
+        arbol.indices_valor = None
+        arbol.nombres = nombres
+        arbol.raiz = columna("a.raiz")[0]
+        ast = arbol.cursor(arbol.raiz)
+
+    return ArchivoSerializado(tokens, ast, datos)
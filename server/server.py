@@ -0,0 +1,449 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from batch.batch import buscar_o_compilar, compilar_fuente
+from cache.cache import escribir_si_cambio
+from diagnostics.diagnostics import diagnosticos
+
+try:
+    import resource
+except ImportError:  # Windows: sin limite de memoria por proceso
+    resource = None
+
+# Servidor de compilacion: un proceso que queda residente y recibe pedidos
+# como lineas JSON por la entrada estandar o por un socket Unix. Evita, por
+# cada archivo, el arranque del interprete, la importacion de las fases y
+# la compilacion de los patrones del lexer.
+#
+# Pedido (una linea):
+#   {"id": 1, "archivo": "src/a.py"}                 compila un archivo
+#   {"id": 2, "fuente": "x = 1\n", "nombre": "a.py"} compila codigo en linea
+# con opciones "nivel_optimizacion" (0, 1 o 2), "escribir" (escribir el .cpp;
+# por defecto solo con "archivo") y "cache" (usar la cache; por defecto
+# solo con "archivo" y si el servidor no se inicio con --no-cache). Comandos: {"id": 3, "comando": "estado"} y
+# {"comando": "apagar"}.
+#
+# Respuesta (una linea, con el mismo "id"; pueden llegar en otro orden que
+# los pedidos):
+#   {"id": 1, "exito": true, "fase": null, "diagnosticos": [], "cpp": "...",
+#    "salida": "src/a.cpp", "tokens": 10, "nodos": 7, "variables": 1,
+#    "desde_cache": false, "milisegundos": 1.2}
+# Cada diagnostico es {"fase", "mensaje", "linea", "columna"}.
+
+# Memoria maxima de cada proceso trabajador, en MB. Una compilacion que la
+# supera termina con un error en lugar de agotar la memoria de la maquina
+MEMORIA_MAXIMA_MB = 2048
+
+# Pedidos en curso por trabajador; con mas, se deja de leer hasta que
+# termine alguno, asi la memoria del servidor no crece sin limite
+PEDIDOS_POR_TRABAJADOR = 4
+
+# Segundos entre revisiones del hilo principal en modo stdio, para atender
+# las señales
+INTERVALO_SENALES = 0.5
+
+# Fases de error que agrega el servidor a las del compilador
+FASE_SOLICITUD = 'errores_solicitud'
+FASE_MEMORIA = 'errores_memoria'
+
+
+# Limita la memoria del proceso trabajador: al pasarla, la compilacion
+# recibe MemoryError
+def _iniciar_trabajador(memoria_maxima):
+    if resource is not None and memoria_maxima:
+        _, maximo = resource.getrlimit(resource.RLIMIT_AS)
+        limite = memoria_maxima * 1024 * 1024
+        if maximo != resource.RLIM_INFINITY:
+            limite = min(limite, maximo)
+        resource.setrlimit(resource.RLIMIT_AS, (limite, maximo))
+    # Las señales las atiende el proceso principal, que apaga el servidor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# Atiende un pedido de compilacion en un proceso trabajador. Devuelve la
+# respuesta sin "id" ni tiempo, que completa el servidor
+def atender_compilacion(pedido, usar_cache=True, directorio_cache=None):
+    archivo = pedido.get('archivo')
+    nivel_optimizacion = pedido.get('nivel_optimizacion', 1)
+    usar_cache = pedido.get('cache', usar_cache and archivo is not None)
+    escribir = pedido.get('escribir', archivo is not None)
+    salida = None
+    desde_cache = None
+    try:
+        if archivo is not None:
+            salida = os.path.splitext(archivo)[0] + ".cpp"
+            entrada, desde_cache = buscar_o_compilar(archivo, nivel_optimizacion, usar_cache, directorio_cache)
+        else:
+            entrada = compilar_fuente(pedido['fuente'], nivel_optimizacion)
+            if pedido.get('nombre'):
+                salida = os.path.splitext(pedido['nombre'])[0] + ".cpp"
+    except (OSError, UnicodeDecodeError) as e:
+        return respuesta_error('errores_lectura', f"Error al leer el archivo: {e}")
+    except MemoryError:
+        return respuesta_error(FASE_MEMORIA, "La compilacion supero la memoria maxima del trabajador")
+
+    fase = entrada['fase']
+    errores = entrada['errores']
+    if entrada['cpp'] is not None and escribir and salida is not None:
+        try:
+            escribir_si_cambio(salida, entrada['cpp'])
+        except OSError as e:
+            fase = 'errores_escritura'
+            errores = [f"Error al escribir el archivo: {e}"]
+
+    return {
+        'exito': fase is None,
+        'fase': fase,
+        'diagnosticos': [diagnostico.a_diccionario() for diagnostico in diagnosticos(fase, errores)],
+        'cpp': entrada['cpp'],
+        'salida': salida,
+        'tokens': entrada['tokens'],
+        'nodos': entrada['nodos'],
+        'variables': entrada['variables'],
+        'desde_cache': desde_cache,
+    }
+
+
+def respuesta_error(fase, mensaje):
+    return {
+        'exito': False,
+        'fase': fase,
+        'diagnosticos': [diagnostico.a_diccionario() for diagnostico in diagnosticos(fase, [mensaje])],
+        'cpp': None,
+    }
+
+
+# Pedido valido o el mensaje de por que no lo es
+def validar_pedido(pedido):
+    if not isinstance(pedido, dict):
+        return "El pedido debe ser un objeto JSON"
+    if 'comando' in pedido:
+        if pedido['comando'] not in ('estado', 'apagar'):
+            return f"Comando desconocido: {pedido['comando']}"
+        return None
+    if ('archivo' in pedido) == ('fuente' in pedido):
+        return "El pedido necesita \"archivo\" o \"fuente\""
+    for clave in ('archivo', 'fuente', 'nombre'):
+        if clave in pedido and not isinstance(pedido[clave], str):
+            return f"\"{clave}\" debe ser una cadena"
+    if pedido.get('nivel_optimizacion', 1) not in (0, 1, 2):
+        return "\"nivel_optimizacion\" debe ser 0, 1 o 2"
+    return None
+
+
+# Servidor de compilacion. Reparte los pedidos entre un grupo de procesos
+# que se crean una sola vez y quedan con los modulos importados y la cache
+# abierta. Cada pedido se responde llamando a "responder" con un dict,
+# desde el hilo que recibe el resultado
+class ServidorCompilacion:
+    def __init__(self, trabajos=None, memoria_maxima=MEMORIA_MAXIMA_MB, usar_cache=True, directorio_cache=None):
+        self.trabajos = trabajos or os.cpu_count() or 1
+        self.memoria_maxima = memoria_maxima
+        self.usar_cache = usar_cache
+        self.directorio_cache = directorio_cache
+        self.ejecutor = None
+        self.cupos = threading.BoundedSemaphore(self.trabajos * PEDIDOS_POR_TRABAJADOR)
+        self.condicion = threading.Condition()
+        self.pendientes = 0
+        self.atendidos = 0
+        self.apagando = False
+        self.al_apagar = None   # Se llama una vez cuando se pide apagar
+
+    def iniciar(self):
+        self.ejecutor = self._crear_ejecutor()
+
+    def _crear_ejecutor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.trabajos, initializer=_iniciar_trabajador, initargs=(self.memoria_maxima,)
+        )
+
+    # Procesa una linea recibida. Bloquea mientras no haya cupo para otro
+    # pedido en curso
+    def recibir(self, linea, responder):
+        try:
+            pedido = json.loads(linea)
+        except ValueError as e:
+            responder({'id': None, **respuesta_error(FASE_SOLICITUD, f"JSON invalido: {e}")})
+            return
+        identificador = pedido.get('id') if isinstance(pedido, dict) else None
+        problema = validar_pedido(pedido)
+        if problema:
+            responder({'id': identificador, **respuesta_error(FASE_SOLICITUD, problema)})
+            return
+
+        comando = pedido.get('comando')
+        if comando == 'estado':
+            responder({'id': identificador, 'exito': True, 'estado': self.estado()})
+            return
+        if comando == 'apagar':
+            responder({'id': identificador, 'exito': True})
+            self.pedir_apagado()
+            return
+        if self.apagando:
+            responder({'id': identificador, **respuesta_error(FASE_SOLICITUD, "El servidor se esta apagando")})
+            return
+
+        self.cupos.acquire()
+        with self.condicion:
+            self.pendientes += 1
+        inicio = time.perf_counter()
+        ejecutor = self.ejecutor
+        try:
+            futuro = ejecutor.submit(atender_compilacion, pedido, self.usar_cache, self.directorio_cache)
+        except (BrokenProcessPool, RuntimeError):
+            futuro = None
+        if futuro is None:
+            self._terminar(identificador, inicio, responder, ejecutor, None)
+        else:
+            futuro.add_done_callback(
+                lambda futuro: self._terminar(identificador, inicio, responder, ejecutor, futuro)
+            )
+
+    # Arma la respuesta de un pedido terminado y libera su cupo
+    def _terminar(self, identificador, inicio, responder, ejecutor, futuro):
+        try:
+            respuesta = futuro.result() if futuro is not None else None
+        except BrokenProcessPool:
+            respuesta = None
+        except Exception as e:
+            respuesta = respuesta_error(FASE_SOLICITUD, f"Error interno del servidor: {e}")
+        if respuesta is None:
+            # Un trabajador murio (por ejemplo, lo mato el sistema por
+            # memoria): el grupo queda inutilizable y se reemplaza
+            respuesta = respuesta_error(FASE_MEMORIA, "El proceso trabajador termino de forma inesperada")
+            self._reemplazar_ejecutor(ejecutor)
+
+        respuesta = {'id': identificador, **respuesta}
+        respuesta['milisegundos'] = round((time.perf_counter() - inicio) * 1000, 3)
+        try:
+            responder(respuesta)
+        finally:
+            self.cupos.release()
+            with self.condicion:
+                self.pendientes -= 1
+                self.atendidos += 1
+                self.condicion.notify_all()
+
+    # Reemplaza el grupo de procesos roto, si otro pedido no lo hizo ya
+    def _reemplazar_ejecutor(self, roto):
+        with self.condicion:
+            if self.apagando or self.ejecutor is not roto:
+                return
+            self.ejecutor = self._crear_ejecutor()
+        roto.shutdown(wait=False)
+
+    def estado(self):
+        with self.condicion:
+            return {
+                'trabajos': self.trabajos,
+                'pendientes': self.pendientes,
+                'atendidos': self.atendidos,
+                'memoria_maxima_mb': self.memoria_maxima,
+                'apagando': self.apagando,
+            }
+
+    # Deja de aceptar pedidos; los que estan en curso se terminan
+    def pedir_apagado(self):
+        with self.condicion:
+            if self.apagando:
+                return
+            self.apagando = True
+        if self.al_apagar is not None:
+            self.al_apagar()
+
+    # Espera los pedidos en curso y termina los procesos trabajadores
+    def apagar(self):
+        self.pedir_apagado()
+        with self.condicion:
+            while self.pendientes:
+                self.condicion.wait()
+        if self.ejecutor is not None:
+            self.ejecutor.shutdown(wait=True)
+
+
+# Escribe respuestas como lineas JSON; varios hilos pueden responder a la
+# vez sobre la misma salida
+class EscritorRespuestas:
+    def __init__(self, salida):
+        self.salida = salida
+        self.cerrojo = threading.Lock()
+
+    def __call__(self, respuesta):
+        linea = json.dumps(respuesta, ensure_ascii=False) + "\n"
+        with self.cerrojo:
+            try:
+                self.salida.write(linea)
+                self.salida.flush()
+            except (OSError, ValueError):
+                pass    # El cliente cerro la conexion
+
+
+# Atiende pedidos de la entrada estandar hasta el fin de la entrada, un
+# comando "apagar" o SIGTERM/SIGINT, y responde por la salida estandar. La
+# entrada se lee en otro hilo para que el principal pueda atender las
+# señales mientras la lectura esta bloqueada
+def servir_stdio(servidor, entrada=None, salida=None):
+    entrada = entrada or sys.stdin
+    responder = EscritorRespuestas(salida or sys.stdout)
+    terminado = threading.Event()
+
+    def leer():
+        for linea in entrada:
+            if linea.strip():
+                servidor.recibir(linea, responder)
+            if servidor.apagando:
+                break
+        terminado.set()
+
+    servidor.al_apagar = terminado.set
+    threading.Thread(target=leer, daemon=True).start()
+    while not terminado.wait(INTERVALO_SENALES):
+        pass
+    servidor.apagar()
+
+
+# Conexion de un cliente por el socket: lee pedidos hasta que el cliente
+# cierra su lado y espera sus respuestas antes de cerrar
+class _ManejadorConexion(socketserver.StreamRequestHandler):
+    def handle(self):
+        servidor = self.server.servidor_compilacion
+        responder = EscritorRespuestas(_SalidaTexto(self.wfile))
+        propios = _Contador()
+
+        def responder_contando(respuesta):
+            try:
+                responder(respuesta)
+            finally:
+                propios.restar()
+
+        for linea in self.rfile:
+            if not linea.strip():
+                continue
+            propios.sumar()
+            servidor.recibir(linea.decode('utf-8', errors='replace'), responder_contando)
+        propios.esperar()
+
+
+# Cantidad de pedidos de una conexion sin responder todavia
+class _Contador:
+    def __init__(self):
+        self.valor = 0
+        self.condicion = threading.Condition()
+
+    def sumar(self):
+        with self.condicion:
+            self.valor += 1
+
+    def restar(self):
+        with self.condicion:
+            self.valor -= 1
+            self.condicion.notify_all()
+
+    def esperar(self):
+        with self.condicion:
+            while self.valor:
+                self.condicion.wait()
+
+
+# Salida de texto sobre el archivo binario del socket
+class _SalidaTexto:
+    def __init__(self, archivo):
+        self.archivo = archivo
+
+    def write(self, texto):
+        self.archivo.write(texto.encode('utf-8'))
+
+    def flush(self):
+        self.archivo.flush()
+
+
+class _ServidorSocket(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    block_on_close = False
+
+
+# Atiende pedidos por un socket Unix, un hilo por conexion, hasta un
+# comando "apagar" o SIGTERM/SIGINT. Al terminar borra el socket
+def servir_socket(servidor, ruta):
+    if os.path.exists(ruta):
+        # Un socket que quedo de una ejecucion anterior; si hay un
+        # servidor escuchando, no se le quita el lugar
+        prueba = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            prueba.connect(ruta)
+        except OSError:
+            os.remove(ruta)
+        else:
+            prueba.close()
+            raise OSError(f"Ya hay un servidor escuchando en {ruta}")
+
+    servidor_socket = _ServidorSocket(ruta, _ManejadorConexion)
+    servidor_socket.servidor_compilacion = servidor
+    print(f"Servidor de compilacion escuchando en {ruta} ({servidor.trabajos} procesos)", file=sys.stderr)
+    # shutdown() espera a que serve_forever termine: se llama desde otro hilo
+    servidor.al_apagar = lambda: threading.Thread(target=servidor_socket.shutdown).start()
+    try:
+        servidor_socket.serve_forever()
+    finally:
+        servidor_socket.server_close()
+        servidor.apagar()
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+# SIGTERM y SIGINT piden un apagado ordenado: se terminan los pedidos en
+# curso antes de salir
+def instalar_senales(servidor):
+    def apagar(numero, marco):
+        servidor.pedir_apagado()
+    signal.signal(signal.SIGTERM, apagar)
+    signal.signal(signal.SIGINT, apagar)
+
+
+# Cliente minimo del servidor por socket Unix: envia un pedido y espera su
+# respuesta por la misma conexion
+class ClienteCompilacion:
+    def __init__(self, ruta):
+        self.conexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.conexion.connect(ruta)
+        self.lector = self.conexion.makefile('rb')
+        self.siguiente_id = 0
+
+    # Envia el pedido y devuelve la respuesta como dict
+    def pedir(self, pedido):
+        self.siguiente_id += 1
+        pedido = {'id': self.siguiente_id, **pedido}
+        self.conexion.sendall(json.dumps(pedido).encode('utf-8') + b"\n")
+        linea = self.lector.readline()
+        if not linea:
+            raise ConnectionError("El servidor cerro la conexion")
+        return json.loads(linea)
+
+    def compilar(self, archivo=None, fuente=None, **opciones):
+        pedido = dict(opciones)
+        if archivo is not None:
+            pedido['archivo'] = os.path.abspath(archivo)
+        else:
+            pedido['fuente'] = fuente
+        return self.pedir(pedido)
+
+    def cerrar(self):
+        self.lector.close()
+        self.conexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+        return False
@@ -0,0 +1,254 @@
+import mmap
+import os
+
+from lexer.lexer import Lexer, TokenBuffer
+from parser.parser import Parser, ArbolAST
+from checker.checker import Checker
+from optimizer.optimizer import Optimizador
+from codegen.generator import GeneradorFlujo, PIE_CPP
+from pipeline.pipeline import Compilador, ResultadoCompilacion
+from profiling.profiling import PerfiladorNulo
+from diagnostics.diagnostics import limite_alcanzado
+from cache.cache import escribir_si_cambio, reemplazar_si_cambio
+
+# Tamaño aproximado (en caracteres o bytes) de cada bloque de lineas que
+# analiza el lexer; el bloque siempre termina en un salto de linea
+TAMANO_BLOQUE = 64 * 1024
+
+# Tamaño del buffer del archivo de salida
+BUFFER_SALIDA = 256 * 1024
+
+
+# El lexer en bytes encontro un caracter no ASCII fuera de un literal y
+# volvio a analizar todo el archivo como texto (siempre es un error lexico)
+class ReanalisisCompleto(Exception):
+    pass
+
+
+# Sentencias de nivel superior de un codigo fuente, de a una, sin guardar
+# todos sus tokens ni todos sus nodos. El lexer analiza un bloque de lineas
+# por vez y el parser toma las sentencias de ese bloque; una sentencia que
+# llega al final del bloque puede seguir en el siguiente, asi que se
+# descarta y se vuelve a parsear cuando el siguiente ya esta analizado. Al
+# pasar de bloque se descartan los tokens consumidos y cada sentencia se
+# crea en su propia arena. Los errores son los del analisis completo: tras
+# un error lexico solo sigue el lexer (sus errores tienen prioridad) y al
+# alcanzar el limite de errores sintacticos se deja de parsear
+class FlujoSentencias:
+    def __init__(self, fuente, max_errores=None, tamano_bloque=TAMANO_BLOQUE):
+        self.fuente = fuente
+        self.lexer = Lexer(fuente, max_errores)
+        self.parser = Parser(self.lexer.tokens, max_errores)
+        self.tamano_bloque = tamano_bloque
+        self.tamano_actual = tamano_bloque
+        self.salto = "\n" if isinstance(fuente, str) else b"\n"
+        self.cantidad_tokens = 0
+        self.nodos = 1          # La raiz Program del analisis completo
+        self.parsear = True
+        self.liberado = 0       # Bytes del mmap devueltos al sistema
+
+    @property
+    def errores_lexicos(self):
+        return self.lexer.errores
+
+    @property
+    def errores_sintacticos(self):
+        return self.parser.errores
+
+    def __iter__(self):
+        lexer = self.lexer
+        parser = self.parser
+        terminado = False
+        while not terminado:
+            terminado = self._siguiente_bloque()
+            if lexer.errores or not self.parsear:
+                continue
+            while parser.pos < parser.total:
+                inicio = parser.pos
+                errores = len(parser.errores)
+                parser.arbol = ArbolAST(lexer.nombres, lexer.indice_lineas)
+                sentencia = parser.parsear_siguiente()
+                if parser.pos >= parser.total and not terminado:
+                    # La sentencia puede seguir en el bloque siguiente; si
+                    # ocupa el bloque entero, el siguiente es el doble de
+                    # grande para no volver a parsearla demasiadas veces
+                    parser.pos = inicio
+                    del parser.errores[errores:]
+                    self.tamano_actual = self.tamano_actual * 2 if inicio == 0 else self.tamano_bloque
+                    break
+                self.nodos += len(parser.arbol)
+                if sentencia is not None:
+                    yield sentencia
+                elif limite_alcanzado(parser.errores, parser.max_errores):
+                    self.parsear = False
+                    break
+
+    # Analiza el siguiente bloque de lineas a continuacion de los tokens que
+    # el parser todavia no consumio. Devuelve si ya no queda codigo
+    def _siguiente_bloque(self):
+        lexer = self.lexer
+        parser = self.parser
+        fuente = self.fuente
+        anteriores = lexer.tokens
+        tokens = TokenBuffer(fuente, lexer.nombres, lexer.indice_lineas)
+        for columna, anterior in zip(tokens.columnas_token(), anteriores.columnas_token()):
+            columna.extend(anterior[parser.pos:])
+        pendientes = len(tokens)
+        lexer.tokens = tokens
+
+        limite = fuente.find(self.salto, lexer.posicion_actual + self.tamano_actual)
+        limite = len(fuente) if limite == -1 else limite + 1
+        lexer.analizar(limite)
+        if lexer.codigo_fuente is not fuente:
+            raise ReanalisisCompleto()
+        self.cantidad_tokens += len(tokens) - pendientes
+        parser.continuar_con(tokens)
+        self._liberar(tokens.inicios[0] if len(tokens) else lexer.posicion_actual)
+        return (lexer.posicion_actual < limite or lexer.posicion_actual >= len(fuente)
+                or limite_alcanzado(lexer.errores, lexer.max_errores))
+
+    # Las paginas del archivo mapeado anteriores a la posicion ya no se
+    # leen: se devuelven para que la memoria residente no crezca con el
+    # archivo (si se vuelven a leer, el sistema las carga de nuevo)
+    def _liberar(self, posicion):
+        if not isinstance(self.fuente, mmap.mmap) or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        hasta = posicion - posicion % mmap.PAGESIZE
+        if hasta > self.liberado:
+            self.fuente.madvise(mmap.MADV_DONTNEED, self.liberado, hasta - self.liberado)
+            self.liberado = hasta
+
+
+# Resultado de una compilacion en flujo: el C++ no queda en memoria sino en
+# archivo_salida; escrito indica si el archivo cambio
+class ResultadoFlujo(ResultadoCompilacion):
+    __slots__ = ('archivo_salida', 'escrito')
+
+    def __init__(self):
+        super().__init__()
+        self.archivo_salida = None
+        self.escrito = False
+
+    @property
+    def exito(self):
+        return self.fase is None and (self.archivo_salida is not None or self.cpp is not None)
+
+
+# Compilador en flujo: lleva cada sentencia por todas las fases y escribe
+# el C++ en el archivo de salida a medida que lo genera, sin tener en
+# memoria la lista de tokens, el AST ni el codigo completos; la memoria
+# depende de la sentencia mas grande y de la tabla de simbolos, no del
+# largo del archivo. El resultado es exactamente el de
+# Compilador.compilar, pero las cabeceras y las declaraciones dependen de
+# todo el programa, asi que el codigo fuente se recorre dos veces: el
+# primer recorrido analiza, verifica y cuenta y el segundo genera. La fuente es una cadena o, para
+# que la memoria no dependa del archivo, un mmap en UTF-8. No admite -O2:
+# saber si una asignacion esta muerta requiere las sentencias posteriores.
+#
+#   resultado = CompiladorFlujo().compilar(fuente, "programa.cpp")
+#   resultado.exito, resultado.diagnosticos
+class CompiladorFlujo:
+    def __init__(self, nivel_optimizacion=1, max_errores=None, tamano_bloque=TAMANO_BLOQUE):
+        if nivel_optimizacion > 1:
+            raise ValueError("La compilacion en flujo no admite -O2")
+        self.nivel_optimizacion = nivel_optimizacion
+        self.max_errores = max_errores
+        self.tamano_bloque = tamano_bloque
+        self.checker = Checker(max_errores)
+
+    # Compila la fuente y escribe el C++ en ruta_salida si no hubo errores;
+    # si el archivo ya tiene el mismo codigo no se toca
+    def compilar(self, fuente, ruta_salida, perfil=None):
+        if perfil is None:
+            perfil = PerfiladorNulo()
+        try:
+            with perfil.fase('analisis', bytes=len(fuente)) as medicion:
+                resultado, generador = self._analizar(fuente)
+            medicion.elementos['tokens'] = resultado.cantidad_tokens
+        except ReanalisisCompleto:
+            return self._compilar_completo(fuente, ruta_salida, perfil)
+        if resultado.fase is not None:
+            return resultado
+
+        with perfil.fase('generacion', nodos=resultado.nodos):
+            resultado.escrito = self._generar(fuente, ruta_salida, generador)
+        resultado.archivo_salida = ruta_salida
+        return resultado
+
+    # Primer recorrido: lexico, sintactico, semantico y optimizacion de cada
+    # sentencia, y lo que el generador necesita para las cabeceras
+    def _analizar(self, fuente):
+        resultado = ResultadoFlujo()
+        flujo = FlujoSentencias(fuente, self.max_errores, self.tamano_bloque)
+        checker = self.checker
+        tabla_simbolos = checker.tabla_simbolos = {}
+        optimizador = Optimizador(tabla_simbolos) if self.nivel_optimizacion > 0 else None
+        generador = GeneradorFlujo(tabla_simbolos)
+        errores_semanticos = []
+
+        for sentencia in flujo:
+            if flujo.errores_sintacticos:
+                continue
+            if not limite_alcanzado(errores_semanticos, self.max_errores):
+                if self.max_errores is not None:
+                    checker.max_errores = self.max_errores - len(errores_semanticos)
+                errores_semanticos.extend(checker.verificar(sentencia))
+            if errores_semanticos:
+                continue
+            if optimizador is not None:
+                optimizador.optimizar_sentencia(sentencia)
+            generador.contar(sentencia)
+        checker.arbol = None
+        checker.max_errores = self.max_errores
+
+        resultado.cantidad_tokens = flujo.cantidad_tokens
+        resultado.tabla_simbolos = tabla_simbolos
+        for fase, errores in (('errores_lexicos', flujo.errores_lexicos),
+                              ('errores_sintacticos', flujo.errores_sintacticos),
+                              ('errores_semanticos', errores_semanticos)):
+            if errores:
+                resultado.fase = fase
+                resultado.errores = errores
+                return resultado, None
+        resultado.nodos = flujo.nodos
+        if optimizador is not None:
+            resultado.plegados = optimizador.plegados
+        return resultado, generador
+
+    # Segundo recorrido: vuelve a analizar y optimizar cada sentencia (ya
+    # se sabe que no hay errores) y escribe su C++ en un temporal que al
+    # final reemplaza la salida si cambio
+    def _generar(self, fuente, ruta_salida, generador):
+        flujo = FlujoSentencias(fuente, None, self.tamano_bloque)
+        optimizador = Optimizador(generador.tabla_simbolos) if self.nivel_optimizacion > 0 else None
+        temporal = f"{ruta_salida}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8', newline='', buffering=BUFFER_SALIDA) as salida:
+                escribir = salida.write
+                escribir("\n".join(generador.encabezado()))
+                for sentencia in flujo:
+                    if optimizador is not None:
+                        optimizador.optimizar_sentencia(sentencia)
+                    escribir("\n")
+                    escribir(generador.convertir_sentencia(sentencia))
+                escribir("\n")
+                escribir("\n".join(PIE_CPP))
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+        return reemplazar_si_cambio(temporal, ruta_salida)
+
+    # Fuente que el lexer tuvo que analizar como texto: se compila completa
+    # en memoria para dar exactamente los mismos errores
+    def _compilar_completo(self, fuente, ruta_salida, perfil):
+        completo = Compilador(self.nivel_optimizacion, self.max_errores).compilar(fuente, perfil)
+        resultado = ResultadoFlujo()
+        for campo in ResultadoCompilacion.__slots__:
+            setattr(resultado, campo, getattr(completo, campo))
+        if resultado.exito:
+            resultado.escrito = escribir_si_cambio(ruta_salida, resultado.cpp)
+            resultado.archivo_salida = ruta_salida
+        return resultado
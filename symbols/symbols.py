@@ -0,0 +1,35 @@
+# Tabla de nombres: cada identificador se guarda una sola vez y recibe un
+# id entero denso (0, 1, 2...) en el orden en que aparece por primera vez.
+# El lexer internaliza los identificadores al analizarlos; el parser guarda
+# el id en los nodos Identifier y Assign, el checker guarda los tipos en
+# una lista indexada por id y el generador busca el nombre por su id. El
+# texto de un nombre es siempre el mismo objeto, asi que su hash se calcula
+# una sola vez. Varias fases o varios lexers (los bloques del modo --watch,
+# el modo --stream) pueden compartir la misma tabla para que los ids
+# coincidan entre arboles distintos
+class TablaNombres:
+    __slots__ = ('nombres', 'ids')
+
+    def __init__(self, nombres=()):
+        self.nombres = []       # id -> nombre
+        self.ids = {}           # nombre -> id
+        for nombre in nombres:
+            self.identificador(nombre)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __getitem__(self, identificador):
+        return self.nombres[identificador]
+
+    # Id del nombre; si es nuevo se le asigna el siguiente
+    def identificador(self, nombre):
+        identificador = self.ids.get(nombre)
+        if identificador is None:
+            identificador = self.ids[nombre] = len(self.nombres)
+            self.nombres.append(nombre)
+        return identificador
+
+    # Id del nombre, o None si todavia no se internalizo
+    def buscar(self, nombre):
+        return self.ids.get(nombre)
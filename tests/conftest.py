@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Los paquetes del compilador se importan desde la raiz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from native.native import CompiladorNativo, CompiladorNoEncontrado
+
+
+# Compila un programa C++ con el compilador local y devuelve lo que
+# imprime. Con -fwrapv un int que desborda da la vuelta, como en el
+# interprete y en el optimizador
+@pytest.fixture
+def ejecutar_cpp(tmp_path):
+    try:
+        nativo = CompiladorNativo(opciones="-O0 -fwrapv", usar_cache=False)
+        nativo.version()
+    except CompiladorNoEncontrado as e:
+        pytest.skip(str(e))
+
+    def ejecutar(cpp):
+        ruta = tmp_path / f"programa_{len(list(tmp_path.glob('*.cpp')))}.cpp"
+        ruta.write_text(cpp, encoding='utf-8')
+        resultado = nativo.construir(str(ruta))
+        assert resultado.exito, resultado.error
+        return subprocess.run([resultado.binario], capture_output=True, text=True, check=True).stdout
+
+    return ejecutar
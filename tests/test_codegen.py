@@ -0,0 +1,138 @@
+import io
+
+import pytest
+
+from interpreter.interpreter import Interprete
+from pipeline.pipeline import Compilador
+
+
+def compilar(codigo, nivel=0):
+    resultado = Compilador(nivel).compilar(codigo)
+    assert resultado.exito, [str(d) for d in resultado.diagnosticos]
+    return resultado
+
+
+def ejecutar_en_proceso(resultado):
+    salida = io.StringIO()
+    assert not Interprete(resultado.tabla_simbolos).ejecutar(resultado.ast, salida)
+    return salida.getvalue()
+
+
+# ** entre enteros es int: se puede usar con % y guardar en un int
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+def test_potencia_entera(ejecutar_cpp, nivel):
+    codigo = (
+        "print((2 ** 3) % 3)\n"
+        "a = 2 ** 3\n"
+        "print(a % 3)\n"
+        "b = 3 ** 40\n"
+        "print(b)\n"
+        "print(2 ** (0 - 1))\n"
+        "print((0 - 1) ** (0 - 3))\n"
+        "print(2 ** 0.5)\n"
+        "pow = 5\n"
+        "potencia = 2\n"
+        "print(potencia ** pow)\n"
+    )
+    resultado = compilar(codigo, nivel)
+    assert resultado.tabla_simbolos['a'] == 'int'
+    esperada = "2\n2\n689956897\n0\n-1\n1.41421\n32\n"
+    assert ejecutar_cpp(resultado.cpp) == esperada
+    assert ejecutar_en_proceso(resultado) == esperada
+
+
+# % con un operando double es fmod(), que trunca hacia cero como el % entero
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+def test_modulo_double(ejecutar_cpp, nivel):
+    codigo = (
+        "a = 1.5\n"
+        "b = a % 2\n"
+        "print(b)\n"
+        "print((0 - 7.5) % 2)\n"
+        "print(7 % (0 - 2.5))\n"
+        "c = 7\n"
+        "print((c + 0.5) % (c - 4))\n"
+        "print(c % 4 < 1.5)\n"
+        "print(a % 0)\n"
+    )
+    resultado = compilar(codigo, nivel)
+    assert resultado.tabla_simbolos['b'] == 'float'
+    esperada = "1.5\n-1.5\n2\n1.5\n0\n-nan\n"
+    assert ejecutar_cpp(resultado.cpp) == esperada
+    assert ejecutar_en_proceso(resultado) == esperada
+
+
+# Los literales de cadena se comparan por su texto, no como punteros
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+def test_comparacion_de_cadenas(ejecutar_cpp, nivel):
+    codigo = (
+        'print("hola" != "hola")\n'
+        'print("abc" < "abd")\n'
+        's = "mundo"\n'
+        'print(s >= "mundo")\n'
+        'print("b" > s)\n'
+    )
+    resultado = compilar(codigo, nivel)
+    assert '#include <string>' in resultado.cpp
+    esperada = "0\n1\n1\n0\n"
+    assert ejecutar_cpp(resultado.cpp) == esperada
+    assert ejecutar_en_proceso(resultado) == esperada
+    assert ejecutar_cpp(compilar('print("a" <= "b")\n', nivel).cpp) == "1\n"
+
+
+# Las comparaciones con literales entre comillas simples tambien son entre
+# std::string
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+def test_comparacion_con_comillas_simples(ejecutar_cpp, nivel):
+    codigo = (
+        "x = 'b'\n"
+        "print(x != 'b')\n"
+        "print('a' < x)\n"
+        """print('abc' != "abc")\n"""
+        "print('it\\'s' > \"it\")\n"
+    )
+    resultado = compilar(codigo, nivel)
+    assert "string{'" not in resultado.cpp
+    esperada = "0\n1\n0\n1\n"
+    assert ejecutar_cpp(resultado.cpp) == esperada
+    assert ejecutar_en_proceso(resultado) == esperada
+
+
+# Una cadena es la misma entre comillas simples o dobles; las simples se
+# generan como comillas dobles, no como un char de C++
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+def test_comillas_simples_y_dobles(ejecutar_cpp, nivel):
+    codigo = (
+        "x = 'hola'\n"
+        'y = "hola"\n'
+        "print(x)\n"
+        "print(y)\n"
+        """print('di "si" y \\'no\\'')\n"""
+        """print("di \\"si\\" y 'no'")\n"""
+        "print('a\\\\b\\tc')\n"
+    )
+    resultado = compilar(codigo, nivel)
+    assert resultado.tabla_simbolos['x'] == 'string'
+    assert "'hola'" not in resultado.cpp
+    esperada = 'hola\nhola\ndi "si" y \'no\'\ndi "si" y \'no\'\na\\b\tc\n'
+    assert ejecutar_cpp(resultado.cpp) == esperada
+    assert ejecutar_en_proceso(resultado) == esperada
+
+
+# Sin -O2 las temporales son de cada sentencia, en un bloque propio; con
+# -O2 una subexpresion que se repite en varias sentencias se calcula una vez
+def test_alcance_de_las_temporales(ejecutar_cpp):
+    codigo = (
+        "a = 10.0 ** 400.0\n"
+        "x = (a + 1.5) * (a + 1.5)\n"
+        "print(x)\n"
+        "print((a + 1.5) * 3.0)\n"
+        "print((a + 1.5) + (a + 1.5))\n"
+    )
+    por_sentencia = compilar(codigo, 1)
+    assert por_sentencia.cpp.count("auto _t0 = (a + 1.5);") == 2
+    assert "    {\n        auto _t0 = (a + 1.5);\n        x = (_t0 * _t0);\n    }" in por_sentencia.cpp
+    globales = compilar(codigo, 2)
+    assert globales.cpp.count("(a + 1.5)") == 1
+    for resultado in (por_sentencia, globales):
+        assert ejecutar_cpp(resultado.cpp) == ejecutar_en_proceso(resultado) == "inf\ninf\ninf\n"
@@ -0,0 +1,44 @@
+import random
+
+from benchmarks.benchmarks import GeneradorProgramas
+from incremental.incremental import CompiladorIncremental
+from pipeline.pipeline import Compilador
+
+
+def sentencias(compilador):
+    return [(i, sentencia) for i, bloque in enumerate(compilador.bloques) for sentencia in bloque.sentencias]
+
+
+# Tras cada edicion el C++ es el de compilar el texto completo
+def test_ediciones_como_compilacion_completa():
+    codigo = GeneradorProgramas(semilla=5, variables=6).generar(tokens=3_000)
+    lineas = codigo.splitlines(True)
+    azar = random.Random(5)
+    compilador = CompiladorIncremental()
+    compilador.actualizar(codigo)
+    for _ in range(20):
+        lineas[azar.randrange(len(lineas))] = lineas[azar.randrange(len(lineas))]
+        texto = "".join(lineas)
+        compilador.actualizar(texto)
+        resultado = Compilador(1).compilar(texto)
+        if resultado.exito:
+            assert compilador.codigo_cpp == resultado.cpp
+
+
+# Las sentencias fuera de los bloques reanalizados (el editado y su
+# anterior) conservan su C++ aunque compartan subexpresiones con la editada
+def test_edicion_conserva_el_cpp_de_los_demas_bloques():
+    lineas = ["a = 10.0 ** 400.0\n"] + [f"print((a + 1.5) * {i}.0)\n" for i in range(300)]
+    compilador = CompiladorIncremental()
+    compilador.actualizar("".join(lineas))
+    antes = [sentencia.cpp for _, sentencia in sentencias(compilador)]
+
+    lineas[150] = "print((a + 1.5) * (a + 1.5))\n"
+    compilador.actualizar("".join(lineas))
+    despues = sentencias(compilador)
+    editado = despues[150][0]
+    assert compilador.bloques_reanalizados <= 2 < len(compilador.bloques)
+    for anterior, (bloque, sentencia) in zip(antes, despues):
+        if bloque not in (editado - 1, editado):
+            assert sentencia.cpp is anterior
+    assert "auto _t0 = (a + 1.5);" in despues[150][1].cpp
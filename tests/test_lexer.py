@@ -0,0 +1,85 @@
+import mmap
+import random
+
+import pytest
+
+from benchmarks.benchmarks import GeneradorProgramas
+from lexer.lexer import CODIGOS_TOKEN, Lexer
+
+T_IDENTIFICADOR = CODIGOS_TOKEN['IDENTIFICADOR']
+
+
+# Tokens y errores del analisis, comparables entre la via de cadenas y la
+# de bytes: tipo, texto, linea y columna de cada token, el nombre de cada
+# identificador segun su id y el mensaje de cada error
+def resultado(lexer, tokens):
+    nombres = lexer.nombres.nombres
+    lista = [(token.tipo, token.valor, token.linea, token.columna) for token in tokens]
+    simbolos = [nombres[simbolo] if tipo == T_IDENTIFICADOR else None
+                for tipo, simbolo in zip(tokens.tipos, tokens.simbolos)]
+    return lista, simbolos, [str(error) for error in lexer.errores]
+
+
+def analizar_texto(codigo):
+    lexer = Lexer(codigo)
+    return resultado(lexer, lexer.analizar())
+
+
+def analizar_bytes(fuente):
+    lexer = Lexer(fuente)
+    return resultado(lexer, lexer.analizar_bytes())
+
+
+# Fragmentos para armar entradas aleatorias, con caracteres no ASCII en
+# comentarios y cadenas (que la via de bytes analiza sin decodificar) y
+# caracteres inesperados ASCII
+FRAGMENTOS = [
+    "x", "total_1", "if", "iffy", "while", "print", "True", "None", "and", "or",
+    "0", "42", "3.14", "1e5", ".5", "7.",
+    "+", "-", "*", "/", "%", "**", "==", "!=", "<=", ">=", "<", ">", "=", "(", ")", ":", ",",
+    " ", "  ", "\t", "\n", "\n\n",
+    "# comentario\n", "# ñandú ☃\n", '"hola"', '"año ☃"', "'cañón'", '"sin cerrar',
+    "$", "?", "@", "`",
+]
+
+
+def entrada_aleatoria(generador, cantidad):
+    return "".join(generador.choice(FRAGMENTOS) for _ in range(cantidad))
+
+
+def test_programa_generado():
+    codigo = GeneradorProgramas(semilla=3).generar(tokens=5_000)
+    assert analizar_bytes(codigo.encode('utf-8')) == analizar_texto(codigo)
+
+
+@pytest.mark.parametrize('semilla', range(50))
+def test_entradas_aleatorias(semilla):
+    codigo = entrada_aleatoria(random.Random(semilla), 80)
+    assert analizar_bytes(codigo.encode('utf-8')) == analizar_texto(codigo)
+
+
+# No ASCII fuera de comentarios y cadenas: la via de bytes vuelve a
+# analizar el codigo decodificado
+@pytest.mark.parametrize('codigo', [
+    "año = 1\nprint(año)\n",
+    "x = 1\ny = x ☃ 2\nprint(y)\n",
+    "# ñ\nz = \"é\" $ 3\nw = é\n",
+    "é",
+])
+def test_no_ascii_vuelve_a_texto(codigo):
+    lexer = Lexer(codigo.encode('utf-8'))
+    tokens = lexer.analizar_bytes()
+    assert isinstance(lexer.codigo_fuente, str)
+    assert resultado(lexer, tokens) == analizar_texto(codigo)
+
+
+def test_mmap(tmp_path):
+    codigo = "# ñandú\nx = 1\ns = \"año\"\nif x >= 1:\n    print(x ** 2, s)\ny = x $ 2\n"
+    ruta = tmp_path / "programa.py"
+    ruta.write_bytes(codigo.encode('utf-8'))
+    with open(ruta, 'rb') as f:
+        fuente = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        assert analizar_bytes(fuente) == analizar_texto(codigo)
+    finally:
+        fuente.close()
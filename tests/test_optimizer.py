@@ -0,0 +1,74 @@
+import re
+
+import pytest
+
+from benchmarks.benchmarks import GeneradorProgramas
+from test_codegen import compilar, ejecutar_en_proceso
+
+INT_MAX = "2147483647"
+INT_MIN = "(0 - 2147483647 - 1)"
+
+# Cada caso es (expresion, lo que imprime): bordes del rango de int, que
+# no se pliegan y dan la vuelta como en C++ con -fwrapv, y division y
+# modulo con negativos, que truncan hacia cero
+CASOS = [
+    (INT_MAX, "2147483647"),
+    (INT_MIN, "-2147483648"),
+    (f"{INT_MAX} + 1", "-2147483648"),
+    (f"{INT_MIN} - 1", "2147483647"),
+    (f"{INT_MAX} * 2", "-2"),
+    (f"{INT_MIN} * (0 - 1)", "-2147483648"),
+    (f"{INT_MAX} + 1 < 0", "1"),
+    ("2 ** 31", "-2147483648"),
+    ("2 ** 30", "1073741824"),
+    ("(0 - 2) ** 31", "-2147483648"),
+    ("(0 - 7) / 2", "-3"),
+    ("7 / (0 - 2)", "-3"),
+    ("(0 - 7) / (0 - 2)", "3"),
+    ("(0 - 7) % 2", "-1"),
+    ("7 % (0 - 2)", "1"),
+    ("(0 - 7) % (0 - 2)", "-1"),
+    (f"{INT_MIN} / 2", "-1073741824"),
+    (f"{INT_MIN} % 3", "-2"),
+    (f"{INT_MAX} / (0 - 1)", "-2147483647"),
+    (f"{INT_MAX} % (0 - 1)", "0"),
+    ("(0 - 7) / 2.0", "-3.5"),
+]
+
+
+# Con -O1 el programa imprime lo mismo que sin optimizar, en C++ y en el
+# interprete, tanto con las expresiones directas como propagadas desde
+# variables
+def test_optimizar_no_cambia_la_salida(ejecutar_cpp):
+    lineas = []
+    for i, (expresion, _) in enumerate(CASOS):
+        lineas.append(f"print({expresion})\n")
+        lineas.append(f"v{i} = {expresion}\n")
+        lineas.append(f"print(v{i})\n")
+    codigo = "".join(lineas)
+    esperada = "".join(f"{salida}\n{salida}\n" for _, salida in CASOS)
+
+    sin_optimizar = compilar(codigo, 0)
+    optimizado = compilar(codigo, 1)
+    assert optimizado.plegados > 0
+    assert ejecutar_cpp(sin_optimizar.cpp) == esperada
+    assert ejecutar_cpp(optimizado.cpp) == esperada
+    assert ejecutar_en_proceso(optimizado) == esperada
+
+
+# Un resultado fuera del rango de int no se pliega: queda la operacion
+@pytest.mark.parametrize('expresion', [
+    f"{INT_MAX} + 1", f"{INT_MIN} - 1", f"{INT_MIN} / (0 - 1)", f"{INT_MIN} % (0 - 1)", "2 ** 31",
+])
+def test_desborde_no_se_pliega(expresion):
+    cpp = compilar(f"print({expresion})\n", 1).cpp
+    assert "2147483648" not in cpp
+    assert not re.search(r"cout << -?[0-9]+ <<", cpp)
+
+
+# Programas generados: -O0 y -O1 imprimen lo mismo
+@pytest.mark.parametrize('semilla', range(3))
+def test_programas_generados(ejecutar_cpp, semilla):
+    codigo = GeneradorProgramas(semilla=semilla, variables=8, ejecutable=True).generar(tokens=2_000)
+    salida = ejecutar_cpp(compilar(codigo, 0).cpp)
+    assert ejecutar_cpp(compilar(codigo, 1).cpp) == salida
@@ -0,0 +1,95 @@
+from array import array
+
+import pytest
+
+from benchmarks.benchmarks import GeneradorProgramas
+from pipeline.pipeline import Compilador
+from serialization.serialization import CABECERA, ENTRADA, cargar, deserializar, guardar, serializar
+
+PROGRAMAS = [
+    GeneradorProgramas(semilla=3, variables=8).generar(tokens=3_000),
+    'a = 10.0 ** 400.0\nx = (a + 1.5) * (a + 1.5)\nprint(x)\nprint((a + 1.5) * 3.0)\ns = "año ☃"\nprint(s)\n',
+    "# ñandú\nb = 2 ** 31\nprint(b % 7)\nprint((0 - 7) / 2)\nprint(y)\n",
+    "",
+]
+
+
+def filas(tokens):
+    return [(token.tipo, token.valor, token.linea, token.columna) for token in tokens]
+
+
+# Guarda los tokens y el AST sin optimizar de "codigo" y devuelve el
+# archivo cargado
+def guardar_y_cargar(codigo, ruta):
+    analizado = Compilador().analizar(codigo)
+    guardar(str(ruta), analizado.tokens, analizado.ast)
+    return analizado, cargar(str(ruta))
+
+
+# Compilar el AST cargado da el mismo C++ y los mismos diagnosticos que
+# compilar el codigo fuente, con cualquier nivel de optimizacion
+@pytest.mark.parametrize('nivel', [0, 1, 2])
+@pytest.mark.parametrize('codigo', PROGRAMAS)
+def test_ida_y_vuelta(tmp_path, codigo, nivel):
+    analizado, archivo = guardar_y_cargar(codigo, tmp_path / "programa.ast")
+    assert filas(archivo.tokens) == filas(analizado.tokens)
+
+    directo = Compilador(nivel).compilar(codigo)
+    cargado = Compilador(nivel).compilar_ast(archivo.ast, archivo.tokens)
+    assert cargado.exito == directo.exito
+    assert cargado.cpp == directo.cpp
+    assert [str(d) for d in cargado.diagnosticos] == [str(d) for d in directo.diagnosticos]
+    assert cargado.tabla_simbolos == directo.tabla_simbolos
+
+
+# Un archivo con solo los tokens guarda la tabla de nombres de sus
+# identificadores
+@pytest.mark.parametrize('codigo', PROGRAMAS)
+def test_solo_tokens(codigo):
+    tokens = Compilador().analizar(codigo).tokens
+    archivo = deserializar(serializar(tokens))
+    assert archivo.ast is None
+    assert filas(archivo.tokens) == filas(tokens)
+
+
+# Los bytes de "datos" como los habria escrito una maquina con el otro
+# orden de bytes: se invierte cada elemento de las columnas de mas de un
+# byte y se marca el orden en la cabecera (que es siempre little endian)
+def invertir_orden(datos):
+    datos = bytearray(datos)
+    magia, version, orden, cantidad = CABECERA.unpack_from(datos, 0)
+    CABECERA.pack_into(datos, 0, magia, version, 1 - orden, cantidad)
+    for i in range(cantidad):
+        _, tipo, posicion, tamano = ENTRADA.unpack_from(datos, CABECERA.size + ENTRADA.size * i)
+        if tipo not in (b"b", b"B"):
+            columna = array(tipo.decode("ascii"), datos[posicion:posicion + tamano])
+            columna.byteswap()
+            datos[posicion:posicion + tamano] = columna.tobytes()
+    return bytes(datos)
+
+
+# Un archivo escrito con el otro orden de bytes se carga igual
+def test_otro_orden_de_bytes():
+    codigo = PROGRAMAS[1]
+    analizado = Compilador().analizar(codigo)
+    archivo = deserializar(invertir_orden(serializar(analizado.tokens, analizado.ast)))
+    assert filas(archivo.tokens) == filas(analizado.tokens)
+    assert Compilador(2).compilar_ast(archivo.ast, archivo.tokens).cpp == Compilador(2).compilar(codigo).cpp
+
+
+@pytest.mark.parametrize('datos, mensaje', [
+    (b"PYCPP", "incompleto"),
+    (b"NOESUNAST" + bytes(40), "no es un AST"),
+])
+def test_archivo_invalido(datos, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        deserializar(datos)
+
+
+def test_otra_version():
+    analizado = Compilador().analizar("x = 1\n")
+    datos = bytearray(serializar(analizado.tokens, analizado.ast))
+    magia, version, orden, cantidad = CABECERA.unpack_from(datos, 0)
+    CABECERA.pack_into(datos, 0, magia, version + 1, orden, cantidad)
+    with pytest.raises(ValueError, match="Version de formato"):
+        deserializar(bytes(datos))